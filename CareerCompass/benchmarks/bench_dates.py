@@ -0,0 +1,151 @@
+"""Micro-benchmark and randomized checks for pdf_pipeline.dates.format_date.
+
+Compares format_date with the implementation the resume service used before
+(strptime, fromisoformat and re.search on every call) on the dates of a
+typical and a pathological resume, and checks on generated inputs that:
+
+* string results match the previous implementation exactly,
+* datetime and date values give the same result as their string form did
+  (for the 20xx years the previous implementation recognised),
+* formatting is idempotent: a formatted date formats to itself,
+* format_dates gives the same results as format_date one value at a time.
+
+    python benchmarks/bench_dates.py [--repeat N] [--cases N] [--seed N]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+from datetime import date, datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import fixtures  # noqa: E402
+from pdf_pipeline.dates import MONTHS, format_date, format_dates, stats  # noqa: E402
+
+
+def legacy_format_date(date_str):
+    """The previous implementation, kept verbatim as the reference."""
+    if not date_str:
+        return ""
+    date_str = str(date_str)
+    if "GMT" in date_str:
+        try:
+            dt = datetime.strptime(date_str, "%a, %d %b %Y %H:%M:%S %Z")
+            return dt.strftime("%b %Y")
+        except:  # noqa: E722
+            pass
+    if ":" in date_str and ("-" in date_str or "+" in date_str):
+        try:
+            if "+" in date_str:
+                dt = datetime.fromisoformat(date_str.replace('+00:00', ''))
+            else:
+                dt = datetime.fromisoformat(date_str.split('+')[0])
+            return dt.strftime("%b %Y")
+        except:  # noqa: E722
+            pass
+    if date_str.isdigit() and len(date_str) == 4:
+        return date_str
+    if len(date_str) <= 8:
+        return date_str
+    try:
+        year_match = re.search(r'20\d{2}', date_str)
+        if year_match:
+            year = year_match.group()
+            month_match = re.search(r'(\d{1,2})-(\d{1,2})', date_str)
+            if month_match:
+                month_num = int(month_match.group(2)) if '-' in date_str else int(month_match.group(1))
+                if 1 <= month_num <= 12:
+                    return f"{MONTHS[month_num - 1]} {year}"
+            return year
+    except:  # noqa: E722
+        pass
+    return str(date_str)
+
+
+def random_datetime(rng):
+    value = datetime(2000, 1, 1) + timedelta(seconds=rng.randrange(100 * 365 * 86400))
+    return value.replace(microsecond=rng.choice((0, rng.randrange(1_000_000))))
+
+
+def random_date_string(rng):
+    """A date string in one of the shapes found in stored resumes, or noise."""
+    value = random_datetime(rng)
+    offset = timezone(timedelta(minutes=rng.choice((0, 0, 60, -300, 330))))
+    shapes = [
+        lambda: value.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+        lambda: value.isoformat(),
+        lambda: value.replace(tzinfo=offset).isoformat(),
+        lambda: value.replace(tzinfo=timezone.utc).isoformat().replace('+00:00', 'Z'),
+        lambda: value.strftime('%Y-%m-%d'),
+        lambda: value.strftime('%Y-%m'),
+        lambda: value.strftime('%m/%d/%Y'),
+        lambda: value.strftime('%B %Y'),
+        lambda: value.strftime('%b %Y'),
+        lambda: str(value.year),
+        lambda: rng.choice(('Present', 'Current', 'Ongoing', 'n/a', 'Summer term')),
+        lambda: ''.join(rng.choice('0123456789-:/+ TZGMabc') for _ in range(rng.randrange(1, 30))),
+    ]
+    return rng.choice(shapes)()
+
+
+def resume_dates(size):
+    data = fixtures.resume(size)
+    return [item.get(field, '') for key in ('experienceList', 'educationList')
+            for item in data.get(key, []) for field in ('startDate', 'endDate')]
+
+
+def check(cases, rng):
+    """Run the randomized checks; returns a list of failure descriptions."""
+    failures = []
+    strings = [random_date_string(rng) for _ in range(cases)]
+    for text in strings:
+        expected = legacy_format_date(text)
+        actual = format_date(text)
+        if actual != expected:
+            failures.append(f'string {text!r}: {actual!r} != legacy {expected!r}')
+        if format_date(actual) != actual:
+            failures.append(f'not idempotent for {text!r}: {actual!r} -> {format_date(actual)!r}')
+    for _ in range(cases // 4):
+        value = random_datetime(rng)
+        for native in (value, value.replace(tzinfo=timezone.utc), value.date()):
+            if format_date(native) != legacy_format_date(native):
+                failures.append(f'{type(native).__name__} {native!r}: {format_date(native)!r} '
+                                f'!= legacy {legacy_format_date(native)!r}')
+    mixed = strings + [random_datetime(rng) for _ in range(cases // 4)] + [None, '', 2023]
+    rng.shuffle(mixed)
+    if format_dates(mixed) != [format_date(value) for value in mixed]:
+        failures.append('format_dates differs from format_date')
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--cases', type=int, default=20000, help='generated inputs for the checks')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    failures = check(args.cases, random.Random(args.seed))
+    for failure in failures[:20]:
+        print(f'MISMATCH {failure}')
+
+    for size in fixtures.INPUT_SIZES:
+        values = resume_dates(size)
+        old_time = timeit.timeit(lambda: [legacy_format_date(v) for v in values], number=args.repeat)
+        new_time = timeit.timeit(lambda: [format_date(v) for v in values], number=args.repeat)
+        batch_time = timeit.timeit(lambda: format_dates(values), number=args.repeat)
+        print(f'{size:13s} {len(values):4d} dates   previous {old_time / args.repeat * 1e6:8.1f} us'
+              f'   format_date {new_time / args.repeat * 1e6:8.1f} us'
+              f'   format_dates {batch_time / args.repeat * 1e6:8.1f} us   speedup {old_time / new_time:5.1f}x')
+    print(f'memo {stats()}')
+
+    if failures:
+        print(f'{len(failures)} mismatches')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
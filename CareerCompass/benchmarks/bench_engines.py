@@ -0,0 +1,109 @@
+"""Compare the compile engines on the same rendered documents.
+
+Renders every resume template and the cover letter with the services'
+pipelines, then compiles each document with every engine in
+``pdf_pipeline.engines.ENGINES``, checking that each one produces a PDF with
+the same page count and timing the compiles. The first compile per engine
+and template (warm-up) is reported separately from the steady state.
+
+    python benchmarks/bench_engines.py [--repeat N] [--size typical] [--output results.json]
+"""
+import argparse
+import re
+import shutil
+import sys
+
+import fixtures
+from harness import FakeFirestoreClient, configure_environment, environment_info, load_service, summarize, timed, write_json
+from pdf_pipeline.compiler import CompileDriver
+from pdf_pipeline.engines import ENGINES
+from pdf_pipeline.sandbox import TexSandbox
+from pdf_pipeline.workspace import WorkspacePool
+
+
+def page_count(pdf):
+    """Page count from the PDF's page tree, or None if it can't be found."""
+    counts = [int(count) for count in re.findall(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)', pdf)]
+    return max(counts) if counts else None
+
+
+def documents(resume_service, cover_letter_service, size):
+    """(template name, pipeline, rendered document) for every template."""
+    for template_name in fixtures.RESUME_TEMPLATES:
+        yield template_name, resume_service.resume_pipeline, resume_service.resume_pipeline.prepare(
+            fixtures.resume(size, template_name))
+    pipeline = cover_letter_service.cover_letter_pipeline
+    yield 'cover_letter_template', pipeline, pipeline.prepare(fixtures.cover_letter(size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='steady-state compiles per engine and template')
+    parser.add_argument('--size', default='typical', choices=fixtures.INPUT_SIZES)
+    parser.add_argument('--output', default='-', help='JSON output file (default: stdout)')
+    args = parser.parse_args()
+
+    if shutil.which('pdflatex') is None:
+        sys.exit('pdflatex not found')
+
+    configure_environment()
+    fake = FakeFirestoreClient()
+    cover_letter_service = load_service('cover-letter', fake)
+    resume_service = load_service('resume', fake)
+    cases = list(documents(resume_service, cover_letter_service, args.size))
+
+    results = []
+    for engine_name, factory in ENGINES.items():
+        driver = CompileDriver.from_env()
+        workspaces = WorkspacePool.from_env()
+        engine = factory(driver, TexSandbox.from_env(), workspaces)
+        if engine is None:
+            print(f'{engine_name} is disabled in this environment; skipping', file=sys.stderr)
+            continue
+        for template_name, pipeline, document in cases:
+            print(f'{engine_name} {template_name}', file=sys.stderr)
+            spec = pipeline.formats.prepare(template_name, document.latex)
+            first, first_elapsed = timed(engine.compile, spec.source, spec.args, spec.env)
+            samples = []
+            pages = set()
+            failed = not first.pdf
+            for _ in range(args.repeat):
+                result, elapsed = timed(engine.compile, spec.source, spec.args, spec.env)
+                samples.append(elapsed)
+                failed = failed or not result.pdf
+                if result.pdf:
+                    pages.add(page_count(result.pdf))
+            result = {
+                'engine': engine_name,
+                'template': template_name,
+                'input': args.size,
+                'first_ms': round(first_elapsed * 1000, 3),
+                'steady': summarize(samples),
+                'pages': sorted(pages, key=str),
+            }
+            if failed:
+                result['error'] = 'compile failed'
+            results.append(result)
+        if hasattr(engine, 'shutdown'):
+            engine.shutdown()
+        workspaces.close()
+
+    # Every engine should produce the same number of pages for a document
+    for template_name, _, _ in cases:
+        page_sets = {tuple(r['pages']) for r in results if r['template'] == template_name}
+        if len(page_sets) > 1:
+            for r in results:
+                if r['template'] == template_name:
+                    r.setdefault('error', 'engines disagree on page count')
+
+    write_json({
+        'benchmark': 'engines',
+        'environment': environment_info(),
+        'config': vars(args),
+        'results': results,
+    }, args.output)
+    sys.exit(1 if any('error' in r for r in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
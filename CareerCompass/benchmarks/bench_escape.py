@@ -0,0 +1,85 @@
+"""Micro-benchmark and golden check for pdf_pipeline.latex.escape_latex.
+
+Compares escape_latex with the unordered str.replace loop both services used
+before, on a large resume and a long cover letter body, and checks the output
+against a character-by-character reference.
+
+    python benchmarks/bench_escape.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pdf_pipeline.latex import LATEX_SPECIAL_CHARS, escape_latex  # noqa: E402
+
+
+def chained_replace_escape(text):
+    """The previous implementation: str.replace per character in dict order."""
+    for char, escaped in LATEX_SPECIAL_CHARS.items():
+        text = text.replace(char, escaped)
+    return text
+
+
+def reference_escape(text):
+    """Obviously-correct reference: escape one character at a time."""
+    return ''.join(LATEX_SPECIAL_CHARS.get(char, char) for char in text)
+
+
+def large_resume_strings():
+    """Fields of a large resume: 50 bullets per role, a few special characters in some of them."""
+    strings = []
+    for role in range(10):
+        strings += [f'Senior Engineer {role}', 'Acme Corp', 'Toronto, ON']
+        for bullet in range(50):
+            if bullet % 3:
+                strings.append(f'Reduced p95 latency by {bullet}0% & cut costs by $2M on the C# {{core}} service')
+            else:
+                strings.append('Led a team of five engineers building the internal deployment platform')
+    strings += ['Python', 'C++', 'C#', 'TypeScript', 'React', 'Node_js', 'Docker', 'Kubernetes']
+    return strings
+
+
+def long_cover_letter_body():
+    paragraph = ('I am excited to apply for the Software Engineer position at Acme & Co. In my last role I '
+                 'improved throughput by 40% and owned a $1.5M budget; my work on the {core} ~platform~ '
+                 'team used C#, F# and a lot of shell_scripts with paths like C:\\Users\\me. ')
+    return '\n\n'.join(paragraph * 4 for _ in range(25))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    cases = {
+        'resume_fields': large_resume_strings(),
+        'cover_letter_body': [long_cover_letter_body()],
+        'all_special_chars': ['\\{}&%$#_^~' * 200],
+    }
+
+    failures = 0
+    for name, strings in cases.items():
+        for text in strings:
+            expected = reference_escape(text)
+            if escape_latex(text) != expected:
+                failures += 1
+                print(f'MISMATCH in {name}: {text[:60]!r}')
+        legacy_ok = all(chained_replace_escape(text) == reference_escape(text) for text in strings)
+
+        new_time = timeit.timeit(lambda: [escape_latex(t) for t in strings], number=args.repeat)
+        old_time = timeit.timeit(lambda: [chained_replace_escape(t) for t in strings], number=args.repeat)
+        print(f'{name:20s} chained replace {old_time / args.repeat * 1e6:9.1f} us'
+              f' (correct: {legacy_ok})   escape_latex {new_time / args.repeat * 1e6:9.1f} us'
+              f'   speedup {old_time / new_time:5.1f}x')
+
+    if failures:
+        print(f'{failures} golden mismatches')
+        sys.exit(1)
+    print('golden output: ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Per-stage timing of resume and cover letter generation against a fake Firestore.
+
+Times fetch, validate, render and compile separately for every resume
+template and the cover letter, with small, typical and pathological inputs,
+and writes the results as JSON for comparison across commits (see
+compare.py). The compile stage is skipped when pdflatex is not installed.
+
+    python benchmarks/bench_pipeline.py [--repeat N] [--compile-repeat N] [--output results.json]
+"""
+import argparse
+import shutil
+import sys
+
+import fixtures
+from harness import (FakeFirestoreClient, configure_environment, document_path, environment_info, load_service,
+                     summarize, timed, write_json)
+from pdf_pipeline.resume import validate_sections
+
+
+def bench_resume(service, fake, template_name, size, repeat):
+    user_id, resume_id = 'bench-user', f'{template_name}-{size}'
+    path = document_path('resume', user_id, resume_id)
+    fake.set(path, fixtures.resume(size, template_name))
+    samples = {'fetch': [], 'validate': [], 'validate_pruned': [], 'render': [], 'render_incremental': [],
+               'compile': []}
+    pipeline = service.resume_pipeline
+    reads = service.template_registry.reads(template_name)
+
+    for _ in range(repeat):
+        service.runtime.document_store.invalidate(path)
+        data, elapsed = timed(pipeline.fetch, user_id, resume_id)
+        samples['fetch'].append(elapsed)
+        validated, elapsed = timed(validate_sections, data)
+        samples['validate'].append(elapsed)
+        # Only the fields the template reads
+        _, elapsed = timed(validate_sections, data, reads)
+        samples['validate_pruned'].append(elapsed)
+        validated['template_id'] = template_name
+        template = service.template_env.get_template(f'{template_name}.tex')
+        latex_code, elapsed = timed(template.render, **validated)
+        samples['render'].append(elapsed)
+        # Production path: memoized validation and rendering of unchanged sections
+        _, elapsed = timed(pipeline.prepare, data)
+        samples['render_incremental'].append(elapsed)
+
+    return samples, latex_code, len(latex_code)
+
+
+def bench_cover_letter(service, fake, size, repeat):
+    user_id, cover_letter_id = 'bench-user', size
+    path = document_path('cover-letter', user_id, cover_letter_id)
+    fake.set(path, fixtures.cover_letter(size))
+    samples = {'fetch': [], 'validate': [], 'render': [], 'compile': []}
+    pipeline = service.cover_letter_pipeline
+
+    for _ in range(repeat):
+        service.runtime.document_store.invalidate(path)
+        data, elapsed = timed(pipeline.fetch, user_id, cover_letter_id)
+        samples['fetch'].append(elapsed)
+        validated, elapsed = timed(pipeline.validate, data)
+        samples['validate'].append(elapsed)
+        document, elapsed = timed(pipeline.render, validated)
+        samples['render'].append(elapsed)
+
+    return samples, document.latex, len(document.latex)
+
+
+def bench_compile(service, pipeline, template_name, latex_code, samples, compile_repeat):
+    """Time compiles of the rendered LaTeX; returns an error string if a compile fails."""
+    spec = pipeline.formats.prepare(template_name, latex_code)
+    for _ in range(compile_repeat):
+        result, elapsed = timed(service.runtime.engine.compile, spec.source, spec.args, spec.env)
+        if not result.pdf:
+            return 'compile failed'
+        samples['compile'].append(elapsed)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50, help='iterations of the fetch/validate/render stages')
+    parser.add_argument('--compile-repeat', type=int, default=3, help='iterations of the compile stage')
+    parser.add_argument('--fetch-latency-ms', type=float, default=0, help='simulated Firestore round trip')
+    parser.add_argument('--sizes', nargs='+', default=list(fixtures.INPUT_SIZES), choices=fixtures.INPUT_SIZES)
+    parser.add_argument('--output', default='-', help='JSON output file (default: stdout)')
+    args = parser.parse_args()
+
+    configure_environment()
+    fake = FakeFirestoreClient(latency=args.fetch_latency_ms / 1000)
+    cover_letter_service = load_service('cover-letter', fake)
+    resume_service = load_service('resume', fake)
+    can_compile = shutil.which('pdflatex') is not None
+    if not can_compile:
+        print('pdflatex not found; skipping the compile stage', file=sys.stderr)
+
+    cases = [('resume', template_name, size) for template_name in fixtures.RESUME_TEMPLATES for size in args.sizes]
+    cases += [('cover-letter', 'cover_letter_template', size) for size in args.sizes]
+
+    results = []
+    for service_name, template_name, size in cases:
+        print(f'{service_name} {template_name} {size}', file=sys.stderr)
+        if service_name == 'resume':
+            service, pipeline = resume_service, resume_service.resume_pipeline
+            samples, latex_code, latex_size = bench_resume(service, fake, template_name, size, args.repeat)
+        else:
+            service, pipeline = cover_letter_service, cover_letter_service.cover_letter_pipeline
+            samples, latex_code, latex_size = bench_cover_letter(service, fake, size, args.repeat)
+
+        error = None
+        if can_compile:
+            error = bench_compile(service, pipeline, template_name, latex_code, samples, args.compile_repeat)
+        result = {
+            'service': service_name,
+            'template': template_name,
+            'input': size,
+            'latex_bytes': latex_size,
+            'stages': {stage: summarize(values) for stage, values in samples.items() if values},
+        }
+        if not can_compile:
+            result['compile_skipped'] = 'pdflatex not found'
+        if error:
+            result['error'] = error
+        results.append(result)
+
+    write_json({
+        'benchmark': 'pipeline',
+        'environment': environment_info(),
+        'config': vars(args),
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
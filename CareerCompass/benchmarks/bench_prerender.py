@@ -0,0 +1,138 @@
+"""Generate latency with and without pre-rendering on document writes.
+
+Loads a service in-process with PRERENDER=1 and a fake Firestore, then:
+
+1. requests every document once with nothing pre-rendered (fetch, validate,
+   render and compile on demand),
+2. edits every document --edits times in quick succession, posting a
+   /document-events notification after each edit as Eventarc would: each
+   from its own thread, since Eventarc doesn't wait for one event's response
+   before delivering the next,
+3. waits for the event requests to return and requests every document
+   again, which should now be served from the pre-rendered PDFs.
+
+Checks that each burst of edits was rendered once, in the request of its last
+event, that every second request was served pre-rendered, and that it carried
+the version of the last edit.
+
+    python benchmarks/bench_prerender.py [--service resume] [--documents 10] [--edits 5] [--output results.json]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import fixtures
+from harness import (FakeFirestoreClient, configure_environment, document_path, environment_info, load_service, seed,
+                     summarize, timed, write_json)
+
+ENDPOINTS = {
+    'resume': ('/generate-resume', 'resume_id', 'X-Resume-Version', 'fullName'),
+    'cover-letter': ('/generate-cover-letter', 'cover_letter_id', 'X-Cover-Letter-Version', 'senderName'),
+}
+
+
+def request_all(client, path, id_field, document_ids):
+    """Request every document; returns (latencies, responses)."""
+    latencies, responses = [], []
+    for document_id in document_ids:
+        response, elapsed = timed(client.post, path, json={'user_id': 'bench-user', id_field: document_id})
+        latencies.append(elapsed)
+        responses.append(response)
+    return latencies, responses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--service', choices=sorted(ENDPOINTS), default='resume')
+    parser.add_argument('--input', choices=fixtures.INPUT_SIZES, default='typical')
+    parser.add_argument('--documents', type=int, default=10)
+    parser.add_argument('--edits', type=int, default=5, help='edits per document in each burst')
+    parser.add_argument('--debounce', type=float, default=0.2, help='PRERENDER_DEBOUNCE in seconds')
+    parser.add_argument('--timeout', type=float, default=300, help='seconds to wait for the event requests')
+    parser.add_argument('--output', default='-', help='JSON output file (default: stdout)')
+    args = parser.parse_args()
+
+    os.environ['PRERENDER'] = '1'
+    os.environ['PRERENDER_DEBOUNCE'] = str(args.debounce)
+    # Events are posted in-process, without an Eventarc token
+    os.environ['PRERENDER_EVENT_AUTH'] = '0'
+    configure_environment()
+    fake = FakeFirestoreClient()
+    service = load_service(args.service, fake)
+    path, id_field, version_header, name_field = ENDPOINTS[args.service]
+    prerender = service.runtime.prerender
+    client = service.app.test_client()
+
+    def document(i, edit):
+        data = fixtures.resume(args.input) if args.service == 'resume' else fixtures.cover_letter(args.input)
+        data[name_field] += f' {i}.{edit}'
+        return data
+
+    document_ids = [f'bench-{i}' for i in range(args.documents)]
+    for i, document_id in enumerate(document_ids):
+        seed(fake, args.service, 'bench-user', document_id, document(i, 0))
+    on_demand, _ = request_all(client, path, id_field, document_ids)
+
+    results = []
+
+    def post_event(document_id):
+        response = service.app.test_client().post(
+            '/document-events', headers={'ce-document': document_path(args.service, 'bench-user', document_id)})
+        results.append((response.status_code, (response.get_json() or {}).get('result')))
+
+    events = []
+    for edit in range(1, args.edits + 1):
+        for i, document_id in enumerate(document_ids):
+            seed(fake, args.service, 'bench-user', document_id, document(i, edit))
+            events.append(threading.Thread(target=post_event, args=(document_id,)))
+            events[-1].start()
+    start = time.perf_counter()
+    for event in events:
+        event.join(max(0.0, args.timeout - (time.perf_counter() - start)))
+        if event.is_alive():
+            sys.exit(f'timed out waiting for pre-rendering: {prerender.stats()}')
+    settle_time = time.perf_counter() - start
+
+    served_before = prerender.stats()['served']
+    precomputed, responses = request_all(client, path, id_field, document_ids)
+    stats = prerender.stats()
+
+    errors = []
+    if stats['rendered'] != args.documents:
+        errors.append(f"{stats['rendered']} renders for {args.documents} documents")
+    outcomes = {}
+    for status, result in results:
+        outcomes[f'{status} {result}'] = outcomes.get(f'{status} {result}', 0) + 1
+    if outcomes != {'200 rendered': args.documents, '200 superseded': args.documents * (args.edits - 1)}:
+        errors.append(f'event responses {outcomes}')
+    if stats['served'] - served_before != args.documents:
+        errors.append(f"{stats['served'] - served_before} of {args.documents} requests served pre-rendered")
+    pipeline = service.resume_pipeline if args.service == 'resume' else service.cover_letter_pipeline
+    for i, response in enumerate(responses):
+        expected = pipeline.validate(document(i, args.edits)).version
+        if response.status_code != 200 or response.headers.get(version_header) != expected:
+            errors.append(f'{document_ids[i]}: {response.status_code} with version '
+                          f'{response.headers.get(version_header)}, expected {expected}')
+    for error in errors:
+        print(f'ERROR {error}', file=sys.stderr)
+
+    write_json({
+        'benchmark': 'prerender',
+        'environment': environment_info(),
+        'config': vars(args),
+        'results': {
+            'on_demand': summarize(on_demand),
+            'precomputed': summarize(precomputed),
+            'settle_s': round(settle_time, 3),
+            'events': outcomes,
+            'prerender': stats,
+            'errors': errors,
+        },
+    }, args.output)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Cold start benchmark: boot time and first-request latency in fresh processes.
+
+Each run starts a new Python process that imports a service against a fake
+Firestore, records its startup report (imports, setup, template loading,
+warm-up), then times the first /generate request and a few more for the
+steady state. Runs with and without the warm-up compile so its effect on the
+first request shows directly. The Jinja bytecode cache is cleared before the
+first run only, so later runs show the cache filled as in the images.
+
+    python benchmarks/bench_startup.py [--service resume] [--runs 3] [--output startup.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+ENDPOINTS = {
+    'resume': ('/generate-resume', 'resume_id'),
+    'cover-letter': ('/generate-cover-letter', 'cover_letter_id'),
+}
+
+
+def child(service_name, steady_requests):
+    """Boot the service in this process and print one JSON result line."""
+    started = time.perf_counter()
+    import fixtures
+    from harness import FakeFirestoreClient, configure_environment, load_service, seed, summarize
+
+    configure_environment()
+    fake = FakeFirestoreClient()
+    service = load_service(service_name, fake)
+    boot = time.perf_counter() - started
+
+    path, id_field = ENDPOINTS[service_name]
+    document = fixtures.resume('typical') if service_name == 'resume' else fixtures.cover_letter('typical')
+    seed(fake, service_name, 'bench-user', 'doc', document)
+    client = service.app.test_client()
+    latencies = []
+    for _ in range(steady_requests + 1):
+        start = time.perf_counter()
+        response = client.post(path, json={'user_id': 'bench-user', id_field: 'doc'})
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise SystemExit(f'{path} returned {response.status_code}')
+
+    first_ms = round(latencies[0] * 1000, 3)
+    steady = summarize(latencies[1:])
+    print(json.dumps({
+        'boot_ms': round(boot * 1000, 3),
+        'startup': service.startup.stats(),
+        'first_request_ms': first_ms,
+        'steady_request': steady,
+        'first_to_steady_ratio': round(first_ms / steady['p50_ms'], 2) if steady.get('p50_ms') else None,
+    }), flush=True)
+    # Skip interpreter teardown of the worker pool threads
+    os._exit(0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--service', choices=ENDPOINTS, default='resume')
+    parser.add_argument('--runs', type=int, default=3, help='fresh processes per configuration')
+    parser.add_argument('--steady-requests', type=int, default=5)
+    parser.add_argument('--output', default='-', help='JSON output file (default: stdout)')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.service, args.steady_requests)
+        return
+
+    from harness import configure_environment, environment_info, write_json
+    configure_environment()
+    shutil.rmtree(os.environ['JINJA_BYTECODE_CACHE_DIR'], ignore_errors=True)
+
+    results = []
+    for warmup in ('1', '0'):
+        for run in range(args.runs):
+            print(f'{args.service} warmup={warmup} run {run + 1}', file=sys.stderr)
+            env = dict(os.environ, STARTUP_WARMUP=warmup)
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', '--service', args.service,
+                 '--steady-requests', str(args.steady_requests)],
+                env=env, capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result.update(warmup=warmup == '1', run=run, process_ms=round((time.perf_counter() - start) * 1000, 3))
+            results.append(result)
+
+    write_json({
+        'benchmark': 'startup',
+        'environment': environment_info(),
+        'config': vars(args),
+        'results': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Compare a TemporaryDirectory per compile with a reused WorkspacePool directory.
+
+Simulates the filesystem work of one compile without running pdflatex: write
+the .tex source, create the .aux/.log/.out/.pdf files pdflatex leaves behind,
+read the PDF back, then tear down (TemporaryDirectory) or empty the directory
+(WorkspacePool). Both the system temp dir and the RAM-backed root are timed.
+
+    python benchmarks/bench_workspace.py [--repeat N] [--pdf-kb N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pdf_pipeline.workspace import WorkspacePool, default_scratch_root  # noqa: E402
+
+SOURCE = '\\documentclass{article}\\begin{document}' + 'Hello world. ' * 2000 + '\\end{document}'
+
+
+def simulate_compile(directory, pdf):
+    with open(os.path.join(directory, 'doc.tex'), 'w', encoding='utf-8') as f:
+        f.write(SOURCE)
+    for ext, content in (('aux', b'\\relax\n'), ('log', b'x' * 20000), ('out', b''), ('pdf', pdf)):
+        with open(os.path.join(directory, f'doc.{ext}'), 'wb') as f:
+            f.write(content)
+    with open(os.path.join(directory, 'doc.pdf'), 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=2000)
+    parser.add_argument('--pdf-kb', type=int, default=60)
+    args = parser.parse_args()
+    pdf = os.urandom(args.pdf_kb * 1024)
+
+    roots = {'tempdir': None}
+    if default_scratch_root():
+        roots['ram'] = default_scratch_root()
+
+    for name, root in roots.items():
+        def temporary_directory():
+            with tempfile.TemporaryDirectory(dir=root) as directory:
+                simulate_compile(directory, pdf)
+
+        pool = WorkspacePool(size=1, root=root)
+
+        def reused_workspace():
+            with pool.workspace() as directory:
+                simulate_compile(directory, pdf)
+
+        old = timeit.timeit(temporary_directory, number=args.repeat) / args.repeat
+        new = timeit.timeit(reused_workspace, number=args.repeat) / args.repeat
+        print(f'{name:8s} TemporaryDirectory {old * 1e6:8.1f} us   WorkspacePool {new * 1e6:8.1f} us'
+              f'   speedup {old / new:4.2f}x   ({root or tempfile.gettempdir()})')
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
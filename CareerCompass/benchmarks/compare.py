@@ -0,0 +1,60 @@
+"""Compare two JSON results from bench_pipeline.py or load_test.py.
+
+Prints every p50/p95/p99 that moved by more than the threshold and exits
+non-zero if anything got slower, so it can gate a change:
+
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+"""
+import argparse
+import json
+import sys
+
+PERCENTILES = ('p50_ms', 'p95_ms', 'p99_ms')
+
+
+def flatten(result):
+    """Map a readable case name to its latency summary for every measured series."""
+    series = {}
+    if result.get('benchmark') == 'load':
+        for run in result['runs']:
+            series[f"concurrency={run['concurrency']}"] = run['latency']
+    else:
+        for case in result['results']:
+            for stage, summary in case['stages'].items():
+                series[f"{case['service']}/{case['template']}/{case['input']}/{stage}"] = summary
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10, help='percent change to report')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = flatten(json.load(f))
+    with open(args.candidate) as f:
+        candidate = flatten(json.load(f))
+
+    regressions = 0
+    for name in sorted(baseline.keys() & candidate.keys()):
+        for key in PERCENTILES:
+            old, new = baseline[name].get(key), candidate[name].get(key)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * 100
+            if abs(change) >= args.threshold:
+                regressions += change > 0
+                print(f'{name:60s} {key:7s} {old:10.3f} -> {new:10.3f} ms  {change:+6.1f}%')
+
+    for name in sorted(baseline.keys() ^ candidate.keys()):
+        print(f'{name:60s} only in {"baseline" if name in baseline else "candidate"}')
+
+    if regressions:
+        print(f'{regressions} regressions over {args.threshold:g}%')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
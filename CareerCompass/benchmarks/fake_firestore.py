@@ -0,0 +1,78 @@
+"""In-memory stand-in for the parts of the Firestore client the services use.
+
+Documents live in a dict keyed by path (``users/{uid}/resumes/{id}``,
+``users/{uid}/coverLetters/{id}``). Only ``document(path).get()``, the
+field-masked metadata read and ``get_all`` are implemented, which is all
+``DocumentStore`` needs. An optional per-call latency simulates the network
+round trip to Firestore.
+"""
+import copy
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time):
+        self.reference = reference
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+
+    def get(self, field_paths=None):
+        self._client.simulate_round_trip()
+        data, update_time = self._client.lookup(self.path)
+        if data is not None and field_paths is not None:
+            data = {field: data[field] for field in field_paths if field in data}
+        return FakeSnapshot(self, data, update_time)
+
+    def set(self, data):
+        self._client.set(self.path, data)
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError('FakeFirestoreClient does not support listeners')
+
+
+class FakeFirestoreClient:
+    """Thread-safe dict-backed Firestore client."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.round_trips = 0
+        self._documents = {}
+        self._lock = threading.Lock()
+        self._clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def simulate_round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def lookup(self, path):
+        with self._lock:
+            return self._documents.get(path, (None, None))
+
+    def set(self, path, data):
+        with self._lock:
+            # Every write gets a strictly later update_time, like Firestore
+            self._clock += timedelta(microseconds=1)
+            self._documents[path] = (copy.deepcopy(data), self._clock)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def get_all(self, references):
+        self.simulate_round_trip()
+        for reference in references:
+            data, update_time = self.lookup(reference.path)
+            yield FakeSnapshot(reference, data, update_time)
@@ -0,0 +1,85 @@
+"""Resume and cover letter documents of different sizes, shaped like the Firestore data.
+
+``small`` is a student's first resume, ``typical`` a few years of experience,
+and ``pathological`` pushes every list to 50 entries and fills the text with
+LaTeX special characters.
+"""
+RESUME_TEMPLATES = ('template1', 'template2', 'template3')
+INPUT_SIZES = ('small', 'typical', 'pathological')
+
+# Date formats seen in stored documents
+_DATES = ('2021-05-01T00:00:00+00:00', 'Mon, 01 Sep 2019 00:00:00 GMT', '2020', 'Sep 2017', '2022-01-15')
+
+_PLAIN_BULLET = 'Built and maintained the internal deployment platform used by five product teams'
+_SPECIAL_BULLET = r'Cut p95 latency by 40% & saved $2M on the C# {core} service_layer ~ see ^notes at C:\build'
+
+
+def _bullets(count, special):
+    return [(_SPECIAL_BULLET if special and i % 2 else _PLAIN_BULLET) + f' ({i})' for i in range(count)]
+
+
+def resume(size, template_name='template1'):
+    """A resume document of the given size."""
+    entries, bullets, special = {'small': (1, 2, False), 'typical': (3, 4, False),
+                                 'pathological': (50, 50, True)}[size]
+    text = (lambda s: f'{s} & Co. {{R&D}} 100% #1') if special else (lambda s: s)
+    return {
+        'resumeName': text('Software Engineer Resume'),
+        'fullName': text('Jordan Example'),
+        'phone': '+1 (555) 010-0000',
+        'email': 'jordan@example.com',
+        'website1': 'https://github.com/jordan',
+        'website2': 'https://linkedin.com/in/jordan',
+        'templateName': template_name,
+        'experienceList': [{
+            'title': text(f'Software Engineer {i}'),
+            'company': text('Acme Corp'),
+            'location': 'Toronto, ON',
+            'startDate': _DATES[i % len(_DATES)],
+            'endDate': _DATES[(i + 1) % len(_DATES)],
+            'currentlyWorking': i == 0,
+            'bullets': _bullets(bullets, special),
+        } for i in range(entries)],
+        'educationList': [{
+            'institution': text('University of Waterloo'),
+            'location': 'Waterloo, ON',
+            'degree': 'Bachelor of Applied Science',
+            'major': text('Computer Engineering'),
+            'minor': 'Combinatorics and Optimization' if i % 2 else '',
+            'gpa': '3.9',
+            'specialization': text('Software') if i % 3 == 0 else '',
+            'startDate': _DATES[i % len(_DATES)],
+            'endDate': _DATES[(i + 2) % len(_DATES)],
+        } for i in range(max(1, entries // 2))],
+        'projectList': [{
+            'title': text(f'Project {i}'),
+            'stack': 'Python, Flask, C++, C#, Kotlin' + (', ' + ', '.join(f'lib_{j}' for j in range(20)) if special else ''),
+            'date': 'Jan 2023',
+            'bullets': _bullets(bullets, special),
+        } for i in range(entries)],
+        'skills': {
+            'languages': 'Python, Kotlin, C++, C#, SQL' + (', F#, Q#, R&D_lang' * 10 if special else ''),
+            'frameworks': 'Flask, React, Jetpack Compose',
+            'tools': 'Git, Docker, Cloud Run, Firebase',
+            'libraries': 'NumPy, pandas' + (', lib_$' * 30 if special else ''),
+        },
+    }
+
+
+def cover_letter(size):
+    """A cover letter document of the given size."""
+    paragraphs, special = {'small': (1, False), 'typical': (4, False), 'pathological': (200, True)}[size]
+    paragraph = ('I am excited to apply for the Software Engineer position. In my last role I led the '
+                 'migration of our build system and mentored two new hires.')
+    if special:
+        paragraph += r' We improved throughput by 40% & cut a $1.5M budget; the {core} ~team~ used C#, F# and C:\tools.'
+    return {
+        'coverLetterName': 'Acme Application' + (' & Co. 100%' if special else ''),
+        'senderName': 'Jordan Example',
+        'senderEmail': 'jordan@example.com',
+        'senderPhoneNumber': '+1 (555) 010-0000',
+        'senderLinkedInUrl': 'https://linkedin.com/in/jordan',
+        'company': 'Acme Corp',
+        'position': 'Software Engineer',
+        'body': '\n\n'.join(paragraph for _ in range(paragraphs)),
+    }
@@ -0,0 +1,121 @@
+"""Helpers shared by the pipeline benchmark and the load generator.
+
+Loads each service's ``main.py`` as its own module with Firestore replaced by
+a ``FakeFirestoreClient``, and summarizes timing samples for JSON output.
+"""
+import importlib.util
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_firestore import FakeFirestoreClient
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+SERVICES = {
+    'resume': ('resume-service', 'resumes'),
+    'cover-letter': ('cover-letter-service', 'coverLetters'),
+}
+
+
+def configure_environment(pdf_cache=False):
+    """Set service environment defaults suitable for benchmarking before import."""
+    if not pdf_cache:
+        # Measure real compiles rather than PDF cache hits
+        os.environ.setdefault('PDF_CACHE_MAX_ENTRIES', '0')
+    os.environ.setdefault('TEX_FORMAT_DIR', os.path.join(tempfile.gettempdir(), 'careercompass-bench-formats'))
+    os.environ.setdefault('JOB_STORE_DIR', os.path.join(tempfile.gettempdir(), 'careercompass-bench-jobs'))
+    os.environ.setdefault('JINJA_BYTECODE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'careercompass-bench-jinja'))
+    # Every fetch goes to the (fake) client unless a run asks for caching
+    os.environ.setdefault('FIRESTORE_CACHE_TTL', '0')
+
+
+def load_service(name, fake_client):
+    """Import a service's main.py with its document store reading from fake_client."""
+    directory, _ = SERVICES[name]
+    path = os.path.join(ROOT, directory, 'main.py')
+    # The services create their Firestore client through this factory
+    import pdf_pipeline.startup
+    pdf_pipeline.startup.firebase_client = lambda: fake_client
+    spec = importlib.util.spec_from_file_location(f'{directory.replace("-", "_")}_main', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def document_path(service, user_id, document_id):
+    return f'users/{user_id}/{SERVICES[service][1]}/{document_id}'
+
+
+def seed(fake_client, service, user_id, document_id, data):
+    fake_client.set(document_path(service, user_id, document_id), data)
+
+
+def percentile(sorted_samples, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_samples:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[rank - 1]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    ordered = sorted(samples)
+    if not ordered:
+        return {'count': 0}
+    to_ms = lambda value: round(value * 1000, 3)  # noqa: E731
+    return {
+        'count': len(ordered),
+        'mean_ms': to_ms(sum(ordered) / len(ordered)),
+        'min_ms': to_ms(ordered[0]),
+        'p50_ms': to_ms(percentile(ordered, 0.50)),
+        'p95_ms': to_ms(percentile(ordered, 0.95)),
+        'p99_ms': to_ms(percentile(ordered, 0.99)),
+        'max_ms': to_ms(ordered[-1]),
+    }
+
+
+def timed(function, *args, **kwargs):
+    """Call function and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info():
+    """Metadata recorded with every result so runs can be compared across commits."""
+    from pdf_pipeline.cache import tex_toolchain_version
+    return {
+        'git_revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'tex': tex_toolchain_version() or None,
+    }
+
+
+def write_json(result, output):
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if output in (None, '-'):
+        print(text)
+    else:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+        print(f'Wrote {output}', file=sys.stderr)
@@ -0,0 +1,168 @@
+"""Concurrent load generator for the generate endpoints.
+
+By default the Flask app is loaded in-process with a fake Firestore seeded
+with the chosen fixture, and requests are issued from a thread pool through
+the Flask test client. With --url the same requests are sent over HTTP to a
+running service instead (the documents must already exist in its Firestore).
+Reports p50/p95/p99 latency, throughput, goodput (2xx responses per second)
+and status counts as JSON, with the admission controller's chosen compile
+limit after each run; benchmarks/recommend.py turns the result into gunicorn
+and Cloud Run settings.
+
+    python benchmarks/load_test.py --service resume --concurrency 8 --requests 200 [--output load.json]
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import fixtures
+from harness import FakeFirestoreClient, configure_environment, environment_info, load_service, seed, summarize, write_json
+
+ENDPOINTS = {
+    'resume': ('/generate-resume', 'resume_id'),
+    'cover-letter': ('/generate-cover-letter', 'cover_letter_id'),
+}
+
+
+def in_process_sender(app):
+    """Send requests through a Flask test client, one client per thread."""
+    local = threading.local()
+
+    def send(path, body):
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        response = local.client.post(path, json=body)
+        return response.status_code, len(response.data)
+    return send
+
+
+def http_sender(base_url, timeout):
+    """Send requests to a running service over HTTP."""
+    def send(path, body):
+        request = urllib.request.Request(base_url.rstrip('/') + path, data=json.dumps(body).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json'}, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status, len(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, len(e.read())
+    return send
+
+
+def http_stats(base_url, path, timeout):
+    """A stats endpoint of a running service, or None if it can't be read."""
+    try:
+        with urllib.request.urlopen(base_url.rstrip('/') + path, timeout=timeout) as response:
+            return json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+
+
+def run_load(send, requests, concurrency):
+    """Issue requests (a list of (path, body)) from concurrency threads."""
+    latencies = []
+    statuses = Counter()
+    sizes = []
+    lock = threading.Lock()
+
+    def one(path, body):
+        start = time.perf_counter()
+        try:
+            status, size = send(path, body)
+        except Exception as e:
+            status, size = type(e).__name__, 0
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] += 1
+            sizes.append(size)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for path, body in requests:
+            executor.submit(one, path, body)
+    wall_time = time.perf_counter() - start
+    succeeded = sum(count for status, count in statuses.items() if status.startswith('2'))
+
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'wall_time_s': round(wall_time, 3),
+        'throughput_rps': round(len(latencies) / wall_time, 2) if wall_time else None,
+        'goodput_rps': round(succeeded / wall_time, 2) if wall_time else None,
+        'latency': summarize(latencies),
+        'status_counts': dict(statuses),
+        'mean_response_bytes': round(sum(sizes) / len(sizes)) if sizes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--service', choices=sorted(ENDPOINTS), default='resume')
+    parser.add_argument('--template', choices=fixtures.RESUME_TEMPLATES, default='template1')
+    parser.add_argument('--input', choices=fixtures.INPUT_SIZES, default='typical')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8],
+                        help='one load run per concurrency level')
+    parser.add_argument('--requests', type=int, default=100, help='requests per run')
+    parser.add_argument('--documents', type=int, default=10,
+                        help='distinct documents to spread requests over (in-process mode)')
+    parser.add_argument('--pdf-cache', action='store_true', help='leave the PDF cache enabled')
+    parser.add_argument('--fetch-latency-ms', type=float, default=0, help='simulated Firestore round trip')
+    parser.add_argument('--url', help='base URL of a running service instead of loading it in-process')
+    parser.add_argument('--user-id', default='bench-user', help='user_id to request (with --url)')
+    parser.add_argument('--document-id', action='append', help='document IDs to request (with --url)')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--output', default='-', help='JSON output file (default: stdout)')
+    args = parser.parse_args()
+
+    path, id_field = ENDPOINTS[args.service]
+    if args.url:
+        send = http_sender(args.url, args.timeout)
+        document_ids = args.document_id or ['bench-0']
+    else:
+        configure_environment(pdf_cache=args.pdf_cache)
+        fake = FakeFirestoreClient(latency=args.fetch_latency_ms / 1000)
+        service = load_service(args.service, fake)
+        document_ids = [f'bench-{i}' for i in range(args.documents)]
+        for i, document_id in enumerate(document_ids):
+            if args.service == 'resume':
+                document = fixtures.resume(args.input, args.template)
+                document['fullName'] += f' {i}'
+            else:
+                document = fixtures.cover_letter(args.input)
+                document['senderName'] += f' {i}'
+            seed(fake, args.service, args.user_id, document_id, document)
+        send = in_process_sender(service.app)
+
+    runs = []
+    for concurrency in args.concurrency:
+        requests = [(path, {'user_id': args.user_id, id_field: document_ids[i % len(document_ids)]})
+                    for i in range(args.requests)]
+        print(f'{args.service}: {args.requests} requests at concurrency {concurrency}', file=sys.stderr)
+        runs.append(run_load(send, requests, concurrency))
+        if args.url:
+            runs[-1]['admission'] = http_stats(args.url, '/admission-stats', args.timeout)
+        else:
+            # Compile limit chosen by the admission controller, queue and measured compile time
+            runs[-1]['admission'] = service.runtime.admission.stats()
+            # Cumulative across runs; identical concurrent requests share one compile
+            runs[-1]['single_flight'] = service.runtime.single_flight.stats()
+            # Bytes sent and saved by compression, 304s and ranges
+            runs[-1]['delivery'] = service.runtime.delivery.stats()
+
+    write_json({
+        'benchmark': 'load',
+        'environment': environment_info(),
+        'config': vars(args),
+        'runs': runs,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
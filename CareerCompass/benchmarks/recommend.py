@@ -0,0 +1,103 @@
+"""Recommend gunicorn, TeX pool and Cloud Run settings from a load_test.py result.
+
+Run load_test.py at concurrency levels from below to well above what one
+instance can handle (in-process, or with --url against a deployed service),
+then:
+
+    python benchmarks/load_test.py --service resume --concurrency 1 2 4 8 16 32 --output load.json
+    python benchmarks/recommend.py load.json [--knee 0.9] [--json]
+
+The settings follow from the measurements:
+
+* compile slots: the compile limit the admission controller settled on at
+  the highest load (see pdf_pipeline.admission). TEX_POOL_SIZE matches it, since
+  warm pdflatex processes beyond the limit would never be used.
+* threads: the lowest concurrency whose goodput (2xx responses per second)
+  is within --knee of the peak. By Little's law that many requests in the
+  process keep the compile slots busy; more only wait in line.
+* workers: one. The PDF, document and preview caches, the warm pool,
+  single-flight and the admission controller are all per process, so a second
+  worker halves every cache and runs a second pool on the same CPUs.
+* Cloud Run concurrency: workers × threads, so requests beyond what the
+  instance can work on go to another instance instead of waiting in the
+  socket backlog.
+"""
+import argparse
+import json
+import math
+import sys
+
+
+def goodput(run):
+    return run.get('goodput_rps', run.get('throughput_rps')) or 0
+
+
+def recommend(result, knee_fraction):
+    """Recommended settings and the measurements they are based on."""
+    runs = sorted(result['runs'], key=lambda run: run['concurrency'])
+    if not runs:
+        raise ValueError('the result has no runs')
+    peak = max(runs, key=goodput)
+    knee = next(run for run in runs if goodput(run) >= knee_fraction * goodput(peak))
+    highest = runs[-1]
+    admission = next((run['admission'] for run in reversed(runs) if run.get('admission')), None) or {}
+
+    cpus = admission.get('cpus') or result.get('environment', {}).get('cpu_count') or 1
+    compile_limit = admission.get('limit') or math.ceil(cpus)
+    threads = max(knee['concurrency'], compile_limit)
+    return {
+        'measured': {
+            'cpus': cpus,
+            'compile_limit': compile_limit,
+            'compile_service_time_ms': admission.get('service_time_ms'),
+            'cpu_utilization': admission.get('utilization'),
+            'peak_goodput_rps': goodput(peak),
+            'peak_concurrency': peak['concurrency'],
+            'knee_concurrency': knee['concurrency'],
+            'knee_p95_ms': knee['latency'].get('p95_ms'),
+            # 1.0 when goodput held up at the highest concurrency, near 0 when it collapsed
+            'goodput_at_highest_load': round(goodput(highest) / goodput(peak), 3) if goodput(peak) else None,
+            'rejected_at_highest_load': highest['status_counts'].get('503', 0),
+        },
+        'gunicorn': {'workers': 1, 'threads': threads, 'worker_class': 'gthread'},
+        'environment': {'TEX_POOL_SIZE': compile_limit, 'ADMISSION_MAX_QUEUE': max(threads - compile_limit, 1)},
+        'cloud_run': {'cpu': math.ceil(cpus), 'concurrency': threads},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('result', help='JSON output of load_test.py')
+    parser.add_argument('--knee', type=float, default=0.9,
+                        help='fraction of peak goodput that counts as saturated')
+    parser.add_argument('--json', action='store_true', help='print the recommendation as JSON')
+    args = parser.parse_args()
+
+    with open(args.result) as f:
+        result = json.load(f)
+    if result.get('benchmark') != 'load':
+        sys.exit(f'{args.result} is not a load_test.py result')
+    settings = recommend(result, args.knee)
+
+    if args.json:
+        print(json.dumps(settings, indent=2, sort_keys=True))
+        return
+
+    print(f"{'concurrency':>11s} {'goodput/s':>10s} {'p95 ms':>10s} {'503s':>6s} {'limit':>6s}")
+    for run in sorted(result['runs'], key=lambda run: run['concurrency']):
+        print(f"{run['concurrency']:11d} {goodput(run):10.2f} {run['latency'].get('p95_ms', 0):10.1f} "
+              f"{run['status_counts'].get('503', 0):6d} {(run.get('admission') or {}).get('limit', '-'):>6}")
+    print()
+    for name, value in settings['measured'].items():
+        print(f'{name:28s} {value}')
+    print()
+    gunicorn = settings['gunicorn']
+    print(f"gunicorn --workers {gunicorn['workers']} --threads {gunicorn['threads']} "
+          f"--worker-class {gunicorn['worker_class']} ...")
+    print(' '.join(f'{name}={value}' for name, value in settings['environment'].items()))
+    print(f"gcloud run deploy ... --cpu {settings['cloud_run']['cpu']} "
+          f"--concurrency {settings['cloud_run']['concurrency']}")
+
+
+if __name__ == '__main__':
+    main()
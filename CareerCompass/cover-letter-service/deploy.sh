@@ -21,9 +21,47 @@ gcloud services enable cloudbuild.googleapis.com
 gcloud services enable run.googleapis.com
 gcloud services enable containerregistry.googleapis.com
 
-# Build the container image
+# Build the container image from the CareerCompass root so the shared pdf_pipeline package is included
 echo "Building container image..."
-gcloud builds submit --tag gcr.io/$PROJECT_ID/$SERVICE_NAME
+cd "$(dirname "$0")"
+gcloud builds submit .. --config cloudbuild.yaml
+
+# Pre-rendering on document writes (pdf_pipeline/prerender.py) is turned on by setting
+# PRERENDER_BUCKET to a Cloud Storage bucket. Every instance mounts it, so a PDF rendered
+# while handling a document event is found by whichever instance serves the download.
+# The instances share the bucket, so they don't evict from it: a lifecycle rule deletes
+# PDFs PRERENDER_RETENTION_DAYS (default 30) days after they were rendered.
+# Document writes reach /document-events through an Eventarc trigger, which signs each
+# event with a token for its own service account; the service accepts no other caller.
+# The trigger must be in the Firestore database's location (FIRESTORE_LOCATION).
+EVENTS_ACCOUNT="$SERVICE_NAME-events@$PROJECT_ID.iam.gserviceaccount.com"
+PRERENDER_FLAGS=()
+if [ -n "$PRERENDER_BUCKET" ]; then
+    gcloud services enable eventarc.googleapis.com
+
+    echo "Creating the document event service account..."
+    if ! gcloud iam service-accounts describe "$EVENTS_ACCOUNT" &> /dev/null; then
+        gcloud iam service-accounts create "$SERVICE_NAME-events" --display-name "$SERVICE_NAME document events"
+    fi
+    gcloud projects add-iam-policy-binding $PROJECT_ID \
+        --member "serviceAccount:$EVENTS_ACCOUNT" \
+        --role roles/eventarc.eventReceiver
+
+    echo "Setting the lifecycle rule of gs://$PRERENDER_BUCKET..."
+    LIFECYCLE_FILE=$(mktemp)
+    cat > "$LIFECYCLE_FILE" <<EOF
+{"rule": [{"action": {"type": "Delete"}, "condition": {"age": ${PRERENDER_RETENTION_DAYS:-30}}}]}
+EOF
+    gcloud storage buckets update "gs://$PRERENDER_BUCKET" --lifecycle-file="$LIFECYCLE_FILE"
+    rm -f "$LIFECYCLE_FILE"
+
+    PRERENDER_FLAGS=(
+        --execution-environment gen2
+        --add-volume "name=prerender,type=cloud-storage,bucket=$PRERENDER_BUCKET"
+        --add-volume-mount "volume=prerender,mount-path=/mnt/prerender"
+        --update-env-vars "PRERENDER=1,PRERENDER_CACHE_DIR=/mnt/prerender,PRERENDER_CACHE_DISK_SHARED=1,PRERENDER_EVENT_INVOKER=$EVENTS_ACCOUNT"
+    )
+fi
 
 # Deploy to Cloud Run
 echo "Deploying to Cloud Run..."
@@ -35,8 +73,31 @@ gcloud run deploy $SERVICE_NAME \
     --memory 2Gi \
     --cpu 1 \
     --timeout 300 \
-    --concurrency 10 \
-    --port 8080
+    --concurrency 8 \
+    --session-affinity \
+    --port 8080 \
+    "${PRERENDER_FLAGS[@]}"
+
+if [ -n "$PRERENDER_BUCKET" ]; then
+    echo "Creating the document event trigger..."
+    gcloud run services add-iam-policy-binding $SERVICE_NAME \
+        --region $REGION \
+        --member "serviceAccount:$EVENTS_ACCOUNT" \
+        --role roles/run.invoker
+    if ! gcloud eventarc triggers describe "$SERVICE_NAME-documents" \
+            --location "${FIRESTORE_LOCATION:-$REGION}" &> /dev/null; then
+        gcloud eventarc triggers create "$SERVICE_NAME-documents" \
+            --location "${FIRESTORE_LOCATION:-$REGION}" \
+            --destination-run-service $SERVICE_NAME \
+            --destination-run-region $REGION \
+            --destination-run-path /document-events \
+            --event-filters "type=google.cloud.firestore.document.v1.written" \
+            --event-filters "database=(default)" \
+            --event-filters-path-pattern "document=users/{uid}/coverLetters/{documentId}" \
+            --event-data-content-type application/protobuf \
+            --service-account "$EVENTS_ACCOUNT"
+    fi
+fi
 
 echo "Deployment complete!"
 echo "Service URL:"
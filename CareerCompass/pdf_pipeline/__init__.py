@@ -0,0 +1 @@
+"""Shared helpers for the CareerCompass PDF generation services."""
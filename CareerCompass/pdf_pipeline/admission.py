@@ -0,0 +1,248 @@
+"""Admission control for compiles, sized to the CPUs the container can use.
+
+pdflatex is CPU-bound: with more compiles running than there are cores they
+all slow down together, so every request gets slower and none finishes
+sooner. ``AdmissionController`` sits in front of the compile engine and lets
+at most ``limit`` compiles run at once; the rest wait in line, oldest first,
+and give up with a 503 and a Retry-After once ADMISSION_QUEUE_TIMEOUT has
+passed. A request whose expected wait (queue length times the measured
+compile time, divided by the limit) is already longer than that is turned
+away at once instead of holding a thread until it times out, so throughput
+stays flat under overload rather than collapsing.
+
+The limit starts at the number of CPUs (the cgroup quota on Cloud Run) and is
+adjusted every ADMISSION_INTERVAL seconds from two measurements:
+
+* compile service time: an average of all compiles, and a baseline of
+  compiles during which there was never more than one compile per CPU
+  running. When the average rises above the baseline by more than
+  ADMISSION_LATENCY_TOLERANCE the cores are oversubscribed and the limit goes
+  down by one. That limit is not tried again for ADMISSION_PROBE_INTERVAL
+  seconds, so the limit settles instead of swinging back and forth.
+* CPU utilization of the container (cgroup CPU usage, or this process and
+  its reaped children where there is no cgroup). While compiles are queued
+  and utilization is below ADMISSION_TARGET_UTILIZATION, the CPUs have time
+  to spare (pdflatex also waits on files) and the limit goes up by one.
+
+The limit stays between ADMISSION_MIN_LIMIT and ADMISSION_MAX_LIMIT (twice
+the CPUs by default) and is served with the other measurements on
+/admission-stats and /metrics; ``benchmarks/recommend.py`` turns them into
+gunicorn and Cloud Run settings. ADMISSION_CONTROL=0 turns it off.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Union
+
+from pdf_pipeline.errors import GenerationError
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest compile in the service time averages
+SMOOTHING = 0.2
+
+
+def available_cpus() -> float:
+    """CPUs this process can use: the cgroup CPU quota if there is one, else the CPUs it may run on."""
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = os.cpu_count() or 1
+    quota = None
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            limit, period = f.read().split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1: a quota of -1 means unlimited
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                limit = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    return min(count, quota) if quota else float(count)
+
+
+def cpu_seconds() -> float:
+    """CPU time used so far by the container, or by this process and its finished children."""
+    try:
+        with open('/sys/fs/cgroup/cpu.stat') as f:
+            for line in f:
+                name, value = line.split()
+                if name == 'usage_usec':
+                    return int(value) / 1e6
+    except (OSError, ValueError):
+        pass
+    try:
+        with open('/sys/fs/cgroup/cpuacct/cpuacct.usage') as f:
+            return int(f.read()) / 1e9
+    except (OSError, ValueError):
+        pass
+    # Warm pdflatex workers are only counted once they are recycled
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class AdmissionController:
+    """Limits concurrent compiles to what the CPUs sustain and queues the rest with a deadline."""
+
+    def __init__(self, cpus: Optional[float] = None, min_limit: int = 1, max_limit: Optional[int] = None,
+                 queue_timeout: float = 30, max_queue: int = 32, target_utilization: float = 0.9,
+                 latency_tolerance: float = 1.5, interval: float = 2, probe_interval: float = 60,
+                 enabled: bool = True):
+        self.enabled = enabled
+        self.cpus = cpus or available_cpus()
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or math.ceil(self.cpus * 2))
+        self.limit = min(self.max_limit, max(self.min_limit, math.ceil(self.cpus)))
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.target_utilization = target_utilization
+        self.latency_tolerance = latency_tolerance
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        # Bumped whenever more compiles than CPUs start running, to tell which compiles were contended
+        self._contention = 0
+        # A limit found oversubscribed, not tried again until _ceiling_until
+        self._ceiling: Optional[int] = None
+        self._ceiling_until = 0.0
+        # Smoothed service time of all compiles, and of compiles with a CPU to themselves
+        self._service_time: Optional[float] = None
+        self._baseline: Optional[float] = None
+        self._utilization: Optional[float] = None
+        self._last_adjust = time.monotonic()
+        self._last_cpu = cpu_seconds()
+        self._stats = {'admitted': 0, 'waited': 0, 'rejected': 0, 'timeouts': 0,
+                       'wait_seconds': 0.0, 'increases': 0, 'decreases': 0}
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        """Create a controller configured from ADMISSION_* environment variables."""
+        return cls(
+            cpus=float(os.environ.get('ADMISSION_CPUS', 0)) or None,
+            min_limit=int(os.environ.get('ADMISSION_MIN_LIMIT', 1)),
+            max_limit=int(os.environ.get('ADMISSION_MAX_LIMIT', 0)) or None,
+            queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 30)),
+            max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 32)),
+            target_utilization=float(os.environ.get('ADMISSION_TARGET_UTILIZATION', 0.9)),
+            latency_tolerance=float(os.environ.get('ADMISSION_LATENCY_TOLERANCE', 1.5)),
+            interval=float(os.environ.get('ADMISSION_INTERVAL', 2)),
+            probe_interval=float(os.environ.get('ADMISSION_PROBE_INTERVAL', 60)),
+            enabled=os.environ.get('ADMISSION_CONTROL', '1').lower() not in ('0', 'false', 'no'),
+        )
+
+    def _expected_wait(self, position: int) -> float:
+        """Seconds until the compile at position in the queue can start, from the measured service time."""
+        return position * (self._service_time or 0) / self.limit
+
+    def _busy(self, reason: str, wait: float) -> GenerationError:
+        retry_after = max(1, math.ceil(wait))
+        return GenerationError(f'Server is busy ({reason}), retry later', 503,
+                               {'retry_after': retry_after}, headers={'Retry-After': str(retry_after)})
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """Hold a compile slot for the duration of the block; 503 if none frees up in time."""
+        if not self.enabled:
+            yield
+            return
+        start = time.monotonic()
+        with self._cond:
+            if self._in_flight >= self.limit:
+                wait = self._expected_wait(self._queued + 1)
+                if self._queued >= self.max_queue or wait > self.queue_timeout:
+                    self._stats['rejected'] += 1
+                    raise self._busy('too many compiles queued', wait)
+                self._queued += 1
+                self._stats['waited'] += 1
+                try:
+                    while self._in_flight >= self.limit:
+                        remaining = start + self.queue_timeout - time.monotonic()
+                        if remaining <= 0:
+                            self._stats['timeouts'] += 1
+                            raise self._busy('timed out waiting to compile', self._expected_wait(self._queued))
+                        self._cond.wait(remaining)
+                finally:
+                    self._queued -= 1
+            self._in_flight += 1
+            if self._in_flight > self.cpus:
+                self._contention += 1
+                contention = None
+            else:
+                contention = self._contention
+            self._stats['admitted'] += 1
+            self._stats['wait_seconds'] += time.monotonic() - start
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._finish(time.monotonic() - started, contention)
+
+    def _finish(self, elapsed: float, contention: Optional[int]) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if self._service_time is None:
+                self._service_time = elapsed
+            else:
+                self._service_time += SMOOTHING * (elapsed - self._service_time)
+            # Only compiles that had a CPU to themselves from start to finish
+            if contention == self._contention:
+                if self._baseline is None:
+                    self._baseline = elapsed
+                else:
+                    self._baseline += SMOOTHING * (elapsed - self._baseline)
+            now = time.monotonic()
+            if now - self._last_adjust >= self.interval:
+                self._adjust(now)
+            self._cond.notify()
+
+    def _adjust(self, now: float) -> None:
+        # Called with the condition held
+        cpu = cpu_seconds()
+        self._utilization = (cpu - self._last_cpu) / ((now - self._last_adjust) * self.cpus)
+        self._last_adjust, self._last_cpu = now, cpu
+        oversubscribed = (self._baseline is not None and
+                          self._service_time > self._baseline * self.latency_tolerance)
+        if oversubscribed and self.limit > self.min_limit:
+            self._ceiling, self._ceiling_until = self.limit, now + self.probe_interval
+            self.limit -= 1
+            self._stats['decreases'] += 1
+            logger.info(f"Compile limit lowered to {self.limit}: compiles take "
+                        f"{self._service_time:.2f}s against {self._baseline:.2f}s uncontended")
+        elif (not oversubscribed and self._queued and self._utilization < self.target_utilization
+              and self.limit < self.max_limit
+              and (self._ceiling is None or self.limit + 1 < self._ceiling or now >= self._ceiling_until)):
+            self.limit += 1
+            self._stats['increases'] += 1
+            self._cond.notify()
+            logger.info(f"Compile limit raised to {self.limit}: CPU utilization "
+                        f"{self._utilization:.0%} with {self._queued} compiles queued")
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """Chosen limit, compiles running and queued, measured service time and utilization, and counters."""
+        with self._cond:
+            return {
+                **self._stats,
+                'wait_seconds': round(self._stats['wait_seconds'], 3),
+                'limit': self.limit,
+                'min_limit': self.min_limit,
+                'max_limit': self.max_limit,
+                'cpus': self.cpus,
+                'in_flight': self._in_flight,
+                'queued': self._queued,
+                'service_time_ms': round(self._service_time * 1000, 1) if self._service_time is not None else 0,
+                'baseline_ms': round(self._baseline * 1000, 1) if self._baseline is not None else 0,
+                'utilization': round(self._utilization, 3) if self._utilization is not None else 0,
+            }
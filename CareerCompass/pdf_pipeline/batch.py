@@ -0,0 +1,105 @@
+"""Batch generation: request parsing and a streamed ZIP of results.
+
+Documents for a whole batch are fetched up front (see
+``DocumentStore.get_many``), rendered and compiled in parallel, and each PDF is written into a ZIP
+archive as soon as it finishes so the client starts receiving data before the
+last compile is done. Per-item outcomes are listed in a trailing
+``manifest.json`` entry.
+"""
+import io
+import json
+import logging
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pdf_pipeline.errors import GenerationError
+
+logger = logging.getLogger(__name__)
+
+def parse_batch_items(data: Any, id_field: str, max_items: int) -> List[Tuple[str, str]]:
+    """Validate a batch request body into (user_id, document_id) pairs."""
+    items = data.get('items') if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise GenerationError('items must be a non-empty list', 400)
+    if len(items) > max_items:
+        raise GenerationError(f'At most {max_items} items are allowed per batch', 400)
+    pairs = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('user_id') or not item.get(id_field):
+            raise GenerationError(f'Each item needs user_id and {id_field}', 400)
+        user_id, document_id = item['user_id'], item[id_field]
+        # IDs become Firestore path segments, so they must not contain separators
+        if not all(isinstance(v, str) and '/' not in v for v in (user_id, document_id)):
+            raise GenerationError(f'Invalid user_id or {id_field}', 400)
+        pairs.append((user_id, document_id))
+    return pairs
+
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink that hands written bytes back to a generator."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(items: Sequence[Tuple[str, str]], documents: Dict[Tuple[str, str], Optional[Dict]],
+               render: Callable[[Dict], Tuple[bytes, str]], max_workers: Optional[int] = None) -> Iterator[bytes]:
+    """Render every item in parallel and yield a ZIP archive as results complete.
+
+    render takes a document and returns (pdf_content, filename) like the
+    single-document endpoints, raising GenerationError on failure.
+    """
+    stream = _ZipStream()
+    manifest = []
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1) as executor:
+            futures = {}
+            for index, item in enumerate(items):
+                document = documents.get(item)
+                if document is None:
+                    manifest.append({'index': index, 'user_id': item[0], 'document_id': item[1],
+                                     'status': 'failed', 'error': 'Document not found'})
+                    continue
+                futures[executor.submit(render, document)] = index
+
+            try:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    user_id, document_id = items[index]
+                    entry = {'index': index, 'user_id': user_id, 'document_id': document_id}
+                    try:
+                        pdf_content, filename = future.result()
+                        entry['file'] = f'{index:04d}-{filename}.pdf'
+                        entry['status'] = 'done'
+                        # PDFs are already compressed, so store them as-is
+                        archive.writestr(entry['file'], pdf_content)
+                    except GenerationError as e:
+                        entry.update(status='failed', **e.to_dict())
+                    except Exception as e:
+                        logger.error(f"Error rendering batch item {index}: {e}")
+                        entry.update(status='failed', error='Internal server error')
+                    manifest.append(entry)
+                    yield stream.drain()
+            except GeneratorExit:
+                # Client went away; don't compile the rest of the batch
+                for future in futures:
+                    future.cancel()
+                raise
+
+        manifest.sort(key=lambda entry: entry['index'])
+        archive.writestr('manifest.json', json.dumps(manifest, indent=2))
+    yield stream.drain()
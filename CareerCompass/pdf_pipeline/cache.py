@@ -0,0 +1,185 @@
+"""Content-addressed cache for compiled PDFs.
+
+Compiled PDFs are keyed on a hash of the rendered LaTeX source, the template
+it came from and the TeX toolchain version, so byte-identical requests can be
+served without running pdflatex again.
+"""
+import hashlib
+import logging
+import os
+import subprocess
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def tex_toolchain_version() -> str:
+    """Return the first line of `pdflatex --version`, or 'unknown'."""
+    try:
+        result = subprocess.run(['pdflatex', '--version'], capture_output=True, text=True, timeout=10)
+        lines = result.stdout.splitlines()
+        return lines[0].strip() if lines else 'unknown'
+    except Exception as e:
+        logger.warning(f"Could not determine TeX version: {e}")
+        return 'unknown'
+
+
+def cache_key(latex_code: str, template_name: str, preamble_digest: str = '') -> str:
+    """Build the cache key for a rendered LaTeX document."""
+    digest = hashlib.sha256()
+    for part in (template_name, preamble_digest, tex_toolchain_version(), latex_code):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class PdfCache:
+    """Two-tier (memory LRU + optional disk) cache of compiled PDFs.
+
+    Also holds rendered page previews (see pdf_pipeline.preview); entries are
+    opaque bytes.
+
+    A shared disk tier (shared_disk, <prefix>_DISK_SHARED=1) is a directory
+    other instances write to as well, such as a Cloud Storage bucket mounted
+    with gcsfuse. Listing it is a bucket list and touching a file rewrites its
+    metadata, so the tier is left alone after a write: no access times, no
+    eviction (use a bucket lifecycle rule, see deploy.sh). Files are written in
+    place, since gcsfuse renames by copying the object; gcsfuse uploads a file
+    when it is closed, so readers never see part of one.
+    """
+
+    def __init__(self, max_entries: int = 128, max_memory_bytes: int = 64 * 1024 * 1024,
+                 disk_dir: Optional[str] = None, max_disk_bytes: int = 512 * 1024 * 1024,
+                 shared_disk: bool = False):
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.shared_disk = shared_disk
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, prefix: str = 'PDF_CACHE') -> 'PdfCache':
+        """Create a cache configured from <prefix>_* (default PDF_CACHE_*) environment variables."""
+        return cls(
+            max_entries=int(os.environ.get(f'{prefix}_MAX_ENTRIES', 128)),
+            max_memory_bytes=int(os.environ.get(f'{prefix}_MAX_MEMORY_MB', 64)) * 1024 * 1024,
+            disk_dir=os.environ.get(f'{prefix}_DIR') or None,
+            max_disk_bytes=int(os.environ.get(f'{prefix}_MAX_DISK_MB', 512)) * 1024 * 1024,
+            shared_disk=os.environ.get(f'{prefix}_DISK_SHARED', '').lower() in ('1', 'true', 'yes'),
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the cached PDF for key, or None on a miss."""
+        with self._lock:
+            pdf = self._entries.get(key)
+            if pdf is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return pdf
+
+        pdf = self._read_disk(key)
+        with self._lock:
+            if pdf is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._store_memory(key, pdf)
+        return pdf
+
+    def put(self, key: str, pdf: bytes) -> None:
+        """Store a compiled PDF under key."""
+        with self._lock:
+            self._stats['stores'] += 1
+            self._store_memory(key, pdf)
+        self._write_disk(key, pdf)
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and current sizes."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['memory_bytes'] = self._memory_bytes
+        return stats
+
+    def _store_memory(self, key: str, pdf: bytes) -> None:
+        if len(pdf) > self.max_memory_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._entries[key] = pdf
+        self._memory_bytes += len(pdf)
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._memory_bytes > self.max_memory_bytes):
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f'{key}.pdf')
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                pdf = f.read()
+            if not self.shared_disk:
+                os.utime(path)
+            return pdf
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Error reading cached PDF {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, pdf: bytes) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            if self.shared_disk:
+                with open(path, 'wb') as f:
+                    f.write(pdf)
+                return
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf)
+            os.replace(tmp_path, path)
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Error writing cached PDF {key}: {e}")
+
+    def _evict_disk(self) -> None:
+        """Delete least recently used files until the disk tier fits its budget."""
+        files = []
+        total = 0
+        with os.scandir(self.disk_dir) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf'):
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self._stats['evictions'] += 1
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,235 @@
+"""pdflatex pass driver: rerun detection, .aux reuse and structured errors.
+
+A compile runs one pdflatex pass and reads the ``.log``. Another pass runs only
+if LaTeX asks for one to fix cross-references, up to TEX_MAX_PASSES. Outline
+(bookmark) rerun requests are ignored; they don't change the printed page
+and would double the compile time of every new document.
+
+Before the first pass the working directory is seeded with the ``.aux``/``.out``
+files of an earlier compile of identical source and arguments, so a repeat
+finishes in one pass. Files are only kept from compiles whose last pass read
+exactly the files it wrote: the seeded pass then reads what that pass read
+and writes the same PDF, so the output doesn't depend on which compiles came
+before (download ETags rely on that). They are never shared between
+documents, since they carry each document's labels and bookmarks.
+
+A PDF is accepted whenever one was produced. With ``-interaction=nonstopmode``
+pdflatex exits non-zero for recoverable errors too, so the exit status says
+nothing about whether the output is usable. TeX errors from the log are
+returned as ``Diagnostic`` entries so callers can report the offending line
+and field instead of a bare failure.
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from pdf_pipeline.errors import GenerationError
+
+logger = logging.getLogger(__name__)
+
+# Auxiliary files carried between passes and between compiles
+AUX_EXTENSIONS = ('aux', 'out', 'toc')
+
+# Log messages that mean cross-references are not settled yet
+RERUN_PATTERN = re.compile(
+    r'Label\(s\) may have changed|Rerun to get cross-references right|Please rerun LaTeX|Rerun LaTeX'
+)
+LINE_PATTERN = re.compile(r'^l\.(\d+) ?(.*)$')
+
+# Field values shorter than this appear on too many lines to pin an error on
+MIN_FIELD_LENGTH = 4
+
+
+class Diagnostic(NamedTuple):
+    """One TeX error: the message, the source line and the field it came from."""
+    message: str
+    line: Optional[int] = None
+    context: str = ''
+    field: Optional[str] = None
+
+
+class CompileResult(NamedTuple):
+    pdf: Optional[bytes]
+    passes: int = 0
+    errors: Tuple[Diagnostic, ...] = ()
+    timed_out: bool = False
+
+
+def parse_log(log: str) -> Tuple[List[Diagnostic], bool]:
+    """Extract errors and whether a rerun was requested from a pdflatex log."""
+    errors = []
+    lines = log.splitlines()
+    for index, line in enumerate(lines):
+        if not line.startswith('! '):
+            continue
+        message, number, context = line[2:].strip(), None, ''
+        # The input line follows within a few lines as "l.<n> <text before the error>"
+        for following in lines[index + 1:index + 15]:
+            if following.startswith('! '):
+                break
+            match = LINE_PATTERN.match(following)
+            if match:
+                number, context = int(match.group(1)), match.group(2).strip()
+                break
+        errors.append(Diagnostic(message, number, context))
+    return errors, bool(RERUN_PATTERN.search(log))
+
+
+def _flatten(value: Any, path: str) -> Iterable[Tuple[str, str]]:
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f'{path}.{key}' if path else str(key))
+    elif isinstance(value, (list, tuple)):
+        for index, item in enumerate(value):
+            yield from _flatten(item, f'{path}[{index}]')
+    elif isinstance(value, str) and len(value) >= MIN_FIELD_LENGTH:
+        yield path, value
+
+
+def locate_fields(errors: Sequence[Diagnostic], source: str, data: Dict) -> List[Diagnostic]:
+    """Attach to each error the data field whose value appears on its source line."""
+    source_lines = source.splitlines()
+    fields = sorted(_flatten(data, ''), key=lambda item: len(item[1]), reverse=True)
+    located = []
+    for error in errors:
+        field = None
+        if error.line and error.line <= len(source_lines):
+            text = source_lines[error.line - 1]
+            field = next((path for path, value in fields if value in text), None)
+        located.append(error._replace(field=field))
+    return located
+
+
+def compile_error(result: CompileResult, source: str, data: Dict) -> GenerationError:
+    """The error to report for a compile that produced no PDF.
+
+    LaTeX errors are the document's fault and come back as 422 with
+    diagnostics naming the offending line and field, so clients don't retry.
+    """
+    if result.errors:
+        diagnostics = [error._asdict() for error in locate_fields(result.errors, source, data)]
+        return GenerationError('LaTeX compilation failed', 422, {'diagnostics': diagnostics})
+    if result.timed_out:
+        return GenerationError('PDF compilation timed out', 503)
+    return GenerationError('Failed to compile PDF')
+
+
+class CompileDriver:
+    """Runs as many pdflatex passes as a document needs, reusing .aux state."""
+
+    def __init__(self, max_passes: int = 3, aux_cache_entries: int = 256):
+        self.max_passes = max_passes
+        self.aux_cache_entries = aux_cache_entries
+        self._aux: 'OrderedDict[str, Dict[str, bytes]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'compiles': 0, 'passes': 0, 'reruns': 0, 'unsettled': 0, 'failures': 0,
+                       'aux_hits': 0}
+
+    @classmethod
+    def from_env(cls) -> 'CompileDriver':
+        """Create a driver configured from TEX_MAX_PASSES and TEX_AUX_CACHE_ENTRIES."""
+        return cls(
+            max_passes=int(os.environ.get('TEX_MAX_PASSES', 3)),
+            aux_cache_entries=int(os.environ.get('TEX_AUX_CACHE_ENTRIES', 256)),
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    @staticmethod
+    def _key(source: str, args: Sequence[str]) -> str:
+        content = hashlib.sha256(source.encode('utf-8'))
+        for arg in args:
+            content.update(b'\0' + arg.encode('utf-8'))
+        return content.hexdigest()
+
+    @staticmethod
+    def _read_aux(directory: str, jobname: str) -> Dict[str, bytes]:
+        files = {}
+        for ext in AUX_EXTENSIONS:
+            path = os.path.join(directory, f'{jobname}.{ext}')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    files[ext] = f.read()
+        return files
+
+    def _seed(self, directory: str, jobname: str, key: str) -> None:
+        with self._lock:
+            files = self._aux.get(key)
+            if files is not None:
+                self._aux.move_to_end(key)
+                self._stats['aux_hits'] += 1
+        for ext, content in (files or {}).items():
+            with open(os.path.join(directory, f'{jobname}.{ext}'), 'wb') as f:
+                f.write(content)
+
+    def _remember(self, key: str, files: Dict[str, bytes]) -> None:
+        with self._lock:
+            self._aux[key] = files
+            self._aux.move_to_end(key)
+            while len(self._aux) > self.aux_cache_entries:
+                self._aux.popitem(last=False)
+
+    def run(self, directory: str, jobname: str, source: str, args: Sequence[str],
+            run_pass: Callable[[int], bool]) -> CompileResult:
+        """Compile the document already written to directory.
+
+        run_pass(pass_number) runs one pdflatex pass producing ``<jobname>.log``
+        and ``<jobname>.pdf`` in directory, returning False if it timed out or
+        crashed.
+        """
+        key = self._key(source, args)
+        self._seed(directory, jobname, key)
+        self._count('compiles')
+        log_path = os.path.join(directory, f'{jobname}.log')
+        pdf_path = os.path.join(directory, f'{jobname}.pdf')
+
+        errors: List[Diagnostic] = []
+        rerun = False
+        passes = 0
+        while passes < self.max_passes:
+            passes += 1
+            self._count('passes')
+            read = self._read_aux(directory, jobname)
+            if not run_pass(passes):
+                self._count('failures')
+                return CompileResult(None, passes, (), True)
+            log = ''
+            if os.path.exists(log_path):
+                with open(log_path, encoding='utf-8', errors='replace') as f:
+                    log = f.read()
+            errors, rerun = parse_log(log)
+            if not rerun or errors or not os.path.exists(pdf_path):
+                break
+            self._count('reruns')
+
+        if not os.path.exists(pdf_path):
+            self._count('failures')
+            return CompileResult(None, passes, tuple(errors))
+        with open(pdf_path, 'rb') as f:
+            pdf = f.read()
+        if rerun:
+            self._count('unsettled')
+            logger.warning(f"Cross-references still changing after {passes} passes")
+        else:
+            written = self._read_aux(directory, jobname)
+            # Otherwise a seeded compile would read different files than the last pass did (an
+            # ignored outline rerun) and write a different PDF
+            if written == read:
+                self._remember(key, written)
+        if errors:
+            logger.warning(f"LaTeX reported {len(errors)} recoverable errors; first: {errors[0].message}"
+                           f" (line {errors[0].line})")
+        return CompileResult(pdf, passes, tuple(errors))
+
+    def stats(self) -> Dict[str, int]:
+        """Pass, rerun and .aux cache counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['aux_entries'] = len(self._aux)
+        return stats
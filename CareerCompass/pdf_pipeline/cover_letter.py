@@ -0,0 +1,114 @@
+"""Cover letter validation and template environment.
+
+Used by the cover letter service and by the resume service's combined
+``/generate-application`` endpoint, which renders a cover letter next to a
+resume in one request. Both must produce the same LaTeX for the same document.
+"""
+import os
+import re
+from datetime import datetime
+from typing import Dict, List
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from pdf_pipeline.incremental import section_digest
+from pdf_pipeline.latex import escape_latex
+from pdf_pipeline.payload import PayloadLimits
+from pdf_pipeline.pipeline import DocumentKind, ValidatedDocument
+
+TEMPLATE_NAME = 'cover_letter_template'
+
+
+def template_environment(template_dir: str) -> Environment:
+    """Jinja environment for the cover letter template in template_dir."""
+    return Environment(
+        loader=FileSystemLoader(template_dir),
+        autoescape=select_autoescape(['html', 'xml']),
+        block_start_string='<%',
+        block_end_string='%>',
+        variable_start_string='<<',
+        variable_end_string='>>',
+        comment_start_string='<#',
+        comment_end_string='#>'
+    )
+
+
+def payload_limits() -> PayloadLimits:
+    """Size limits for cover letter documents; the body may be longer than other fields."""
+    return PayloadLimits.from_env({'body': int(os.environ.get('PAYLOAD_MAX_BODY_LENGTH', 100_000))})
+
+
+def format_cover_letter_body(text: str) -> str:
+    """Format cover letter body text for LaTeX with proper paragraph breaks."""
+    if not text:
+        return ""
+
+    # First escape LaTeX special characters
+    escaped_text = escape_latex(text)
+
+    # Split into paragraphs (double line breaks or single line breaks)
+    paragraphs = re.split(r'\n\s*\n', escaped_text.strip())
+
+    # If no double line breaks found, split on single line breaks
+    if len(paragraphs) == 1:
+        paragraphs = escaped_text.strip().split('\n')
+
+    # Clean up each paragraph and join with LaTeX paragraph breaks
+    formatted_paragraphs = []
+    for para in paragraphs:
+        para = para.strip()
+        if para:  # Only add non-empty paragraphs
+            formatted_paragraphs.append(para)
+
+    # Join paragraphs with double line breaks for LaTeX
+    return '\n\n'.join(formatted_paragraphs)
+
+
+def validate_cover_letter_data(data: Dict) -> Dict:
+    """Validate and format cover letter data."""
+    validated_data = {}
+
+    # Basic information
+    validated_data['cover_letter_name'] = escape_latex(data.get('coverLetterName', ''))
+    validated_data['sender_name'] = escape_latex(data.get('senderName', ''))
+    validated_data['sender_email'] = escape_latex(data.get('senderEmail', ''))
+    validated_data['sender_phone'] = escape_latex(data.get('senderPhoneNumber', ''))
+    validated_data['sender_linkedin'] = escape_latex(data.get('senderLinkedInUrl', ''))
+    validated_data['company'] = escape_latex(data.get('company', ''))
+    validated_data['position'] = escape_latex(data.get('position', ''))
+
+    # Format the body text with proper paragraph breaks
+    validated_data['body'] = format_cover_letter_body(data.get('body', ''))
+
+    # Format the date
+    validated_data['date'] = datetime.now().strftime('%B %d, %Y')
+
+    return validated_data
+
+
+class CoverLetterKind(DocumentKind):
+    """Cover letters, rendered with the single cover letter template."""
+
+    name = 'cover_letter'
+    title = 'Cover letter'
+    collection = 'coverLetters'
+    id_field = 'cover_letter_id'
+    version_header = 'X-Cover-Letter-Version'
+    default_filename = 'cover_letter'
+
+    def __init__(self, env: Environment):
+        self.env = env
+
+    def templates(self) -> List[str]:
+        return [TEMPLATE_NAME]
+
+    def validate(self, data: Dict) -> ValidatedDocument:
+        validated = validate_cover_letter_data(data)
+        # The date is part of the letter, so the version changes with it
+        return ValidatedDocument(TEMPLATE_NAME, validated, section_digest([TEMPLATE_NAME, validated]))
+
+    def render(self, document: ValidatedDocument) -> str:
+        return self.env.get_template(f'{document.template_name}.tex').render(**document.data)
+
+    def filename(self, data: Dict) -> str:
+        return data.get('cover_letter_name', 'Cover_Letter')
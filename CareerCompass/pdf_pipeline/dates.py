@@ -0,0 +1,98 @@
+"""Normalization of resume dates to "Mon YYYY".
+
+Firestore documents hold dates in whatever form the app wrote them: Timestamp
+values (``datetime`` subclasses in the Python client), HTTP-style GMT strings,
+ISO 8601 strings, bare years and free text. ``format_date`` turns any of them
+into the short form the templates print:
+
+* ``datetime``/``date`` values are formatted directly.
+* ``Sat, 01 Jul 2023 00:00:00 GMT`` and ISO strings with a time give ``Jul 2023``.
+* Strings of up to 8 characters (``2023``, ``Present``, ``06/2023``) are kept.
+* Longer strings containing a 20xx year give ``Mon YYYY`` if a month can be
+  found next to it, otherwise the year; anything else is returned unchanged.
+
+The same few dates appear on every render of a user's resume, so string
+parses are memoized (DATE_CACHE_MAX_ENTRIES, default 4096).
+"""
+import os
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+_YEAR = re.compile(r'20\d{2}')
+_MONTH_PAIR = re.compile(r'(\d{1,2})-(\d{1,2})')
+
+
+def _month_year(value: date) -> str:
+    # strftime('%b') depends on the locale; templates are English
+    return f'{MONTHS[value.month - 1]} {value.year}'
+
+
+@lru_cache(maxsize=int(os.environ.get('DATE_CACHE_MAX_ENTRIES', 4096)))
+def _format_string(date_str: str) -> str:
+    if not date_str:
+        return ""
+
+    # HTTP date as written by the app's backend
+    if "GMT" in date_str:
+        try:
+            return _month_year(datetime.strptime(date_str, "%a, %d %b %Y %H:%M:%S %Z"))
+        except ValueError:
+            pass
+
+    # ISO 8601 with a time, with or without an offset
+    if ":" in date_str and ("-" in date_str or "+" in date_str):
+        try:
+            return _month_year(datetime.fromisoformat(date_str.replace('+00:00', '')))
+        except ValueError:
+            pass
+
+    # Bare years and short strings are already display-ready
+    if len(date_str) <= 8:
+        return date_str
+
+    year_match = _YEAR.search(date_str)
+    if year_match:
+        year = year_match.group()
+        month_match = _MONTH_PAIR.search(date_str)
+        if month_match:
+            month_num = int(month_match.group(2))
+            if 1 <= month_num <= 12:
+                return f"{MONTHS[month_num - 1]} {year}"
+        return year
+
+    return date_str
+
+
+def format_date(value: Any) -> str:
+    """Format a Firestore date value as "Mon YYYY" (see module docstring); "" for empty values."""
+    if not value:
+        return ""
+    # Timestamps come back as datetime subclasses; no need to print and re-parse them
+    if isinstance(value, date):
+        return _month_year(value)
+    return _format_string(str(value))
+
+
+def format_dates(values: Iterable[Any]) -> List[str]:
+    """format_date for many values, parsing each distinct string once."""
+    formatted: Dict[str, str] = {}
+    results = []
+    for value in values:
+        if isinstance(value, str):
+            result = formatted.get(value)
+            if result is None:
+                result = formatted[value] = format_date(value)
+        else:
+            result = format_date(value)
+        results.append(result)
+    return results
+
+
+def stats() -> Dict[str, int]:
+    """Parse memo counters."""
+    info = _format_string.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'entries': info.currsize}
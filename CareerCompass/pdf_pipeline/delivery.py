@@ -0,0 +1,256 @@
+"""PDF post-processing and HTTP delivery.
+
+``PdfOptimizer`` runs on every fresh compile, before the PDF is cached:
+
+* With ``qpdf`` installed (PDF_OPTIMIZE, on by default) it packs objects into
+  compressed object streams and recompresses every stream at the highest
+  zlib level, with a ``/ID`` derived from the content so the output stays
+  reproducible. The result is kept only if it is smaller.
+* With PDF_FONT_CHECK=1 and poppler's ``pdffonts`` installed it counts fonts
+  that are not embedded or not subset, which make a PDF much bigger and can
+  change how it looks on the phone.
+
+``PdfDelivery`` builds the download response:
+
+* The ``ETag`` is a hash of the PDF bytes. Compiles are reproducible (see
+  pdf_pipeline.sandbox), so a recompile after a cache eviction, or on another
+  instance, gives the same bytes and the same ETag. A client that sends a
+  matching ``If-None-Match`` gets a 304.
+* GET requests honour a single byte ``Range`` (and ``If-Range``) with a 206,
+  so an interrupted download resumes where it stopped.
+* The response is gzip (or Brotli, if the ``brotli`` module is installed)
+  compressed when the client accepts it and it saves at least
+  PDF_COMPRESSION_MIN_SAVING of the size. PDF content streams are already
+  compressed, so this mostly helps uncompressed fonts and metadata.
+  Compressed variants are cached and have their own ETag.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+from typing import Dict, Optional
+
+from flask import Response, request
+
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.workspace import WorkspacePool
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_PDFFONTS_ROW = re.compile(r'\s(yes|no)\s+(yes|no)\s+(yes|no)\s+\d+\s+\d+\s*$')
+
+
+class PdfOptimizer:
+    """Shrinks freshly compiled PDFs with qpdf and checks their fonts."""
+
+    def __init__(self, workspaces: WorkspacePool, enabled: bool = True, font_check: bool = False,
+                 timeout: float = 10):
+        self.workspaces = workspaces
+        self.enabled = enabled and shutil.which('qpdf') is not None
+        self.font_check = font_check and shutil.which('pdffonts') is not None
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stats = {'optimized': 0, 'not_smaller': 0, 'failures': 0, 'bytes_saved': 0,
+                       'unembedded_fonts': 0, 'unsubset_fonts': 0}
+        if enabled and not self.enabled:
+            logger.info("qpdf is not installed; PDFs are cached as pdflatex wrote them")
+
+    @classmethod
+    def from_env(cls, workspaces: WorkspacePool) -> 'PdfOptimizer':
+        """Create an optimizer configured from PDF_OPTIMIZE, PDF_FONT_CHECK and PDF_OPTIMIZE_TIMEOUT."""
+        return cls(
+            workspaces,
+            enabled=os.environ.get('PDF_OPTIMIZE', '1').lower() not in ('0', 'false', 'no'),
+            font_check=os.environ.get('PDF_FONT_CHECK', '').lower() in ('1', 'true', 'yes'),
+            timeout=float(os.environ.get('PDF_OPTIMIZE_TIMEOUT', 10)),
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    @property
+    def active(self) -> bool:
+        """Whether optimize does anything."""
+        return self.enabled or self.font_check
+
+    def optimize(self, pdf: bytes) -> bytes:
+        """Return the smaller of pdf and its qpdf-optimized version."""
+        if not self.active:
+            return pdf
+        with self.workspaces.workspace() as directory:
+            source = os.path.join(directory, 'input.pdf')
+            with open(source, 'wb') as f:
+                f.write(pdf)
+            if self.font_check:
+                self._check_fonts(source)
+            if not self.enabled:
+                return pdf
+            target = os.path.join(directory, 'output.pdf')
+            cmd = ['qpdf', '--object-streams=generate', '--compress-streams=y', '--recompress-flate',
+                   '--compression-level=9', '--deterministic-id', source, target]
+            try:
+                result = subprocess.run(cmd, capture_output=True, timeout=self.timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.warning(f"qpdf failed: {e}")
+                self._count('failures')
+                return pdf
+            # Exit status 3 means warnings; the output is still written
+            if result.returncode not in (0, 3) or not os.path.exists(target):
+                logger.warning(f"qpdf failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+                self._count('failures')
+                return pdf
+            with open(target, 'rb') as f:
+                optimized = f.read()
+        if len(optimized) >= len(pdf):
+            self._count('not_smaller')
+            return pdf
+        self._count('optimized')
+        self._count('bytes_saved', len(pdf) - len(optimized))
+        return optimized
+
+    def _check_fonts(self, path: str) -> None:
+        try:
+            result = subprocess.run(['pdffonts', path], capture_output=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"pdffonts failed: {e}")
+            return
+        # Columns: name type encoding emb sub uni object ID
+        for line in result.stdout.decode('utf-8', 'replace').splitlines()[2:]:
+            match = _PDFFONTS_ROW.search(line)
+            if not match:
+                continue
+            embedded, subset, _ = match.groups()
+            if embedded == 'no':
+                self._count('unembedded_fonts')
+                logger.warning(f"Font is not embedded: {line.split()[0]}")
+            elif subset == 'no':
+                self._count('unsubset_fonts')
+                logger.warning(f"Font is embedded in full instead of subset: {line.split()[0]}")
+
+    def stats(self) -> Dict[str, int]:
+        """Optimization and font check counters."""
+        with self._lock:
+            return dict(self._stats)
+
+
+class PdfDelivery:
+    """Builds PDF download responses with validators, ranges and compression."""
+
+    def __init__(self, cache: PdfCache, compression: bool = True, min_saving: float = 0.05,
+                 min_size: int = 1024, level: int = 6):
+        # Compressed variants by ETag and encoding; b'' when compression doesn't pay off
+        self.cache = cache
+        self.compression = compression
+        self.min_saving = min_saving
+        self.min_size = min_size
+        self.level = level
+        self.encodings = ('br', 'gzip') if brotli else ('gzip',)
+        self._lock = threading.Lock()
+        self._stats = {'responses': 0, 'not_modified': 0, 'partial': 0, 'unsatisfiable': 0,
+                       'compressed': 0, 'bytes_sent': 0, 'bytes_saved': 0}
+
+    @classmethod
+    def from_env(cls) -> 'PdfDelivery':
+        """Create a delivery configured from PDF_COMPRESSION* and COMPRESSED_CACHE_* environment variables."""
+        return cls(
+            cache=PdfCache.from_env('COMPRESSED_CACHE'),
+            compression=os.environ.get('PDF_COMPRESSION', '1').lower() not in ('0', 'false', 'no'),
+            min_saving=float(os.environ.get('PDF_COMPRESSION_MIN_SAVING', 0.05)),
+            min_size=int(os.environ.get('PDF_COMPRESSION_MIN_SIZE', 1024)),
+            level=int(os.environ.get('PDF_COMPRESSION_LEVEL', 6)),
+        )
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    @staticmethod
+    def etag(pdf: bytes) -> str:
+        """Strong validator of the PDF bytes."""
+        return hashlib.sha256(pdf).hexdigest()[:32]
+
+    def _compress(self, pdf: bytes, etag: str, encoding: str) -> Optional[bytes]:
+        key = f'{etag}-{encoding}'
+        compressed = self.cache.get(key)
+        if compressed is None:
+            if encoding == 'br':
+                compressed = brotli.compress(pdf, quality=min(self.level, 11))
+            else:
+                compressed = gzip.compress(pdf, compresslevel=self.level, mtime=0)
+            if len(compressed) > len(pdf) * (1 - self.min_saving):
+                compressed = b''
+            self.cache.put(key, compressed)
+        return compressed or None
+
+    def _encoding(self) -> Optional[str]:
+        accepted = request.accept_encodings
+        for encoding in self.encodings:
+            if accepted[encoding]:
+                return encoding
+        return None
+
+    def respond(self, pdf: bytes, filename: str, headers: Optional[Dict[str, str]] = None) -> Response:
+        """Download response for pdf, honouring If-None-Match, Range/If-Range and Accept-Encoding."""
+        etag = self.etag(pdf)
+        headers = {
+            **(headers or {}),
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'private, no-cache',
+            'Accept-Ranges': 'bytes',
+            'Vary': 'Accept-Encoding',
+        }
+        self._count('responses')
+
+        # Any encoding of these bytes is the same document to the client
+        tags = (etag, *(f'{etag}-{encoding}' for encoding in self.encodings))
+        if any(request.if_none_match.contains_weak(tag) for tag in tags):
+            self._count('not_modified')
+            return Response(status=304, headers={**headers, 'ETag': f'"{etag}"'})
+
+        # Ranges are only defined for GET; a stale If-Range gets the whole document
+        byte_range = request.range if request.method in ('GET', 'HEAD') else None
+        if_range = request.if_range
+        if if_range.date is not None or if_range.etag not in (None, etag):
+            byte_range = None
+        if byte_range:
+            if len(byte_range.ranges) == 1:
+                span = byte_range.range_for_length(len(pdf))
+                if span is None:
+                    self._count('unsatisfiable')
+                    return Response(status=416, headers={**headers, 'ETag': f'"{etag}"',
+                                                         'Content-Range': f'bytes */{len(pdf)}'})
+                start, stop = span
+                self._count('partial')
+                self._count('bytes_sent', stop - start)
+                return Response(pdf[start:stop], status=206, mimetype='application/pdf',
+                                headers={**headers, 'ETag': f'"{etag}"',
+                                         'Content-Range': f'bytes {start}-{stop - 1}/{len(pdf)}'})
+
+        encoding = None
+        if self.compression and len(pdf) >= self.min_size and not byte_range:
+            encoding = self._encoding()
+        compressed = self._compress(pdf, etag, encoding) if encoding else None
+        if compressed:
+            self._count('compressed')
+            self._count('bytes_saved', len(pdf) - len(compressed))
+            self._count('bytes_sent', len(compressed))
+            return Response(compressed, mimetype='application/pdf',
+                            headers={**headers, 'ETag': f'"{etag}-{encoding}"', 'Content-Encoding': encoding})
+
+        self._count('bytes_sent', len(pdf))
+        return Response(pdf, mimetype='application/pdf', headers={**headers, 'ETag': f'"{etag}"'})
+
+    def stats(self) -> Dict[str, int]:
+        """Response counters: 304s, 206s, compressed responses and bytes sent and saved."""
+        with self._lock:
+            return dict(self._stats)
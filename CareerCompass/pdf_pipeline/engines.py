@@ -0,0 +1,100 @@
+"""Compile engines: how prepared LaTeX source becomes a PDF.
+
+An engine takes the source and pdflatex arguments produced by
+``FormatStore.prepare`` and returns a ``CompileResult``. Two are built in:
+
+* ``warm`` (the default): ``TexWorkerPool``, pre-warmed pdflatex processes
+  waiting for their next document (see ``pdf_pipeline.workers``).
+* ``pdflatex``: a fresh pdflatex per pass in a pooled scratch directory.
+
+TEX_ENGINE picks one; ``warm`` with TEX_POOL_SIZE=0 falls back to
+``pdflatex``. Another backend plugs in by adding a factory to ``ENGINES``.
+All engines run pdflatex through the same ``CompileDriver`` (pass control,
+.aux reuse, diagnostics) and ``TexSandbox`` (limits).
+"""
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Protocol, Sequence
+
+from pdf_pipeline.compiler import CompileDriver, CompileResult
+from pdf_pipeline.sandbox import TexSandbox
+from pdf_pipeline.workers import TexWorkerPool
+from pdf_pipeline.workspace import WorkspacePool
+
+logger = logging.getLogger(__name__)
+
+
+class CompileEngine(Protocol):
+    """What the pipeline needs from an engine."""
+    name: str
+    # Prefix of the engine's stats on /metrics, and the keys that are gauges rather than counters
+    metrics_prefix: str
+    stats_gauges: Sequence[str]
+
+    def compile(self, source: str, args: Optional[List[str]] = None,
+                env: Optional[Dict[str, str]] = None) -> CompileResult:
+        ...
+
+    def stats(self) -> Dict[str, int]:
+        ...
+
+
+class PdflatexEngine:
+    """Runs a new sandboxed pdflatex process for every pass."""
+
+    name = 'pdflatex'
+    metrics_prefix = 'tex_workspace'
+    stats_gauges = ('free',)
+
+    def __init__(self, driver: CompileDriver, sandbox: TexSandbox, workspaces: WorkspacePool,
+                 jobname: str = 'document'):
+        self.driver = driver
+        self.sandbox = sandbox
+        self.workspaces = workspaces
+        self.jobname = jobname
+
+    def compile(self, source: str, args: Optional[List[str]] = None,
+                env: Optional[Dict[str, str]] = None) -> CompileResult:
+        """Compile source in a scratch directory; the result's pdf is None on failure."""
+        args = list(args or [])
+        try:
+            with self.workspaces.workspace() as directory:
+                tex_file = os.path.join(directory, f'{self.jobname}.tex')
+                with open(tex_file, 'w', encoding='utf-8') as f:
+                    f.write(source)
+                # The exit status is ignored: pdflatex exits non-zero on recoverable
+                # errors even though the PDF it produced is fine
+                command = [*args, '-interaction=nonstopmode', '-output-directory', directory, tex_file]
+                result = self.driver.run(directory, self.jobname, source, args,
+                                         lambda pass_number: self.sandbox.run(command, directory, env))
+        except Exception as e:
+            logger.error(f"Error compiling LaTeX: {e}")
+            return CompileResult(None)
+        if not result.pdf:
+            logger.error(f"LaTeX compilation failed: {[error.message for error in result.errors[:3]]}")
+        return result
+
+    def stats(self) -> Dict[str, int]:
+        """Scratch directory pool counters."""
+        return self.workspaces.stats()
+
+
+EngineFactory = Callable[[CompileDriver, TexSandbox, WorkspacePool], Optional[CompileEngine]]
+
+ENGINES: Dict[str, EngineFactory] = {
+    'warm': lambda driver, sandbox, workspaces: TexWorkerPool.from_env(driver, sandbox),
+    'pdflatex': PdflatexEngine,
+}
+
+
+def engine_from_env(driver: CompileDriver, sandbox: TexSandbox, workspaces: WorkspacePool) -> CompileEngine:
+    """The engine named by TEX_ENGINE (default warm)."""
+    name = os.environ.get('TEX_ENGINE', 'warm')
+    if name not in ENGINES:
+        raise ValueError(f"Unknown TEX_ENGINE {name}; expected one of {', '.join(ENGINES)}")
+    engine = ENGINES[name](driver, sandbox, workspaces)
+    if engine is None:
+        # The warm pool is turned off with TEX_POOL_SIZE=0
+        engine = PdflatexEngine(driver, sandbox, workspaces)
+    logger.info(f"Compiling with the {engine.name} engine")
+    return engine
@@ -0,0 +1,22 @@
+"""Errors raised by the PDF generation pipeline."""
+from typing import Any, Dict, Optional
+
+
+class GenerationError(Exception):
+    """A pipeline step failed; carries the message and HTTP status to report.
+
+    details are extra JSON fields for the error response, such as LaTeX
+    diagnostics; headers are extra response headers, such as Retry-After.
+    """
+
+    def __init__(self, message: str, status: int = 500, details: Optional[Dict[str, Any]] = None,
+                 headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+        self.details = details or {}
+        self.headers = headers or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON body for the error response."""
+        return {'error': self.message, **self.details}
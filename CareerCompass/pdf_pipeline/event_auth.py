@@ -0,0 +1,116 @@
+"""Checks that a document event came from the service's Eventarc trigger.
+
+The services allow unauthenticated requests (the app calls them directly),
+so Cloud Run doesn't check who POSTs to /document-events. Eventarc sends
+each event with a Google-signed OIDC token for the trigger's service account;
+``EventAuthenticator`` verifies the token's signature, expiry and audience
+and that it names PRERENDER_EVENT_INVOKER (set by deploy.sh). Anything else
+is refused: 401 without a valid token, 403 for another account, and 403 for
+every event when no invoker is configured.
+
+The audience is PRERENDER_EVENT_AUDIENCE, or the https URL of the host the
+request came in on, which is what Eventarc uses for a Cloud Run destination.
+Google's signing certificates are fetched once and kept for CERTS_TTL
+seconds; Google publishes new keys well before signing with them.
+
+PRERENDER_EVENT_AUTH=0 turns the check off, for local runs and benchmarks.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from pdf_pipeline.errors import GenerationError
+
+try:
+    from google.auth import jwt
+    from google.auth.transport.requests import Request as AuthRequest
+except ImportError:
+    jwt = None
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('https://accounts.google.com', 'accounts.google.com')
+CERTS_TTL = 3600
+
+
+class EventAuthenticator:
+    """Verifies the OIDC tokens Eventarc sends with document events."""
+
+    def __init__(self, invoker: Optional[str] = None, audience: Optional[str] = None, enabled: bool = True):
+        self.invoker = invoker
+        self.audience = audience
+        self.enabled = enabled
+        self._certs: Optional[Dict[str, str]] = None
+        self._certs_expiry = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'accepted': 0, 'unauthenticated': 0, 'forbidden': 0}
+        if enabled and not invoker:
+            logger.warning("PRERENDER_EVENT_INVOKER is not set; /document-events refuses every request")
+        elif enabled and jwt is None:
+            logger.error("google-auth is not installed; /document-events refuses every request")
+
+    @classmethod
+    def from_env(cls) -> 'EventAuthenticator':
+        """Create an authenticator configured from PRERENDER_EVENT_* environment variables."""
+        return cls(
+            invoker=os.environ.get('PRERENDER_EVENT_INVOKER') or None,
+            audience=os.environ.get('PRERENDER_EVENT_AUDIENCE') or None,
+            enabled=os.environ.get('PRERENDER_EVENT_AUTH', '1').lower() not in ('0', 'false', 'no'),
+        )
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _reject(self, status: int, reason: str) -> GenerationError:
+        self._count('unauthenticated' if status == 401 else 'forbidden')
+        logger.warning(f"Rejected document event: {reason}")
+        return GenerationError('Not authorized to send document events', status)
+
+    def certs(self) -> Dict[str, str]:
+        """Google's OIDC signing certificates by key ID."""
+        with self._lock:
+            if self._certs is not None and time.monotonic() < self._certs_expiry:
+                return self._certs
+        response = AuthRequest()(GOOGLE_CERTS_URL, method='GET')
+        if response.status != 200:
+            raise ValueError(f'Could not fetch Google certificates: HTTP {response.status}')
+        certs = json.loads(response.data)
+        with self._lock:
+            self._certs = certs
+            self._certs_expiry = time.monotonic() + CERTS_TTL
+        return certs
+
+    def verify(self, authorization: Optional[str], host: str) -> None:
+        """Raise a 401 or 403 GenerationError unless the Authorization header is the trigger's token."""
+        if not self.enabled:
+            return
+        if not self.invoker or jwt is None:
+            raise self._reject(403, 'event authentication is not configured')
+        scheme, _, token = (authorization or '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            raise self._reject(401, 'no bearer token')
+        try:
+            certs = self.certs()
+        except Exception as e:
+            logger.error(f"Error fetching Google certificates: {e}")
+            # Eventarc delivers the event again later
+            raise GenerationError('Could not verify the document event, retry later', 503)
+        try:
+            claims = jwt.decode(token, certs=certs, audience=self.audience or f'https://{host}')
+        except (ValueError, KeyError) as e:
+            raise self._reject(401, f'invalid token ({e})')
+        if claims.get('iss') not in GOOGLE_ISSUERS:
+            raise self._reject(401, f"token issued by {claims.get('iss')}")
+        if claims.get('email') != self.invoker or not claims.get('email_verified'):
+            raise self._reject(403, f"token for {claims.get('email')}")
+        self._count('accepted')
+
+    def stats(self) -> Dict[str, int]:
+        """Accepted and rejected event counters."""
+        with self._lock:
+            return dict(self._stats)
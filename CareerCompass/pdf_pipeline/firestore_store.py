@@ -0,0 +1,189 @@
+"""Cached Firestore read path shared by both services.
+
+Every request used to read its document from Firestore, so an edit shows up
+in the very next PDF. A cached copy may only be served while something
+guarantees the same: with ``watch`` enabled (FIRESTORE_CACHE_WATCH=1) each
+cached document (``users/{uid}/resumes/{id}``, ``users/{uid}/coverLetters/{id}``)
+gets a snapshot listener that drops the entry as soon as the document
+changes, and the entry is served for up to FIRESTORE_CACHE_TTL seconds. An
+entry whose listener couldn't be attached is never served. Without ``watch``
+every read goes to Firestore; the store then only shares one client between
+requests.
+
+Each listener is a stream held open by the client, so the number of cached
+documents, and of listeners, is capped by FIRESTORE_CACHE_MAX_ENTRIES
+(least recently used first out). Listeners added with ``add_listener`` are
+told about changes as well.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Firestore caps the number of documents in a single batched read
+GET_ALL_CHUNK_SIZE = 100
+
+
+class _Entry:
+    __slots__ = ('data', 'update_time', 'checked_at', 'watch')
+
+    def __init__(self, data: Dict, update_time: Any):
+        self.data = data
+        self.update_time = update_time
+        self.checked_at = time.monotonic()
+        self.watch = None
+
+
+class DocumentStore:
+    """Firestore document reads through one shared client and a cache kept current by snapshot listeners.
+
+    Returned dicts are shared with the cache and must be treated as read-only.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any], ttl: float = 30, max_entries: int = 100,
+                 watch: bool = False):
+        self.client_factory = client_factory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.watch = watch
+        self._client = None
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._listeners: List[Callable[[str], Any]] = []
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'reads': 0, 'not_found': 0, 'invalidations': 0}
+
+    @classmethod
+    def from_env(cls, client_factory: Callable[[], Any]) -> 'DocumentStore':
+        """Create a store configured from FIRESTORE_CACHE_* environment variables."""
+        return cls(
+            client_factory,
+            ttl=float(os.environ.get('FIRESTORE_CACHE_TTL', 30)),
+            max_entries=int(os.environ.get('FIRESTORE_CACHE_MAX_ENTRIES', 100)),
+            watch=os.environ.get('FIRESTORE_CACHE_WATCH', '').lower() in ('1', 'true', 'yes'),
+        )
+
+    @property
+    def client(self) -> Any:
+        """The shared Firestore client, created on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.client_factory()
+        return self._client
+
+    def _count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += amount
+
+    def _lookup(self, path: str) -> Optional[Dict]:
+        """The cached data for path if it is still known to be current, else None."""
+        with self._lock:
+            entry = self._entries.get(path)
+            # Only a listener tells us the document hasn't changed since it was read
+            if entry is None or entry.watch is None or time.monotonic() - entry.checked_at >= self.ttl:
+                return None
+            self._entries.move_to_end(path)
+            self._stats['hits'] += 1
+            return entry.data
+
+    def _store(self, path: str, snapshot: Any) -> Optional[Dict]:
+        if not snapshot.exists:
+            self.invalidate(path)
+            self._count('not_found')
+            return None
+        if not self.watch:
+            return snapshot.to_dict()
+        entry = _Entry(snapshot.to_dict(), snapshot.update_time)
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                evicted.append(previous)
+            self._entries[path] = entry
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1])
+        for old in evicted:
+            self._unwatch(old)
+        self._watch(path, entry)
+        return entry.data
+
+    def _watch(self, path: str, entry: _Entry) -> None:
+        def on_change(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                if not snapshot.exists or snapshot.update_time != entry.update_time:
+                    self.invalidate(path, entry)
+                    for listener in self._listeners:
+                        listener(path)
+        try:
+            watch = self.client.document(path).on_snapshot(on_change)
+        except Exception as e:
+            logger.warning(f"Could not watch {path}: {e}")
+            return
+        # The entry may have been invalidated or evicted while the listener was being attached
+        with self._lock:
+            if self._entries.get(path) is entry:
+                entry.watch = watch
+                return
+        try:
+            watch.unsubscribe()
+        except Exception as e:
+            logger.warning(f"Error stopping document listener: {e}")
+
+    @staticmethod
+    def _unwatch(entry: _Entry) -> None:
+        if entry.watch is not None:
+            try:
+                entry.watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error stopping document listener: {e}")
+            entry.watch = None
+
+    def add_listener(self, listener: Callable[[str], Any]) -> None:
+        """Call listener(path) when a watched document changes or is deleted."""
+        self._listeners.append(listener)
+
+    def invalidate(self, path: str, entry: Optional[_Entry] = None) -> None:
+        """Drop a cached document (only if it is still `entry`, when given)."""
+        with self._lock:
+            current = self._entries.get(path)
+            if current is None or (entry is not None and current is not entry):
+                return
+            del self._entries[path]
+            self._stats['invalidations'] += 1
+        self._unwatch(current)
+
+    def get(self, path: str) -> Optional[Dict]:
+        """Return the document at path, or None if it does not exist."""
+        data = self._lookup(path)
+        if data is not None:
+            return data
+        self._count('reads')
+        return self._store(path, self.client.document(path).get())
+
+    def get_many(self, paths: Sequence[str]) -> Dict[str, Optional[Dict]]:
+        """Read many documents, using batched get_all calls for the ones not cached."""
+        documents: Dict[str, Optional[Dict]] = {}
+        missing = []
+        for path in dict.fromkeys(paths):
+            documents[path] = self._lookup(path)
+            if documents[path] is None:
+                missing.append(path)
+
+        client = self.client
+        for start in range(0, len(missing), GET_ALL_CHUNK_SIZE):
+            chunk = missing[start:start + GET_ALL_CHUNK_SIZE]
+            self._count('reads', len(chunk))
+            for snapshot in client.get_all([client.document(path) for path in chunk]):
+                documents[snapshot.reference.path] = self._store(snapshot.reference.path, snapshot)
+        return documents
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters and size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        return stats
@@ -0,0 +1,141 @@
+"""Precompiled LaTeX format files for template preambles.
+
+Each template is split into a static preamble (``<preamble_dir>/<name>.tex``)
+and a per-user Jinja body. The preamble is dumped once into ``<name>.fmt`` so
+pdflatex only has to load the format instead of every package on each compile.
+A stamp file next to the format records the preamble and TeX version it was
+built from; stale or missing formats fall back to compiling the full source.
+
+Formats can be built ahead of time with::
+
+    python -m pdf_pipeline.formats <preamble_dir> <format_dir>
+"""
+import hashlib
+import logging
+import os
+import subprocess
+import sys
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from pdf_pipeline.cache import tex_toolchain_version
+
+logger = logging.getLogger(__name__)
+
+
+class CompileSpec(NamedTuple):
+    """LaTeX source plus the extra pdflatex arguments/environment to compile it with."""
+    source: str
+    args: List[str]
+    env: Optional[Dict[str, str]]
+
+
+class FormatStore:
+    """Builds, validates and hands out per-template format files."""
+
+    def __init__(self, preamble_dir: str, format_dir: str):
+        self.preamble_dir = preamble_dir
+        self.format_dir = format_dir
+        self._preambles: Dict[str, str] = {}
+        self._digests: Dict[str, str] = {}
+        self._ready: Dict[str, str] = {}
+        self._failed: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def preamble(self, name: str) -> str:
+        """Return the static preamble for a template."""
+        if name not in self._preambles:
+            with open(os.path.join(self.preamble_dir, f'{name}.tex'), encoding='utf-8') as f:
+                self._preambles[name] = f.read()
+        return self._preambles[name]
+
+    def digest(self, name: str) -> str:
+        """Hash of the preamble and TeX toolchain a format must be built from."""
+        if name not in self._digests:
+            digest = hashlib.sha256()
+            digest.update(tex_toolchain_version().encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(self.preamble(name).encode('utf-8'))
+            self._digests[name] = digest.hexdigest()
+        return self._digests[name]
+
+    def names(self) -> List[str]:
+        """List the templates that have a static preamble."""
+        return sorted(f[:-4] for f in os.listdir(self.preamble_dir) if f.endswith('.tex'))
+
+    def _stamp_path(self, name: str) -> str:
+        return os.path.join(self.format_dir, f'{name}.fmt.stamp')
+
+    def _is_fresh(self, name: str, digest: str) -> bool:
+        if not os.path.exists(os.path.join(self.format_dir, f'{name}.fmt')):
+            return False
+        try:
+            with open(self._stamp_path(name), encoding='utf-8') as f:
+                return f.read().strip() == digest
+        except OSError:
+            return False
+
+    def build(self, name: str) -> bool:
+        """Dump the preamble of a template into <format_dir>/<name>.fmt."""
+        digest = self.digest(name)
+        preamble_file = os.path.abspath(os.path.join(self.preamble_dir, f'{name}.tex'))
+        os.makedirs(self.format_dir, exist_ok=True)
+        cmd = [
+            'pdflatex', '-ini', '-interaction=nonstopmode', f'-jobname={name}',
+            f'-output-directory={self.format_dir}',
+            '&pdflatex', f'\\input{{{preamble_file}}}\\dump',
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=self.format_dir, timeout=120)
+        except Exception as e:
+            logger.error(f"Error building format {name}: {e}")
+            return False
+        if result.returncode != 0 or not os.path.exists(os.path.join(self.format_dir, f'{name}.fmt')):
+            logger.error(f"Format build failed for {name}: {result.stdout[-2000:]}")
+            return False
+        with open(self._stamp_path(name), 'w', encoding='utf-8') as f:
+            f.write(digest)
+        logger.info(f"Built LaTeX format for template: {name}")
+        return True
+
+    def build_all(self) -> Dict[str, bool]:
+        """Build formats for every template preamble."""
+        return {name: self.build(name) for name in self.names()}
+
+    def format_for(self, name: str) -> Optional[str]:
+        """Return the format name to compile a template with, or None to fall back."""
+        try:
+            digest = self.digest(name)
+        except OSError:
+            return None
+        if self._ready.get(name) == digest:
+            return name
+        with self._lock:
+            if self._ready.get(name) == digest:
+                return name
+            if self._failed.get(name) == digest:
+                return None
+            if self._is_fresh(name, digest) or self.build(name):
+                self._ready[name] = digest
+                return name
+            self._failed[name] = digest
+            return None
+
+    def prepare(self, name: str, body: str) -> CompileSpec:
+        """Turn a rendered template body into something pdflatex can compile."""
+        if self.format_for(name):
+            env = dict(os.environ)
+            # Trailing separator keeps the default TeX format search path
+            env['TEXFORMATS'] = self.format_dir + os.pathsep
+            return CompileSpec(body, [f'-fmt={name}'], env)
+        return CompileSpec(self.preamble(name) + body, [], None)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) != 3:
+        print("usage: python -m pdf_pipeline.formats <preamble_dir> <format_dir>", file=sys.stderr)
+        sys.exit(2)
+    results = FormatStore(sys.argv[1], sys.argv[2]).build_all()
+    for template, ok in results.items():
+        print(f"{template}: {'ok' if ok else 'FAILED'}")
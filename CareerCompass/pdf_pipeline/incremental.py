@@ -0,0 +1,145 @@
+"""Incremental validation and rendering of sectioned templates.
+
+A document is split into named sections, each backed by a few raw fields and a
+validator, and each rendered by the Jinja ``<% block %>`` of the same name. Every
+section is hashed on its raw fields; validated section data and rendered block
+output are memoized by that hash, so editing one bullet only re-validates and
+re-renders the section that bullet belongs to. The rest of the template is
+rendered around the memoized blocks, producing exactly the same LaTeX as a full
+render.
+
+Validators take an optional ``FieldReads`` (see ``pdf_pipeline.templates``) so
+they only produce the fields the selected template reads; section data is
+memoized per set of reads.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, Hashable, NamedTuple, Optional, Sequence, Tuple
+
+from jinja2 import Environment
+
+from pdf_pipeline.templates import FieldReads
+
+
+class Section(NamedTuple):
+    """A document section: the raw fields it reads and how to validate them.
+
+    validate is called with the raw data and the template's FieldReads (None
+    for every field).
+    """
+    fields: Sequence[str]
+    validate: Callable[[Dict, Optional[FieldReads]], Dict]
+
+
+class RenderedDocument(NamedTuple):
+    latex: str
+    data: Dict
+    version: str
+
+
+def section_digest(value: Any) -> str:
+    """Stable hash of a section's raw data."""
+    encoded = json.dumps(value, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class _Memo:
+    """Small thread-safe LRU map."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class IncrementalRenderer:
+    """Validates and renders documents section by section with memoization.
+
+    timer, if given, is called with 'validate' and 'render' and must return a
+    context manager wrapped around that step (see ``Metrics.stage``).
+    """
+
+    def __init__(self, env: Environment, sections: Dict[str, Section], max_entries: int = 1024,
+                 timer: Optional[Callable[[str], ContextManager]] = None):
+        self.env = env
+        self.sections = sections
+        self.timer = timer or (lambda stage: nullcontext())
+        self._memo = _Memo(max_entries)
+
+    def validate(self, data: Dict, reads: Optional[FieldReads] = None) -> Tuple[Dict, Dict[str, str]]:
+        """Validate every section, reusing results for unchanged sections.
+
+        reads limits validation to the fields a template uses.
+
+        Returns the merged validated data and the digest of each section.
+        """
+        validated: Dict = {}
+        digests: Dict[str, str] = {}
+        for name, section in self.sections.items():
+            raw = {field: data.get(field) for field in section.fields}
+            digest = section_digest(raw)
+            digests[name] = digest
+            key = ('data', name, digest, reads)
+            section_data = self._memo.get(key)
+            if section_data is None:
+                section_data = section.validate(data, reads)
+                self._memo.put(key, section_data)
+            validated.update(section_data)
+        return validated, digests
+
+    def render(self, template_name: str, data: Dict, digests: Dict[str, str]) -> str:
+        """Render a template, reusing memoized output for unchanged section blocks."""
+        template = self.env.get_template(f'{template_name}.tex')
+        context = template.new_context(data)
+        for name, digest in digests.items():
+            if name not in template.blocks:
+                continue
+            key = ('latex', template_name, name, digest)
+            fragment = self._memo.get(key)
+            if fragment is None:
+                fragment = ''.join(template.blocks[name](template.new_context(data)))
+                self._memo.put(key, fragment)
+            # The compiled template yields from context.blocks[name][0](context)
+            context.blocks[name] = [lambda _context, fragment=fragment: iter((fragment,))]
+        return ''.join(template.root_render_func(context))
+
+    def render_document(self, template_name: str, data: Dict, extra: Optional[Dict] = None,
+                        reads: Optional[FieldReads] = None) -> RenderedDocument:
+        """Validate and render raw document data; extra values are added to the template context.
+
+        reads is the template's FieldReads, if known.
+        """
+        with self.timer('validate'):
+            validated, digests = self.validate(data, reads)
+        if extra:
+            validated.update(extra)
+        version = section_digest([template_name, digests, extra])
+        with self.timer('render'):
+            latex = self.render(template_name, validated, digests)
+        return RenderedDocument(latex, validated, version)
+
+    def stats(self) -> Dict[str, int]:
+        """Memo hit/miss counters."""
+        return {'hits': self._memo.hits, 'misses': self._memo.misses}
@@ -0,0 +1,177 @@
+"""Asynchronous generation jobs.
+
+``POST /jobs`` accepts the same payload as the synchronous generate endpoint
+and returns a job ID straight away; ``GET /jobs/<id>`` reports its status and
+``GET /jobs/<id>/pdf`` downloads the result once it is ready.
+
+Work runs on a small background executor. Admission control caps the number of
+queued and running jobs per process and answers 429 once that cap is reached,
+so a burst of slow compiles cannot tie up every request thread. Job state and
+results are kept in a directory rather than in memory so any gunicorn worker
+process on the instance can answer status and download requests.
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from flask import Flask, jsonify, request, send_file
+
+from pdf_pipeline.errors import GenerationError
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Takes the request payload and returns (pdf_content, filename without extension)
+JobHandler = Callable[[Dict], Tuple[bytes, str]]
+
+
+class JobManager:
+    """Runs generation jobs in the background and tracks their state on disk."""
+
+    def __init__(self, store_dir: str, max_workers: int = 2, max_pending: int = 16, result_ttl: float = 600):
+        self.store_dir = store_dir
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pdf-job')
+        self._pending = 0
+        self._lock = threading.Lock()
+        os.makedirs(store_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, service_name: str) -> 'JobManager':
+        """Create a job manager configured from JOB_* environment variables."""
+        return cls(
+            store_dir=os.environ.get('JOB_STORE_DIR', os.path.join(tempfile.gettempdir(), f'{service_name}-jobs')),
+            max_workers=int(os.environ.get('JOB_WORKERS', 2)),
+            max_pending=int(os.environ.get('JOB_MAX_PENDING', 16)),
+            result_ttl=float(os.environ.get('JOB_RESULT_TTL', 600)),
+        )
+
+    def _path(self, job_id: str, ext: str) -> str:
+        return os.path.join(self.store_dir, f'{job_id}.{ext}')
+
+    def _write_state(self, job_id: str, **state) -> None:
+        state['job_id'] = job_id
+        state['updated'] = time.time()
+        tmp_path = self._path(job_id, f'json.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self._path(job_id, 'json'))
+
+    def _run(self, job_id: str, handler: JobHandler, payload: Dict) -> None:
+        try:
+            self._write_state(job_id, status='running')
+            pdf_content, filename = handler(payload)
+            with open(self._path(job_id, 'pdf'), 'wb') as f:
+                f.write(pdf_content)
+            self._write_state(job_id, status='done', filename=filename)
+        except GenerationError as e:
+            self._write_state(job_id, status='failed', error_status=e.status, **e.to_dict())
+        except Exception as e:
+            logger.error(f"Error running job {job_id}: {e}")
+            self._write_state(job_id, status='failed', error='Internal server error', error_status=500)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def submit(self, handler: JobHandler, payload: Dict) -> Optional[str]:
+        """Queue a job; returns its ID, or None if the service is at capacity."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                return None
+            self._pending += 1
+        self.purge_expired()
+        job_id = uuid.uuid4().hex
+        self._write_state(job_id, status='queued')
+        self._executor.submit(self._run, job_id, handler, payload)
+        return job_id
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """Return the stored state of a job, or None if it is unknown or expired."""
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id, 'json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def result_path(self, job_id: str) -> str:
+        """Path of the finished PDF for a job."""
+        return self._path(job_id, 'pdf')
+
+    def pending(self) -> int:
+        """Number of queued and running jobs in this process."""
+        with self._lock:
+            return self._pending
+
+    def purge_expired(self) -> None:
+        """Delete state and results of jobs that finished more than result_ttl seconds ago."""
+        cutoff = time.time() - self.result_ttl
+        with os.scandir(self.store_dir) as it:
+            for entry in it:
+                try:
+                    if entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+
+def register_job_routes(app: Flask, manager: JobManager, handler: JobHandler,
+                        required_fields: Iterable[str]) -> None:
+    """Add the /jobs endpoints for a generation handler to a Flask app."""
+    required_fields = tuple(required_fields)
+
+    @app.route('/jobs', methods=['POST'])
+    def create_job():
+        """Start an asynchronous generation job."""
+        data = request.get_json(silent=True)
+        if not data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+        if not all(data.get(field) for field in required_fields):
+            return jsonify({'error': f"{' and '.join(required_fields)} are required"}), 400
+
+        job_id = manager.submit(handler, data)
+        if not job_id:
+            response = jsonify({'error': 'Too many pending jobs, retry later'})
+            response.headers['Retry-After'] = '5'
+            return response, 429
+
+        response = jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'})
+        response.headers['Location'] = f'/jobs/{job_id}'
+        return response, 202
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def get_job(job_id):
+        """Report the status of a generation job."""
+        state = manager.status(job_id)
+        if not state:
+            return jsonify({'error': 'Job not found'}), 404
+        if state['status'] == 'done':
+            state['download_url'] = f'/jobs/{job_id}/pdf'
+        return jsonify(state)
+
+    @app.route('/jobs/<job_id>/pdf', methods=['GET'])
+    def get_job_pdf(job_id):
+        """Download the PDF produced by a finished job."""
+        state = manager.status(job_id)
+        if not state:
+            return jsonify({'error': 'Job not found'}), 404
+        if state['status'] == 'failed':
+            return jsonify({'error': state.get('error')}), state.get('error_status', 500)
+        if state['status'] != 'done':
+            return jsonify({'error': 'Job not finished', 'status': state['status']}), 409
+        return send_file(
+            manager.result_path(job_id),
+            mimetype='application/pdf',
+            as_attachment=True,
+            download_name=f"{state['filename']}.pdf",
+        )
@@ -0,0 +1,58 @@
+"""LaTeX escaping shared by the resume and cover letter services."""
+import re
+from typing import Any
+
+LATEX_SPECIAL_CHARS = {
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '^': r'\textasciicircum{}',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '\\': r'\textbackslash{}',
+}
+
+_SPECIAL_CHARS_RE = re.compile('[' + re.escape(''.join(LATEX_SPECIAL_CHARS)) + ']')
+
+# Placeholder for backslashes while the other characters are escaped. NUL is
+# not valid in TeX input, so it is stripped from the text beforehand.
+_BACKSLASH = '\x00'
+
+# Ordered so no replacement ever sees output of an earlier one: backslashes are
+# parked first, braces are escaped before the replacements that introduce
+# braces, and the parked backslashes are expanded last.
+_REPLACEMENTS = (
+    ('\\', _BACKSLASH),
+    ('{', r'\{'),
+    ('}', r'\}'),
+    ('&', r'\&'),
+    ('%', r'\%'),
+    ('$', r'\$'),
+    ('#', r'\#'),
+    ('_', r'\_'),
+    ('^', r'\textasciicircum{}'),
+    ('~', r'\textasciitilde{}'),
+    (_BACKSLASH, r'\textbackslash{}'),
+)
+
+
+def escape_latex(text: Any) -> str:
+    """Escape special LaTeX characters in text."""
+    if text is None:
+        return ""
+    if not isinstance(text, str):
+        text = str(text)
+    # Most fields contain nothing to escape; one regex scan lets them skip the
+    # replacements entirely and come back without being copied
+    if not _SPECIAL_CHARS_RE.search(text):
+        return text
+    if _BACKSLASH in text:
+        text = text.replace(_BACKSLASH, '')
+    # str.replace runs in C, which benchmarks faster than a per-match regex
+    # callback or str.translate with multi-character replacements
+    for char, escaped in _REPLACEMENTS:
+        text = text.replace(char, escaped)
+    return text
@@ -0,0 +1,244 @@
+"""Per-stage latency histograms and counters with a Prometheus ``/metrics`` endpoint.
+
+Each service keeps one ``Metrics`` registry. Pipeline stages are timed with
+``metrics.stage('compile')`` and land in the ``stage_duration_seconds``
+histogram; request latency and in-flight requests are recorded by Flask hooks
+installed with ``register_metrics``. Counters that already live elsewhere
+(PDF cache, Firestore cache, worker pool) are read from their ``stats()`` at
+scrape time rather than duplicated.
+
+Metrics are per process: with several gunicorn workers each scrape sees the
+worker that answered it.
+
+Set PROFILE_SAMPLE_RATE to profile a fraction of requests with cProfile; any
+sampled request slower than PROFILE_THRESHOLD_MS is dumped to PROFILE_DIR for
+``python -m pstats`` or snakeviz.
+"""
+import cProfile
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import Flask, Response, g, request
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans Jinja renders (~1ms) to slow multi-pass compiles
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(str(value))}"' for name, value in pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and histograms for one service."""
+
+    def __init__(self, service_name: str, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.service_name = service_name
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[Labels, float]] = {}
+        self._histograms: Dict[str, Dict[Labels, _Histogram]] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict], Sequence[str]]] = []
+
+    def _labels(self, labels: Dict[str, str]) -> Labels:
+        return (('service', self.service_name),) + tuple(sorted(labels.items()))
+
+    def _declare(self, name: str, kind: str, help_text: str) -> None:
+        self._help.setdefault(name, (kind, help_text))
+
+    def inc(self, name: str, amount: float = 1, help_text: str = '', **labels: str) -> None:
+        """Increment a counter (or a gauge, with a negative amount for gauges)."""
+        with self._lock:
+            self._declare(name, 'counter' if name.endswith('_total') else 'gauge', help_text)
+            series = self._values.setdefault(name, {})
+            key = self._labels(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, help_text: str = '', **labels: str) -> None:
+        """Record a value in a histogram."""
+        with self._lock:
+            self._declare(name, 'histogram', help_text)
+            series = self._histograms.setdefault(name, {})
+            key = self._labels(labels)
+            if key not in series:
+                series[key] = _Histogram(self.buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a pipeline stage (fetch, validate, render, compile, response)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_duration_seconds', time.perf_counter() - start,
+                         'Time spent in each generation stage', stage=name)
+
+    def add_collector(self, prefix: str, stats: Callable[[], Dict], gauges: Sequence[str] = ()) -> None:
+        """Export a stats() dict at scrape time; keys not listed in gauges are counters."""
+        self._collectors.append((prefix, stats, gauges))
+
+    def render(self) -> str:
+        """Prometheus text exposition of every metric."""
+        lines = []
+        with self._lock:
+            for name in sorted(self._help):
+                kind, help_text = self._help[name]
+                lines += [f'# HELP {name} {help_text or name}', f'# TYPE {name} {kind}']
+                if kind == 'histogram':
+                    for labels, histogram in sorted(self._histograms[name].items()):
+                        cumulative = 0
+                        for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                            cumulative += count
+                            le = '+Inf' if bound == float('inf') else _format_value(float(bound))
+                            lines.append(f'{name}_bucket{_format_labels(labels, ("le", le))} {cumulative}')
+                        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(histogram.sum)}')
+                        lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+                else:
+                    for labels, value in sorted(self._values[name].items()):
+                        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+        labels = self._labels({})
+        for prefix, stats, gauges in self._collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"Error collecting {prefix} metrics: {e}")
+                continue
+            for key, value in sorted(values.items()):
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                kind = 'gauge' if key in gauges else 'counter'
+                name = f'{prefix}_{key}' + ('' if kind == 'gauge' else '_total')
+                lines += [f'# TYPE {name} {kind}', f'{name}{_format_labels(labels)} {_format_value(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+class ProfileSampler:
+    """Profiles a sample of requests and keeps the profiles of slow ones."""
+
+    def __init__(self, sample_rate: float, threshold: float, output_dir: str, max_files: int = 50):
+        self.sample_rate = sample_rate
+        self.threshold = threshold
+        self.output_dir = output_dir
+        self.max_files = max_files
+        # cProfile can only have one active profiler at a time, so at most one request is sampled at once
+        self._active = threading.Lock()
+
+    @classmethod
+    def from_env(cls, service_name: str) -> Optional['ProfileSampler']:
+        """Create a sampler from PROFILE_* environment variables, or None when disabled."""
+        sample_rate = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+        if sample_rate <= 0:
+            return None
+        return cls(
+            sample_rate=sample_rate,
+            threshold=float(os.environ.get('PROFILE_THRESHOLD_MS', 1000)) / 1000,
+            output_dir=os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), f'{service_name}-profiles')),
+            max_files=int(os.environ.get('PROFILE_MAX_FILES', 50)),
+        )
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start profiling the current request if it is sampled."""
+        if random.random() >= self.sample_rate or not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            self._active.release()
+            return None
+        return profile
+
+    def finish(self, profile: cProfile.Profile, elapsed: float, endpoint: str) -> None:
+        """Stop profiling and keep the profile if the request was slow."""
+        try:
+            profile.disable()
+            if elapsed < self.threshold:
+                return
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{endpoint}-{elapsed * 1000:.0f}ms.prof')
+            profile.dump_stats(path)
+            logger.warning(f"Request to {endpoint} took {elapsed * 1000:.0f}ms; profile saved to {path}")
+            self._prune()
+        except Exception as e:
+            logger.warning(f"Error saving request profile: {e}")
+        finally:
+            self._active.release()
+
+    def _prune(self) -> None:
+        profiles = sorted(os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)
+                          if name.endswith('.prof'))
+        for path in profiles[:-self.max_files]:
+            os.remove(path)
+
+
+def register_metrics(app: Flask, metrics: Metrics, profiler: Optional[ProfileSampler] = None) -> None:
+    """Record request latency and in-flight requests, and serve GET /metrics."""
+
+    @app.before_request
+    def _start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_profile = profiler.start() if profiler else None
+        metrics.inc('requests_in_flight', 1, 'Requests currently being handled')
+
+    @app.after_request
+    def _record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            elapsed = time.perf_counter() - start
+            endpoint = request.endpoint or 'unknown'
+            metrics.observe('request_duration_seconds', elapsed, 'Request latency by endpoint and status',
+                            endpoint=endpoint, status=str(response.status_code))
+            profile = g.pop('metrics_profile', None)
+            if profile is not None:
+                profiler.finish(profile, elapsed, endpoint)
+        return response
+
+    @app.teardown_request
+    def _end_request(exc):
+        metrics.inc('requests_in_flight', -1)
+        # after_request does not run when a view raises, so release a sampled profile here
+        profile = g.pop('metrics_profile', None)
+        if profile is not None:
+            start = g.pop('metrics_start', time.perf_counter())
+            profiler.finish(profile, time.perf_counter() - start, request.endpoint or 'unknown')
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus metrics."""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
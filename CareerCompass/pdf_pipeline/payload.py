@@ -0,0 +1,110 @@
+"""Size checks on stored documents before any template or TeX work.
+
+A document with thousands of bullets or a megabyte-long cover letter body
+would tie up Jinja and pdflatex for as long as the limits allow. ``PayloadLimits``
+walks the raw Firestore data once, which costs far less than rendering it,
+and:
+
+* truncates strings longer than PAYLOAD_MAX_STRING_LENGTH characters (or the
+  field's own limit, e.g. a cover letter body),
+* rejects with a 413 any list with more than PAYLOAD_MAX_LIST_ITEMS entries,
+  nesting deeper than PAYLOAD_MAX_DEPTH, or more than PAYLOAD_MAX_TOTAL_CHARS
+  characters of text in total.
+
+The stored dicts are shared with the document cache, so a truncated document
+is returned as a copy and the original is left untouched.
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from pdf_pipeline.errors import GenerationError
+
+logger = logging.getLogger(__name__)
+
+
+class PayloadLimits:
+    """Rejects oversized documents and truncates overlong fields."""
+
+    def __init__(self, max_string_length: int = 5000, max_list_items: int = 200,
+                 max_total_chars: int = 1_000_000, max_depth: int = 8,
+                 field_limits: Optional[Mapping[str, int]] = None):
+        self.max_string_length = max_string_length
+        self.max_list_items = max_list_items
+        self.max_total_chars = max_total_chars
+        self.max_depth = max_depth
+        self.field_limits = dict(field_limits or {})
+        self._lock = threading.Lock()
+        self._stats = {'checked': 0, 'rejected': 0, 'truncated': 0}
+
+    @classmethod
+    def from_env(cls, field_limits: Optional[Mapping[str, int]] = None) -> 'PayloadLimits':
+        """Create limits from PAYLOAD_* environment variables; field_limits maps field names to lengths."""
+        return cls(
+            max_string_length=int(os.environ.get('PAYLOAD_MAX_STRING_LENGTH', 5000)),
+            max_list_items=int(os.environ.get('PAYLOAD_MAX_LIST_ITEMS', 200)),
+            max_total_chars=int(os.environ.get('PAYLOAD_MAX_TOTAL_CHARS', 1_000_000)),
+            max_depth=int(os.environ.get('PAYLOAD_MAX_DEPTH', 8)),
+            field_limits=field_limits,
+        )
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _reject(self, message: str, path: str) -> GenerationError:
+        self._count('rejected')
+        logger.warning(f"Rejected document: {message} at {path or 'top level'}")
+        return GenerationError(f'Document too large: {message}', 413, {'field': path or None})
+
+    def check(self, data: Dict) -> Dict:
+        """Return data, or a copy with overlong strings truncated; raises a 413 GenerationError if too large."""
+        self._count('checked')
+        total = [0]
+        truncated = [0]
+        checked, _ = self._walk(data, '', '', 0, total, truncated)
+        if truncated[0]:
+            self._count('truncated')
+            logger.info(f"Truncated {truncated[0]} overlong fields")
+        return checked
+
+    def _walk(self, value: Any, path: str, key: str, depth: int, total: List[int],
+              truncated: List[int]) -> Tuple[Any, bool]:
+        # Returns the (possibly copied) value and whether it changed
+        if isinstance(value, str):
+            total[0] += len(value)
+            if total[0] > self.max_total_chars:
+                raise self._reject(f'more than {self.max_total_chars} characters of text', path)
+            limit = self.field_limits.get(key, self.max_string_length)
+            if len(value) > limit:
+                truncated[0] += 1
+                return value[:limit], True
+            return value, False
+        if depth >= self.max_depth and isinstance(value, (dict, list, tuple)):
+            raise self._reject(f'nested more than {self.max_depth} levels deep', path)
+        if isinstance(value, dict):
+            changed = {}
+            for item_key, item in value.items():
+                new, was_changed = self._walk(item, f'{path}.{item_key}' if path else str(item_key),
+                                              str(item_key), depth + 1, total, truncated)
+                if was_changed:
+                    changed[item_key] = new
+            return ({**value, **changed}, True) if changed else (value, False)
+        if isinstance(value, (list, tuple)):
+            if len(value) > self.max_list_items:
+                raise self._reject(f'more than {self.max_list_items} entries', path)
+            items = []
+            any_changed = False
+            for index, item in enumerate(value):
+                # List items take the list's field limit
+                new, was_changed = self._walk(item, f'{path}[{index}]', key, depth + 1, total, truncated)
+                items.append(new)
+                any_changed = any_changed or was_changed
+            return (items, True) if any_changed else (value, False)
+        return value, False
+
+    def stats(self) -> Dict[str, int]:
+        """Checked, rejected and truncated document counters."""
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,243 @@
+"""Document generation stages shared by both services.
+
+Every document goes through the same stages: fetch (Firestore) → validate
+(size limits, escaping, formatting) → render (Jinja to LaTeX) → compile
+(format, admission, engine, post-processing, PDF cache) → deliver (HTTP response). ``DocumentPipeline``
+implements them once; a ``DocumentKind`` supplies what differs between a
+resume and a cover letter: where it is stored, how it is validated and
+rendered and what the file is called.
+
+Each stage is its own method, timed under the stage's name on /metrics, so
+endpoints that stop early (a 304 for a version the client already has, a
+preview instead of a PDF) call the stages they need.
+"""
+import hashlib
+import logging
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from flask import Response
+
+from pdf_pipeline.admission import AdmissionController
+from pdf_pipeline.cache import PdfCache, cache_key
+from pdf_pipeline.compiler import compile_error
+from pdf_pipeline.delivery import PdfDelivery, PdfOptimizer
+from pdf_pipeline.engines import CompileEngine
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.firestore_store import DocumentStore
+from pdf_pipeline.formats import FormatStore
+from pdf_pipeline.metrics import Metrics
+from pdf_pipeline.payload import PayloadLimits
+from pdf_pipeline.singleflight import SingleFlight
+from pdf_pipeline.startup import preload_templates
+
+logger = logging.getLogger(__name__)
+
+
+def clean_filename(filename: str, default: str) -> str:
+    """Clean filename for use in file system and headers."""
+    cleaned = re.sub(r'[<>:"/\\|?*]', '_', filename)
+    cleaned = re.sub(r'\s+', ' ', cleaned.strip())
+    if len(cleaned) > 50:
+        cleaned = cleaned[:50]
+    return cleaned or default
+
+
+class ValidatedDocument(NamedTuple):
+    """Validated template context and the template to render it with.
+
+    version identifies the rendered output; state is whatever the kind needs
+    to carry from validate to render.
+    """
+    template_name: str
+    data: Dict
+    version: str
+    state: Any = None
+
+
+class LatexDocument(NamedTuple):
+    """Rendered LaTeX with the context it came from (for diagnostics and file names)."""
+    template_name: str
+    latex: str
+    data: Dict
+    version: str
+
+
+class DocumentKind:
+    """A type of document handled by a DocumentPipeline.
+
+    Subclasses set the class attributes and implement the methods below.
+    """
+    # Used in metric names and messages ('Resume not found')
+    name = 'document'
+    title = 'Document'
+    # Firestore collection under users/{user_id}, and the request field with the document ID
+    collection = ''
+    id_field = ''
+    # Response header carrying ValidatedDocument.version
+    version_header = ''
+    # File name when the document has none
+    default_filename = 'document'
+
+    env: Any = None
+
+    def templates(self) -> List[str]:
+        """Names of the templates this kind renders with."""
+        raise NotImplementedError
+
+    def validate(self, data: Dict) -> ValidatedDocument:
+        """Turn raw Firestore data into a template context; GenerationError for bad input."""
+        raise NotImplementedError
+
+    def render(self, document: ValidatedDocument) -> str:
+        """Render a validated document to LaTeX."""
+        raise NotImplementedError
+
+    def filename(self, data: Dict) -> str:
+        """File name (without extension) from validated data, before cleaning."""
+        raise NotImplementedError
+
+    def empty_document(self, template_name: str) -> Dict:
+        """Raw data of a throwaway document for warming up template_name."""
+        return {}
+
+
+class DocumentPipeline:
+    """Runs one kind of document through fetch, validate, render, compile and deliver."""
+
+    def __init__(self, kind: DocumentKind, formats: FormatStore, store: DocumentStore, cache: PdfCache,
+                 engine: CompileEngine, optimizer: PdfOptimizer, delivery: PdfDelivery,
+                 single_flight: SingleFlight, admission: AdmissionController, limits: PayloadLimits,
+                 metrics: Metrics):
+        self.kind = kind
+        self.formats = formats
+        self.store = store
+        self.cache = cache
+        self.engine = engine
+        self.optimizer = optimizer
+        self.delivery = delivery
+        self.single_flight = single_flight
+        self.admission = admission
+        self.limits = limits
+        self.metrics = metrics
+        self._template_digests: Dict[str, str] = {}
+
+    def path(self, user_id: str, document_id: str) -> str:
+        """Firestore path of a document."""
+        return f'users/{user_id}/{self.kind.collection}/{document_id}'
+
+    def fetch(self, user_id: str, document_id: str) -> Dict:
+        """Read a document; 404 if it doesn't exist."""
+        path = self.path(user_id, document_id)
+        try:
+            with self.metrics.stage('fetch'):
+                data = self.single_flight.do(('fetch', path), lambda: self.store.get(path))
+        except GenerationError:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching {path}: {e}")
+            data = None
+        if not data:
+            raise GenerationError(f'{self.kind.title} not found', 404)
+        return data
+
+    def validate(self, data: Dict) -> ValidatedDocument:
+        """Check the document's size, then validate it for its template."""
+        data = self.limits.check(data)
+        try:
+            with self.metrics.stage('validate'):
+                return self.kind.validate(data)
+        except GenerationError:
+            raise
+        except Exception as e:
+            logger.error(f"Error validating {self.kind.name} data: {e}")
+            raise GenerationError(f'Failed to format {self.kind.title.lower()} data')
+
+    def render(self, document: ValidatedDocument) -> LatexDocument:
+        """Render a validated document to LaTeX."""
+        try:
+            with self.metrics.stage('render'):
+                latex = self.kind.render(document)
+        except Exception as e:
+            logger.error(f"Error generating LaTeX: {e}")
+            raise GenerationError('Failed to generate LaTeX')
+        return LatexDocument(document.template_name, latex, document.data, document.version)
+
+    def prepare(self, data: Dict) -> LatexDocument:
+        """Validate and render raw document data."""
+        return self.render(self.validate(data))
+
+    def cache_key(self, document: LatexDocument) -> str:
+        """PDF cache key of rendered LaTeX, which also identifies its previews."""
+        return cache_key(document.latex, document.template_name, self.formats.digest(document.template_name))
+
+    def artifact_key(self, document: ValidatedDocument) -> str:
+        """Key of a validated document's PDF, known before rendering (see pdf_pipeline.prerender).
+
+        The version covers the document's content; the template source and
+        format digests cover a new image changing how the same content renders.
+        """
+        name = document.template_name
+        if name not in self._template_digests:
+            source, _, _ = self.kind.env.loader.get_source(self.kind.env, f'{name}.tex')
+            self._template_digests[name] = hashlib.sha256(source.encode('utf-8')).hexdigest()
+        parts = (self.kind.name, name, document.version, self._template_digests[name], self.formats.digest(name))
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def compile(self, document: LatexDocument) -> bytes:
+        """Compile rendered LaTeX to PDF, reusing a cached result for identical LaTeX."""
+        key = self.cache_key(document)
+        pdf_content = self.cache.get(key)
+        if pdf_content:
+            return pdf_content
+
+        def compile_uncached() -> bytes:
+            spec = self.formats.prepare(document.template_name, document.latex)
+            # Only as many compiles as the CPUs sustain run at once (see pdf_pipeline.admission)
+            with self.admission.admit():
+                with self.metrics.stage('compile'):
+                    result = self.engine.compile(spec.source, spec.args, spec.env)
+                if not result.pdf:
+                    self.metrics.inc('compile_failures_total', help_text='pdflatex runs that produced no PDF')
+                    raise compile_error(result, spec.source, document.data)
+                pdf_content = result.pdf
+                if self.optimizer.active:
+                    with self.metrics.stage('optimize'):
+                        pdf_content = self.optimizer.optimize(pdf_content)
+            self.cache.put(key, pdf_content)
+            return pdf_content
+        # Concurrent requests for the same content wait for one compile
+        return self.single_flight.do(('compile', key), compile_uncached)
+
+    def filename(self, document: Union[ValidatedDocument, LatexDocument]) -> str:
+        """Cleaned file name of a document, without extension."""
+        return clean_filename(self.kind.filename(document.data), self.kind.default_filename)
+
+    def deliver(self, pdf_content: bytes, document: Union[ValidatedDocument, LatexDocument]) -> Response:
+        """PDF download response, conditional and range-capable (see pdf_pipeline.delivery)."""
+        with self.metrics.stage('response'):
+            return self.delivery.respond(pdf_content, f'{self.filename(document)}.pdf',
+                                         {self.kind.version_header: document.version})
+
+    def build(self, data: Dict) -> Tuple[bytes, str]:
+        """Validate, render and compile raw data. Returns (pdf_content, filename)."""
+        document = self.prepare(data)
+        return self.compile(document), self.filename(document)
+
+    def build_by_id(self, user_id: str, document_id: str) -> Tuple[bytes, str]:
+        """Fetch, render and compile a stored document. Returns (pdf_content, filename)."""
+        return self.build(self.fetch(user_id, document_id))
+
+    def load_templates(self) -> List[str]:
+        """Load the kind's templates into its Jinja cache; returns the names that failed."""
+        return preload_templates(self.kind.env, self.kind.templates())
+
+    def warm_up(self, template_name: str) -> bool:
+        """Compile a throwaway document with template_name, bypassing the caches."""
+        document = self.kind.validate(self.kind.empty_document(template_name))
+        spec = self.formats.prepare(template_name, self.kind.render(document))
+        return self.engine.compile(spec.source, spec.args, spec.env).pdf is not None
+
+    def stats(self) -> Optional[Dict[str, int]]:
+        """Size limit counters."""
+        return self.limits.stats()
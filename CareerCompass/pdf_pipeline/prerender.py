@@ -0,0 +1,246 @@
+"""Pre-rendering documents when they are written instead of when they are requested.
+
+With PRERENDER=1 a ``Prerenderer`` compiles a document after it changes, so
+the generate endpoint finds the PDF ready and the request costs a Firestore
+read and validation instead of a compile. Changes reach it in three ways:
+
+* POST /document-events, the target of an Eventarc trigger on Firestore
+  writes, which only accepts the trigger's token (see
+  ``pdf_pipeline.event_auth``). The document path is read from the
+  CloudEvent ``ce-document`` (or ``ce-subject``) header, so the protobuf
+  payload doesn't need decoding. A JSON body ``{"path": "users/{uid}/resumes/{id}"}`` works too. The document
+  is rendered inside the event's request: Eventarc waits for the response,
+  and Cloud Run only gives an instance CPU while it is handling requests.
+  When compiles are busy the event gets a 503, and Eventarc delivers it again
+  later.
+* The snapshot listeners of the document cache (FIRESTORE_CACHE_WATCH=1),
+  which see changes to the documents this instance has served. These are
+  rendered by a background thread, which (like the listeners themselves)
+  only gets CPU on Cloud Run with ``--no-cpu-throttling``.
+* ``notify(path)`` directly, as a local stand-in for the change feed.
+
+Edits arrive in bursts while someone types, so a path is only rendered once
+it has gone PRERENDER_DEBOUNCE seconds without another change, or
+PRERENDER_MAX_DELAY seconds after the first change of a burst that doesn't
+stop. An event request waits out the debounce period and returns as soon as
+a later event for the same path arrives, leaving the rendering to that one.
+Compiles go through the same PDF cache, single-flight and admission control
+as requests.
+
+PDFs are kept in their own ``PdfCache`` (PRERENDER_CACHE_*) under
+``DocumentPipeline.artifact_key``: the document version and the digests of
+its template and format. The event and the download that follows it can be
+served by different instances, so PRERENDER_CACHE_DIR should be storage they
+all mount, such as a Cloud Storage bucket volume (see deploy.sh) with
+PRERENDER_CACHE_DISK_SHARED=1, so no instance lists, touches or evicts the
+shared files; without it a PDF is only found by the instance that rendered
+it. The generate endpoint validates the fetched document, looks the key up
+and serves the PDF if it is there; otherwise it renders and compiles on
+demand as before.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.firestore_store import DocumentStore
+from pdf_pipeline.pipeline import DocumentPipeline, ValidatedDocument
+
+logger = logging.getLogger(__name__)
+
+
+class Prerenderer:
+    """Compiles changed documents ahead of requests and serves the stored PDFs by version."""
+
+    def __init__(self, store: DocumentStore, artifacts: PdfCache, debounce: float = 2, max_delay: float = 30,
+                 max_pending: int = 1000, enabled: bool = False):
+        self.store = store
+        self.artifacts = artifacts
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.enabled = enabled
+        # Pipelines by Firestore collection
+        self._pipelines: Dict[str, DocumentPipeline] = {}
+        # Paths waiting for their edits to settle: (due, deadline), and a heap of (due, path).
+        # Heap entries whose due time no longer matches _pending are stale and skipped.
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._heap: List[Tuple[float, str]] = []
+        # Paths with an event request waiting for edits to settle: (sequence number of the latest event, deadline)
+        self._events: Dict[str, Tuple[int, float]] = {}
+        self._sequence = 0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'notified': 0, 'debounced': 0, 'dropped': 0, 'rendered': 0, 'unchanged': 0,
+                       'deleted': 0, 'deferred': 0, 'failed': 0, 'served': 0, 'missed': 0}
+        if enabled:
+            store.add_listener(self.notify)
+            if artifacts.disk_dir is None:
+                logger.warning("PRERENDER_CACHE_DIR is not set; pre-rendered PDFs are only served by the "
+                               "instance that rendered them")
+
+    @classmethod
+    def from_env(cls, store: DocumentStore) -> 'Prerenderer':
+        """Create a prerenderer configured from PRERENDER* environment variables."""
+        return cls(
+            store,
+            artifacts=PdfCache.from_env('PRERENDER_CACHE'),
+            debounce=float(os.environ.get('PRERENDER_DEBOUNCE', 2)),
+            max_delay=float(os.environ.get('PRERENDER_MAX_DELAY', 30)),
+            max_pending=int(os.environ.get('PRERENDER_MAX_PENDING', 1000)),
+            enabled=os.environ.get('PRERENDER', '').lower() in ('1', 'true', 'yes'),
+        )
+
+    def _count(self, name: str) -> None:
+        with self._cond:
+            self._stats[name] += 1
+
+    def register(self, pipeline: DocumentPipeline) -> None:
+        """Pre-render documents in pipeline's collection."""
+        self._pipelines[pipeline.kind.collection] = pipeline
+
+    def pipeline_for(self, path: str) -> Optional[DocumentPipeline]:
+        """The pipeline for a users/{user_id}/{collection}/{document_id} path, if one is registered."""
+        parts = path.strip('/').split('/')
+        if len(parts) != 4 or parts[0] != 'users':
+            return None
+        return self._pipelines.get(parts[2])
+
+    def notify(self, path: str) -> bool:
+        """Schedule path for pre-rendering once its edits settle; False if it is ignored."""
+        if not self.enabled or self.pipeline_for(path) is None:
+            return False
+        now = time.monotonic()
+        with self._cond:
+            self._stats['notified'] += 1
+            if path in self._pending:
+                self._stats['debounced'] += 1
+                deadline = self._pending[path][1]
+            elif len(self._pending) >= self.max_pending:
+                self._stats['dropped'] += 1
+                return False
+            else:
+                deadline = now + self.max_delay
+            due = min(now + self.debounce, deadline)
+            self._pending[path] = (due, deadline)
+            heapq.heappush(self._heap, (due, path))
+            self._cond.notify()
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self) -> None:
+        # Started lazily so gunicorn workers each get their own thread after forking
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='prerender', daemon=True)
+                self._thread.start()
+
+    def _next(self) -> str:
+        """Wait for the next path whose edits have settled."""
+        with self._cond:
+            while True:
+                while self._heap and self._pending.get(self._heap[0][1], (None,))[0] != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    _, path = heapq.heappop(self._heap)
+                    del self._pending[path]
+                    return path
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+    def _run(self) -> None:
+        while True:
+            self.precompute(self._next())
+
+    def handle_event(self, path: str) -> str:
+        """Pre-render path in the calling request once its edits settle; returns what happened.
+
+        One of 'ignored', 'superseded' (a later event for the path renders
+        it), 'deleted', 'unchanged', 'rendered' or 'failed'. Raises a 503
+        GenerationError while compiles are busy, so the event is retried.
+        """
+        if not self.enabled or self.pipeline_for(path) is None:
+            return 'ignored'
+        now = time.monotonic()
+        with self._cond:
+            self._stats['notified'] += 1
+            self._sequence += 1
+            sequence = self._sequence
+            burst = self._events.get(path)
+            deadline = burst[1] if burst is not None else now + self.max_delay
+            self._events[path] = (sequence, deadline)
+            # Release the request waiting on an earlier event for the path
+            self._cond.notify_all()
+            due = min(now + self.debounce, deadline)
+            while self._events.get(path, (None,))[0] == sequence and time.monotonic() < due:
+                self._cond.wait(due - time.monotonic())
+            if self._events.get(path, (None,))[0] != sequence:
+                self._stats['debounced'] += 1
+                return 'superseded'
+            del self._events[path]
+        return self._attempt(path)[0]
+
+    def precompute(self, path: str) -> Optional[bytes]:
+        """Read the latest version of the document at path and store its PDF; returns the PDF.
+
+        While compiles are busy the path is scheduled again instead.
+        """
+        if self.pipeline_for(path) is None:
+            return None
+        try:
+            return self._attempt(path)[1]
+        except GenerationError:
+            # Busy with requests; try again once the next debounce period has passed
+            self.notify(path)
+            return None
+
+    def _attempt(self, path: str) -> Tuple[str, Optional[bytes]]:
+        """Render path, counting the outcome; raises the 503 GenerationError when compiles are busy."""
+        try:
+            outcome, pdf_content = self._render(path)
+        except GenerationError as e:
+            if e.status == 503:
+                self._count('deferred')
+                raise
+            logger.warning(f"Pre-rendering {path} failed: {e.message}")
+            outcome, pdf_content = 'failed', None
+        except Exception as e:
+            logger.error(f"Error pre-rendering {path}: {e}")
+            outcome, pdf_content = 'failed', None
+        self._count(outcome)
+        return outcome, pdf_content
+
+    def _render(self, path: str) -> Tuple[str, Optional[bytes]]:
+        pipeline = self.pipeline_for(path)
+        # The cached copy predates the change that brought us here
+        self.store.invalidate(path)
+        data = self.store.get(path)
+        if not data:
+            return 'deleted', None
+        document = pipeline.validate(data)
+        key = pipeline.artifact_key(document)
+        pdf_content = self.artifacts.get(key)
+        if pdf_content is not None:
+            return 'unchanged', pdf_content
+        pdf_content = pipeline.compile(pipeline.render(document))
+        self.artifacts.put(key, pdf_content)
+        return 'rendered', pdf_content
+
+    def lookup(self, pipeline: DocumentPipeline, document: ValidatedDocument) -> Optional[bytes]:
+        """The pre-rendered PDF of this version of the document, or None."""
+        if not self.enabled:
+            return None
+        pdf_content = self.artifacts.get(pipeline.artifact_key(document))
+        self._count('served' if pdf_content is not None else 'missed')
+        return pdf_content
+
+    def stats(self) -> Dict[str, int]:
+        """Change, render and lookup counters and the number of paths waiting for their edits to settle."""
+        with self._cond:
+            return {**self._stats, 'pending': len(self._pending) + len(self._events)}
@@ -0,0 +1,178 @@
+"""Server-side page previews: compiled PDFs rasterized to PNG or JPEG.
+
+The app's preview screens only need to show the document, so instead of
+downloading the PDF and rendering it on the phone they can ask for page
+images at a chosen DPI. Pages are rasterized with poppler's ``pdftoppm``.
+
+A preview is identified by the PDF cache key of the rendered LaTeX (a hash of
+the source, template and toolchain) plus the page, DPI and image format. That
+identity is the preview's ``ETag`` and its key in an LRU of rendered images
+(PREVIEW_CACHE_* settings, see ``PdfCache.from_env``), so a client that
+already has the image gets a 304 without the document being compiled or
+rasterized.
+"""
+import hashlib
+import io
+import logging
+import os
+import re
+import subprocess
+import zipfile
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from flask import Response, request
+
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.workspace import WorkspacePool
+
+logger = logging.getLogger(__name__)
+
+# Image format: pdftoppm flag, MIME type and file extension
+IMAGE_FORMATS = {'png': ('-png', 'image/png', 'png'), 'jpeg': ('-jpeg', 'image/jpeg', 'jpg')}
+_PAGE_FILE = re.compile(r'^page-(\d+)\.(png|jpg)$')
+_PDFINFO_PAGES = re.compile(r'^Pages:\s+(\d+)\s*$', re.MULTILINE)
+
+
+class PreviewOptions(NamedTuple):
+    """Which pages to render, how finely and in which image format; page None means all pages."""
+    page: Optional[int]
+    dpi: int
+    image_format: str
+
+
+class PreviewRenderer:
+    """Rasterizes PDFs into page images and caches the results."""
+
+    def __init__(self, cache: PdfCache, workspaces: WorkspacePool, default_dpi: int = 72,
+                 max_dpi: int = 200, timeout: float = 30):
+        self.cache = cache
+        self.workspaces = workspaces
+        self.default_dpi = default_dpi
+        self.max_dpi = max_dpi
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls, workspaces: WorkspacePool) -> 'PreviewRenderer':
+        """Create a renderer configured from PREVIEW_* environment variables."""
+        return cls(
+            cache=PdfCache.from_env('PREVIEW_CACHE'),
+            workspaces=workspaces,
+            default_dpi=int(os.environ.get('PREVIEW_DEFAULT_DPI', 72)),
+            max_dpi=int(os.environ.get('PREVIEW_MAX_DPI', 200)),
+            timeout=float(os.environ.get('PREVIEW_TIMEOUT', 30)),
+        )
+
+    def parse_options(self, data: Dict[str, Any]) -> PreviewOptions:
+        """Read page ('all' or a 1-based number, default 1), dpi and format from a request body."""
+        page = data.get('page', 1)
+        if page == 'all':
+            page = None
+        elif isinstance(page, bool) or not isinstance(page, int) or page < 1:
+            raise GenerationError("page must be a positive page number or 'all'", 400)
+        dpi = data.get('dpi', self.default_dpi)
+        if isinstance(dpi, bool) or not isinstance(dpi, int) or not 10 <= dpi <= self.max_dpi:
+            raise GenerationError(f'dpi must be an integer from 10 to {self.max_dpi}', 400)
+        image_format = data.get('format', 'png')
+        if image_format not in IMAGE_FORMATS:
+            raise GenerationError(f"format must be one of {', '.join(IMAGE_FORMATS)}", 400)
+        return PreviewOptions(page, dpi, image_format)
+
+    @staticmethod
+    def etag(document_key: str, options: PreviewOptions) -> str:
+        """Strong validator for a preview of the document with the given PDF cache key."""
+        identity = f"{document_key}\0{options.page or 'all'}\0{options.dpi}\0{options.image_format}"
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()[:32]
+
+    def page_count(self, pdf_path: str) -> Optional[int]:
+        """Number of pages in a PDF according to pdfinfo, or None if it can't tell."""
+        try:
+            result = subprocess.run(['pdfinfo', pdf_path], capture_output=True, timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logger.warning(f"pdfinfo failed: {e}")
+            return None
+        match = _PDFINFO_PAGES.search(result.stdout.decode('utf-8', 'replace'))
+        return int(match.group(1)) if match else None
+
+    def _page_not_found(self, pdf_path: str, options: PreviewOptions) -> Optional[GenerationError]:
+        # pdftoppm fails or writes nothing for a page past the end; that is the client's mistake
+        if not options.page:
+            return None
+        pages = self.page_count(pdf_path)
+        if pages is None or options.page <= pages:
+            return None
+        return GenerationError(f'Page {options.page} not found; the document has {pages}', 404, {'pages': pages})
+
+    def rasterize(self, pdf: bytes, options: PreviewOptions) -> List[bytes]:
+        """Render the requested pages of a PDF to images, in page order."""
+        flag = IMAGE_FORMATS[options.image_format][0]
+        with self.workspaces.workspace() as directory:
+            pdf_path = os.path.join(directory, 'document.pdf')
+            with open(pdf_path, 'wb') as f:
+                f.write(pdf)
+            cmd = ['pdftoppm', flag, '-r', str(options.dpi)]
+            if options.page:
+                cmd += ['-f', str(options.page), '-l', str(options.page)]
+            cmd += [pdf_path, os.path.join(directory, 'page')]
+            try:
+                result = subprocess.run(cmd, capture_output=True, timeout=self.timeout)
+            except FileNotFoundError:
+                logger.error("pdftoppm is not installed; previews are unavailable")
+                raise GenerationError('Preview rendering is not available', 503)
+            except subprocess.TimeoutExpired:
+                raise GenerationError('Preview rendering timed out', 503)
+            if result.returncode != 0:
+                not_found = self._page_not_found(pdf_path, options)
+                if not_found:
+                    raise not_found
+                logger.error(f"pdftoppm failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+                raise GenerationError('Failed to render preview')
+
+            # Output files are page-<n> with n zero-padded to the page count's width
+            pages = sorted((int(match.group(1)), name) for name in os.listdir(directory)
+                           for match in [_PAGE_FILE.match(name)] if match)
+            images = []
+            for _, name in pages:
+                with open(os.path.join(directory, name), 'rb') as f:
+                    images.append(f.read())
+            if not images:
+                raise self._page_not_found(pdf_path, options) or GenerationError('Page not found', 404)
+        return images
+
+    def respond(self, document_key: str, options: PreviewOptions, get_pdf: Callable[[], bytes],
+                filename: str) -> Response:
+        """Serve a preview of the document, compiling it with get_pdf only when needed.
+
+        One page comes back as an image; all pages as a ZIP of
+        ``page-<n>.<ext>`` images.
+        """
+        etag = self.etag(document_key, options)
+        headers = {'ETag': f'"{etag}"', 'Cache-Control': 'private, no-cache'}
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers=headers)
+
+        _, mimetype, ext = IMAGE_FORMATS[options.image_format]
+        content = self.cache.get(etag)
+        if content is None:
+            images = self.rasterize(get_pdf(), options)
+            if options.page:
+                content = images[0]
+            else:
+                buffer = io.BytesIO()
+                # PNG and JPEG are already compressed, so store them as-is
+                with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+                    for number, image in enumerate(images, 1):
+                        archive.writestr(f'page-{number}.{ext}', image)
+                content = buffer.getvalue()
+            self.cache.put(etag, content)
+
+        if options.page:
+            name = f'{filename}-page-{options.page}.{ext}'
+        else:
+            mimetype, name = 'application/zip', f'{filename}-pages.zip'
+        headers['Content-Disposition'] = f'inline; filename="{name}"'
+        return Response(content, mimetype=mimetype, headers=headers)
+
+    def stats(self) -> Dict[str, int]:
+        """Preview cache counters."""
+        return self.cache.stats()
@@ -0,0 +1,179 @@
+"""Resume validation, templates and the resume ``DocumentKind``.
+
+Resumes are rendered section by section (see ``pdf_pipeline.incremental``)
+with whichever template in the resume service's templates/ directory the
+document asks for. Validators only produce the fields that template reads
+(see ``pdf_pipeline.templates``).
+"""
+from typing import Dict, List, Optional
+
+from jinja2 import Environment, FileSystemLoader
+
+from pdf_pipeline.dates import format_date
+from pdf_pipeline.incremental import IncrementalRenderer, Section, section_digest
+from pdf_pipeline.latex import escape_latex
+from pdf_pipeline.pipeline import DocumentKind, ValidatedDocument
+from pdf_pipeline.templates import FieldReads, TemplateRegistry, select_fields, select_items
+
+
+def template_environment(templates_dir: str) -> Environment:
+    """Jinja environment for the resume templates in templates_dir."""
+    return Environment(
+        loader=FileSystemLoader(templates_dir),
+        block_start_string='<%',
+        block_end_string='%>',
+        variable_start_string='<<',
+        variable_end_string='>>',
+        comment_start_string='<#',
+        comment_end_string='#>',
+        trim_blocks=True,
+        lstrip_blocks=True,
+        autoescape=False
+    )
+
+
+def sanitize_text_list(text, delimiter=','):
+    """Convert a delimited string to a list of escaped LaTeX strings."""
+    if not text:
+        return []
+    items = [item.strip() for item in text.split(delimiter) if item.strip()]
+    return [escape_latex(item) for item in items]
+
+
+# Converters from a Firestore item to each field the templates can read.
+# Validators only run the ones the selected template uses (see pdf_pipeline.templates).
+HEADER_FIELDS = {
+    'resume_name': lambda data: escape_latex(data.get('resumeName', 'Resume')),
+    'fullName': lambda data: escape_latex(data.get('fullName', 'Your Name')),
+    'phone': lambda data: data.get('phone', ''),
+    'email': lambda data: data.get('email', ''),
+    'website1': lambda data: data.get('website1', ''),
+    'website2': lambda data: data.get('website2', ''),
+}
+
+EXPERIENCE_FIELDS = {
+    'title': lambda exp: escape_latex(exp.get('title', '')),
+    'company': lambda exp: escape_latex(exp.get('company', '')),
+    'location': lambda exp: escape_latex(exp.get('location', '')),
+    'startDate': lambda exp: format_date(exp.get('startDate', '')),
+    'endDate': lambda exp: format_date(exp.get('endDate', '')),
+    'currentlyWorking': lambda exp: exp.get('currentlyWorking', False),
+    'bullets': lambda exp: [escape_latex(b) for b in exp.get('bullets', [])] if exp.get('bullets', []) else [],
+}
+
+EDUCATION_FIELDS = {
+    'institution': lambda edu: escape_latex(edu.get('institution', '')),
+    'location': lambda edu: escape_latex(edu.get('location', '')),
+    'degree': lambda edu: escape_latex(edu.get('degree', '')),
+    'major': lambda edu: escape_latex(edu.get('major', '')),
+    'minor': lambda edu: escape_latex(edu.get('minor', '')),
+    'gpa': lambda edu: edu.get('gpa', ''),
+    'specialization': lambda edu: escape_latex(edu.get('specialization', '')),
+    'startDate': lambda edu: format_date(edu.get('startDate', '')),
+    'endDate': lambda edu: format_date(edu.get('endDate', '')),
+}
+
+PROJECT_FIELDS = {
+    'title': lambda proj: escape_latex(proj.get('title', '')),
+    'stack': lambda proj: sanitize_text_list(proj.get('stack', '')),
+    'date': lambda proj: proj.get('date', ''),
+    'bullets': lambda proj: [escape_latex(b) for b in proj.get('bullets', [])] if proj.get('bullets', []) else [],
+}
+
+SKILL_FIELDS = {
+    'languages': lambda skills: sanitize_text_list(skills.get('languages', '')),
+    'frameworks': lambda skills: sanitize_text_list(skills.get('frameworks', '')),
+    'tools': lambda skills: sanitize_text_list(skills.get('tools', '')),
+    'libraries': lambda skills: sanitize_text_list(skills.get('libraries', '')),
+}
+
+
+def validate_header(data, reads=None):
+    """Validate the contact details shown in the resume header."""
+    return select_fields(HEADER_FIELDS, data, reads)
+
+
+def validate_experience(data, reads=None):
+    """Validate and format work experience."""
+    return {'work_experience': select_items(EXPERIENCE_FIELDS, data.get('experienceList', []), reads, 'work_experience')}
+
+
+def validate_education(data, reads=None):
+    """Validate and format education."""
+    return {'education': select_items(EDUCATION_FIELDS, data.get('educationList', []), reads, 'education')}
+
+
+def validate_projects(data, reads=None):
+    """Validate and format projects."""
+    return {'projects': select_items(PROJECT_FIELDS, data.get('projectList', []), reads, 'projects')}
+
+
+def validate_skills(data, reads=None):
+    """Validate and format skills."""
+    return {'skills': select_fields(SKILL_FIELDS, data.get('skills', {}), reads, 'skills')}
+
+
+# Resume sections, the Firestore fields each one reads and its validator.
+# Each name matches a <% block %> in the templates.
+RESUME_SECTIONS = {
+    'header': Section(('resumeName', 'fullName', 'phone', 'email', 'website1', 'website2'), validate_header),
+    'education': Section(('educationList',), validate_education),
+    'experience': Section(('experienceList',), validate_experience),
+    'projects': Section(('projectList',), validate_projects),
+    'skills': Section(('skills',), validate_skills),
+}
+
+
+def validate_sections(data, reads=None):
+    """Validate every resume section without memoization, limited to the fields in reads if given."""
+    validated_data = {}
+    for section in RESUME_SECTIONS.values():
+        validated_data.update(section.validate(data, reads))
+    return validated_data
+
+
+class ResumeKind(DocumentKind):
+    """Resumes, validated and rendered incrementally with the template they ask for."""
+
+    name = 'resume'
+    title = 'Resume'
+    collection = 'resumes'
+    id_field = 'resume_id'
+    version_header = 'X-Resume-Version'
+    default_filename = 'resume'
+
+    def __init__(self, env: Environment, registry: TemplateRegistry, max_entries: int = 4096):
+        self.env = env
+        self.registry = registry
+        # Re-validates and re-renders only the sections that changed since a previous render
+        self.renderer = IncrementalRenderer(env, RESUME_SECTIONS, max_entries)
+
+    def templates(self) -> List[str]:
+        return self.registry.names
+
+    def template_name(self, data: Dict) -> str:
+        """Template requested by the resume document; unknown templates are a 400."""
+        return self.registry.resolve(data.get('templateName', data.get('templateId')))
+
+    def validate(self, data: Dict) -> ValidatedDocument:
+        template_name = self.template_name(data)
+        reads: Optional[FieldReads] = self.registry.reads(template_name)
+        validated, digests = self.renderer.validate(data, reads)
+        extra = {'template_id': template_name}
+        validated.update(extra)
+        # Same version as IncrementalRenderer.render_document
+        version = section_digest([template_name, digests, extra])
+        return ValidatedDocument(template_name, validated, version, digests)
+
+    def render(self, document: ValidatedDocument) -> str:
+        return self.renderer.render(document.template_name, document.data, document.state)
+
+    def filename(self, data: Dict) -> str:
+        return data.get('resume_name', 'Resume')
+
+    def empty_document(self, template_name: str) -> Dict:
+        return {'templateName': template_name}
+
+    def stats(self) -> Dict[str, int]:
+        """Section memo hit/miss counters."""
+        return self.renderer.stats()
@@ -0,0 +1,156 @@
+"""Resource limits and file access restrictions for pdflatex.
+
+Every pdflatex process (warm pool processes and one-shot compiles) is started
+through a ``TexSandbox``:
+
+* It runs in its own session, so on a timeout the whole process group is
+  killed, including anything kpathsea spawned (mktextfm and friends).
+* CPU time, address space and the size of any file it writes are capped with
+  rlimits (TEX_CPU_LIMIT seconds, TEX_MEMORY_LIMIT_MB, TEX_FILE_SIZE_LIMIT_MB).
+  pdflatex is started through util-linux ``prlimit``, which sets the limits
+  on itself and then execs pdflatex, so they are in force before pdflatex
+  runs its first instruction without running Python code in the forked
+  child (``preexec_fn`` isn't safe in a threaded server). The values are
+  clamped to this process's hard limits, which a child can't raise.
+* ``-no-shell-escape`` disables ``\\write18``, and kpathsea's paranoid
+  ``openin_any``/``openout_any`` modes stop ``\\input`` and ``\\openout`` from
+  touching absolute paths, parent directories or dotfiles. Templates only
+  read files from the TeX tree and the compile directory.
+* ``SOURCE_DATE_EPOCH`` with ``FORCE_SOURCE_DATE=1`` makes the output
+  reproducible: the creation and modification dates and the trailer ``/ID``
+  no longer depend on when the compile ran.
+
+The wall-clock limit is the job timeout (TEX_JOB_TIMEOUT).
+"""
+import logging
+import os
+import resource
+import shutil
+import signal
+import subprocess
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# pdflatex arguments every sandboxed compile gets
+SANDBOX_ARGS = ('-no-shell-escape',)
+
+# kpathsea settings: no reads or writes outside the TeX tree and the working directory.
+# SOURCE_DATE_EPOCH and FORCE_SOURCE_DATE fix the dates and the /ID pdfTeX writes, so the
+# same source always compiles to the same bytes (and the same download ETag).
+SANDBOX_ENV = {'openin_any': 'p', 'openout_any': 'p', 'shell_escape': 'f',
+               'SOURCE_DATE_EPOCH': '0', 'FORCE_SOURCE_DATE': '1'}
+
+# (resource, (soft, hard)) pairs, as for setrlimit
+Rlimits = Tuple[Tuple[int, Tuple[int, int]], ...]
+
+# prlimit options for each resource
+PRLIMIT_OPTIONS = {resource.RLIMIT_CPU: 'cpu', resource.RLIMIT_AS: 'as',
+                   resource.RLIMIT_FSIZE: 'fsize', resource.RLIMIT_CORE: 'core'}
+
+
+class TexSandbox:
+    """Starts, limits and kills pdflatex processes."""
+
+    def __init__(self, timeout: float = 60, cpu_seconds: int = 30, memory_bytes: int = 1024 * 1024 * 1024,
+                 file_size_bytes: int = 64 * 1024 * 1024):
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.file_size_bytes = file_size_bytes
+        self._rlimits = self._clamp((
+            # SIGXCPU at the soft limit, SIGKILL a second later
+            (resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1)),
+            (resource.RLIMIT_AS, (memory_bytes, memory_bytes)),
+            (resource.RLIMIT_FSIZE, (file_size_bytes, file_size_bytes)),
+            (resource.RLIMIT_CORE, (0, 0)),
+        ))
+        self._prlimit = shutil.which('prlimit')
+        if self._prlimit is None:
+            logger.warning("prlimit not found; pdflatex runs without CPU, memory and file size limits")
+        self._lock = threading.Lock()
+        self._stats = {'started': 0, 'timeouts': 0, 'limit_kills': 0}
+
+    @classmethod
+    def from_env(cls) -> 'TexSandbox':
+        """Create a sandbox configured from TEX_JOB_TIMEOUT and TEX_*_LIMIT environment variables."""
+        return cls(
+            timeout=float(os.environ.get('TEX_JOB_TIMEOUT', 60)),
+            cpu_seconds=int(os.environ.get('TEX_CPU_LIMIT', 30)),
+            memory_bytes=int(os.environ.get('TEX_MEMORY_LIMIT_MB', 1024)) * 1024 * 1024,
+            file_size_bytes=int(os.environ.get('TEX_FILE_SIZE_LIMIT_MB', 64)) * 1024 * 1024,
+        )
+
+    def command(self, args: Sequence[str]) -> List[str]:
+        """pdflatex command line with the sandbox arguments."""
+        return ['pdflatex', *SANDBOX_ARGS, *args]
+
+    def environment(self, env: Optional[Dict[str, str]], cwd: str) -> Dict[str, str]:
+        """Process environment with kpathsea's file access restrictions."""
+        # Paranoid mode still allows absolute paths below TEXMFOUTPUT
+        return {**(env if env is not None else os.environ), **SANDBOX_ENV, 'TEXMFOUTPUT': cwd}
+
+    @staticmethod
+    def _clamp(limits: Rlimits) -> Rlimits:
+        """Limits lowered to the hard limits of this process, which an unprivileged child can't raise."""
+        clamped = []
+        for limit, (soft, hard) in limits:
+            _, current = resource.getrlimit(limit)
+            if current != resource.RLIM_INFINITY:
+                soft, hard = min(soft, current), min(hard, current)
+            clamped.append((limit, (soft, hard)))
+        return tuple(clamped)
+
+    def limited(self, command: Sequence[str]) -> List[str]:
+        """Command line that sets the rlimits and then execs ``command``."""
+        if self._prlimit is None:
+            return list(command)
+        options = [f'--{PRLIMIT_OPTIONS[limit]}={soft}:{hard}' for limit, (soft, hard) in self._rlimits]
+        return [self._prlimit, *options, '--', *command]
+
+    def popen(self, args: Sequence[str], cwd: str, env: Optional[Dict[str, str]], **kwargs) -> subprocess.Popen:
+        """Start a limited pdflatex process in its own process group."""
+        process = subprocess.Popen(self.limited(self.command(args)), cwd=cwd, env=self.environment(env, cwd),
+                                   start_new_session=True, **kwargs)
+        self._count('started')
+        return process
+
+    def kill(self, process: subprocess.Popen) -> None:
+        """Kill a process and its group, then reap it."""
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            process.kill()
+        process.wait()
+
+    def wait(self, process: subprocess.Popen, timeout: Optional[float] = None) -> bool:
+        """Wait for a process to exit; on timeout kill its group and return False."""
+        try:
+            returncode = process.wait(timeout=timeout or self.timeout)
+        except subprocess.TimeoutExpired:
+            self.kill(process)
+            self._count('timeouts')
+            return False
+        if returncode in (-signal.SIGXCPU, -signal.SIGKILL, -signal.SIGXFSZ):
+            self._count('limit_kills')
+            logger.error(f"pdflatex was stopped by a resource limit (signal {-returncode})")
+        return True
+
+    def run(self, args: Sequence[str], cwd: str, env: Optional[Dict[str, str]],
+            timeout: Optional[float] = None) -> bool:
+        """Run pdflatex to completion; False if it timed out."""
+        process = self.popen(args, cwd, env, stdin=subprocess.DEVNULL,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return self.wait(process, timeout)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Process counters and the configured limits."""
+        with self._lock:
+            stats = dict(self._stats)
+        return {**stats, 'cpu_limit_seconds': self.cpu_seconds,
+                'memory_limit_bytes': self.memory_bytes, 'timeout_seconds': self.timeout}
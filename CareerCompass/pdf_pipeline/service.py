@@ -0,0 +1,312 @@
+"""The parts of a generation service that don't depend on the document type.
+
+``ServiceRuntime`` owns what both services build the same way (metrics, the
+Firestore document store, the PDF cache, the compile engine, sandbox and
+admission control, previews, single-flight, pre-rendering) and registers the
+HTTP endpoints for each ``DocumentPipeline``: generate, batch, preview and
+/jobs, plus the common health, stats and document event endpoints. A service's main.py configures its templates and
+document kinds and hands them over.
+"""
+import logging
+import os
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import Flask, Response, jsonify, request
+
+from pdf_pipeline.admission import AdmissionController
+from pdf_pipeline.batch import parse_batch_items, stream_zip
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.compiler import CompileDriver
+from pdf_pipeline.delivery import PdfDelivery, PdfOptimizer
+from pdf_pipeline.engines import engine_from_env
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.event_auth import EventAuthenticator
+from pdf_pipeline.firestore_store import DocumentStore
+from pdf_pipeline.formats import FormatStore
+from pdf_pipeline.jobs import JobManager, register_job_routes
+from pdf_pipeline.metrics import Metrics, ProfileSampler, register_metrics
+from pdf_pipeline.payload import PayloadLimits
+from pdf_pipeline.pipeline import DocumentKind, DocumentPipeline
+from pdf_pipeline.prerender import Prerenderer
+from pdf_pipeline.preview import PreviewRenderer
+from pdf_pipeline.sandbox import TexSandbox
+from pdf_pipeline.singleflight import SingleFlight
+from pdf_pipeline.startup import StartupReport, warm_up, warmup_enabled
+from pdf_pipeline.workspace import WorkspacePool
+
+logger = logging.getLogger(__name__)
+
+
+def document_ids(data: Optional[Dict], id_field: str) -> Tuple[str, str]:
+    """user_id and the document ID from a request body; 400 if either is missing."""
+    if not data:
+        raise GenerationError('No JSON data provided', 400)
+    user_id = data.get('user_id')
+    document_id = data.get(id_field)
+    if not user_id or not document_id:
+        raise GenerationError(f'user_id and {id_field} are required', 400)
+    return user_id, document_id
+
+
+class ServiceRuntime:
+    """Shared state and endpoints of a PDF generation service."""
+
+    def __init__(self, app: Flask, name: str, startup: StartupReport, client_factory: Callable[[], Any]):
+        self.app = app
+        self.name = name
+        self.startup = startup
+
+        # Per-stage latency histograms and counters, served on /metrics
+        self.metrics = Metrics(name)
+        register_metrics(app, self.metrics, ProfileSampler.from_env(name))
+
+        # Shared Firestore client with a TTL cache of documents. Firebase is
+        # initialized with Application Default Credentials on the first read.
+        self.document_store = DocumentStore.from_env(client_factory)
+
+        # Cache of compiled PDFs keyed on the rendered LaTeX source
+        self.pdf_cache = PdfCache.from_env()
+
+        # Runs extra pdflatex passes only when the log asks for them, reusing .aux files
+        self.compile_driver = CompileDriver.from_env()
+
+        # Time, CPU, memory and file access limits for every pdflatex process
+        self.sandbox = TexSandbox.from_env()
+
+        # Reusable RAM-backed scratch directories for compiles and previews
+        self.workspaces = WorkspacePool.from_env()
+
+        # Pre-warmed pdflatex processes, or a fresh process per pass (TEX_ENGINE, TEX_POOL_SIZE)
+        self.engine = engine_from_env(self.compile_driver, self.sandbox, self.workspaces)
+
+        # Limits concurrent compiles to what the CPUs sustain, queueing the rest with a deadline
+        self.admission = AdmissionController.from_env()
+
+        # qpdf object stream compression of fresh compiles, and conditional,
+        # range-capable and compressed download responses
+        self.optimizer = PdfOptimizer.from_env(self.workspaces)
+        self.delivery = PdfDelivery.from_env()
+
+        # Page images for the app's preview screen, cached by content
+        self.previews = PreviewRenderer.from_env(self.workspaces)
+
+        # Identical concurrent reads and compiles share one run (see pdf_pipeline.singleflight)
+        self.single_flight = SingleFlight.from_env()
+
+        # PDFs compiled in the background when a document is written (PRERENDER=1), by version
+        self.prerender = Prerenderer.from_env(self.document_store)
+
+        # Only the Eventarc trigger's service account may post document events
+        self.event_auth = EventAuthenticator.from_env()
+
+        # Upper bound on the number of documents in one batch request
+        self.batch_max_items = int(os.environ.get('BATCH_MAX_ITEMS', 500))
+
+        self.metrics.add_collector('pdf_cache', self.pdf_cache.stats, gauges=('entries', 'memory_bytes'))
+        self.metrics.add_collector('firestore_cache', self.document_store.stats, gauges=('entries',))
+        self.metrics.add_collector('tex_compile', self.compile_driver.stats, gauges=('aux_entries',))
+        self.metrics.add_collector('tex_sandbox', self.sandbox.stats,
+                                   gauges=('cpu_limit_seconds', 'memory_limit_bytes', 'timeout_seconds'))
+        self.metrics.add_collector('preview_cache', self.previews.stats, gauges=('entries', 'memory_bytes'))
+        self.metrics.add_collector('pdf_optimizer', self.optimizer.stats)
+        self.metrics.add_collector('pdf_delivery', self.delivery.stats)
+        self.metrics.add_collector('compressed_cache', self.delivery.cache.stats, gauges=('entries', 'memory_bytes'))
+        self.metrics.add_collector('prerender', self.prerender.stats, gauges=('pending',))
+        self.metrics.add_collector('prerender_cache', self.prerender.artifacts.stats,
+                                   gauges=('entries', 'memory_bytes'))
+        self.metrics.add_collector('document_events', self.event_auth.stats)
+        self.metrics.add_collector('single_flight', self.single_flight.stats, gauges=('in_flight',))
+        self.metrics.add_collector('admission', self.admission.stats,
+                                   gauges=('limit', 'min_limit', 'max_limit', 'cpus', 'in_flight', 'queued',
+                                           'service_time_ms', 'baseline_ms', 'utilization'))
+        self.metrics.add_collector(self.engine.metrics_prefix, self.engine.stats, gauges=self.engine.stats_gauges)
+
+        self._register_common_routes()
+
+    def pipeline(self, kind: DocumentKind, formats: FormatStore, limits: PayloadLimits,
+                 metrics_prefix: str = 'payload') -> DocumentPipeline:
+        """A pipeline for kind sharing this service's caches and engine; limits are exported under metrics_prefix."""
+        self.metrics.add_collector(metrics_prefix, limits.stats)
+        return DocumentPipeline(kind, formats, self.document_store, self.pdf_cache, self.engine, self.optimizer,
+                                self.delivery, self.single_flight, self.admission, limits, self.metrics)
+
+    def _register_common_routes(self) -> None:
+        app = self.app
+
+        @app.route('/health', methods=['GET'])
+        def health_check():
+            """Health check endpoint."""
+            return jsonify({'status': 'healthy', 'service': self.name})
+
+        @app.route('/startup', methods=['GET'])
+        def startup_stats():
+            """Boot phase timings of this worker."""
+            return jsonify(self.startup.stats())
+
+        @app.route('/cache-stats', methods=['GET'])
+        def cache_stats():
+            """PDF cache hit/miss counters."""
+            return jsonify(self.pdf_cache.stats())
+
+        @app.route('/firestore-stats', methods=['GET'])
+        def firestore_stats():
+            """Firestore document cache counters."""
+            return jsonify(self.document_store.stats())
+
+        @app.route('/single-flight-stats', methods=['GET'])
+        def single_flight_stats():
+            """How often identical concurrent reads and compiles were coalesced."""
+            return jsonify(self.single_flight.stats())
+
+        @app.route('/pool-stats', methods=['GET'])
+        def pool_stats():
+            """Compile engine name, queue depth and job counters."""
+            return jsonify({'engine': self.engine.name, **self.engine.stats()})
+
+        @app.route('/admission-stats', methods=['GET'])
+        def admission_stats():
+            """Chosen compile limit, queue, measured compile time and CPU utilization."""
+            return jsonify(self.admission.stats())
+
+        @app.route('/prerender-stats', methods=['GET'])
+        def prerender_stats():
+            """Pre-rendering counters and pending documents."""
+            return jsonify({'enabled': self.prerender.enabled, **self.prerender.stats()})
+
+        @app.route('/document-events', methods=['POST'])
+        def document_events():
+            """A document was written: pre-render it once its edits settle (see pdf_pipeline.prerender).
+
+            Takes an Eventarc Firestore CloudEvent (the path is in the
+            ce-document or ce-subject header) or a JSON body with a path,
+            with the trigger's OIDC token (see pdf_pipeline.event_auth).
+            Responds once the document is rendered, or once a later event
+            for it has taken over.
+            """
+            try:
+                self.event_auth.verify(request.headers.get('Authorization'), request.host)
+            except GenerationError as e:
+                return jsonify(e.to_dict()), e.status, e.headers
+            path = request.headers.get('ce-document') or request.headers.get('ce-subject', '')
+            if not path:
+                path = (request.get_json(silent=True) or {}).get('path', '')
+            path = path.removeprefix('documents/')
+            if not path:
+                return jsonify({'error': 'No document path provided'}), 400
+            try:
+                result = self.prerender.handle_event(path)
+            except GenerationError as e:
+                # Compiles are busy: Eventarc retries anything but a 2xx with backoff
+                return jsonify(e.to_dict()), e.status, e.headers
+            # Ignored paths and documents that fail to render are accepted too, so they aren't retried
+            return jsonify({'path': path, 'result': result})
+
+    def register_document_routes(self, pipeline: DocumentPipeline, generate_path: str, preview_path: str,
+                                 batch_path: str, batch_filename: str) -> None:
+        """Add the generate, preview and batch endpoints for a pipeline's document kind."""
+        kind = pipeline.kind
+        self.prerender.register(pipeline)
+
+        def generate():
+            """Generate a PDF; a 304 if the client's previous_version is still current.
+
+            A PDF pre-rendered when the document was written is served as is;
+            otherwise the document is rendered and compiled now. POST takes a
+            JSON body; GET takes the same fields as query parameters and
+            supports resuming a download with Range.
+            """
+            try:
+                data = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+                user_id, document_id = document_ids(data, kind.id_field)
+                document = pipeline.validate(pipeline.fetch(user_id, document_id))
+
+                # The client already has this exact version of the document
+                if data.get('previous_version') == document.version:
+                    return Response(status=304, headers={kind.version_header: document.version})
+
+                pdf_content = self.prerender.lookup(pipeline, document)
+                if pdf_content is None:
+                    pdf_content = pipeline.compile(pipeline.render(document))
+                return pipeline.deliver(pdf_content, document)
+
+            except GenerationError as e:
+                return jsonify(e.to_dict()), e.status, e.headers
+            except Exception as e:
+                logger.error(f"Error generating {kind.name}: {e}")
+                return jsonify({'error': 'Internal server error'}), 500
+
+        def preview():
+            """Page images for the app's preview screen.
+
+            Takes user_id and the document ID plus optional page (a number or
+            'all'), dpi and format ('png' or 'jpeg'); honours If-None-Match.
+            """
+            try:
+                data = request.get_json(silent=True)
+                user_id, document_id = document_ids(data, kind.id_field)
+                options = self.previews.parse_options(data)
+                document = pipeline.prepare(pipeline.fetch(user_id, document_id))
+
+                with self.metrics.stage('preview'):
+                    return self.previews.respond(
+                        pipeline.cache_key(document), options, lambda: pipeline.compile(document),
+                        pipeline.filename(document)
+                    )
+
+            except GenerationError as e:
+                return jsonify(e.to_dict()), e.status, e.headers
+            except Exception as e:
+                logger.error(f"Error generating {kind.name} preview: {e}")
+                return jsonify({'error': 'Internal server error'}), 500
+
+        def generate_batch():
+            """Generate many documents in one request, streamed back as a ZIP archive."""
+            try:
+                items = parse_batch_items(request.get_json(silent=True), kind.id_field, self.batch_max_items)
+                paths = {item: pipeline.path(*item) for item in items}
+                fetched = self.document_store.get_many(list(paths.values()))
+                documents = {item: fetched[path] for item, path in paths.items()}
+            except GenerationError as e:
+                return jsonify(e.to_dict()), e.status, e.headers
+            except Exception as e:
+                logger.error(f"Error fetching {kind.name} batch: {e}")
+                return jsonify({'error': 'Internal server error'}), 500
+
+            return Response(
+                stream_zip(items, documents, pipeline.build),
+                mimetype='application/zip',
+                headers={'Content-Disposition': f'attachment; filename="{batch_filename}"'}
+            )
+
+        self.app.add_url_rule(generate_path, f'generate_{kind.name}', generate, methods=['GET', 'POST'])
+        self.app.add_url_rule(preview_path, f'preview_{kind.name}', preview, methods=['POST'])
+        self.app.add_url_rule(batch_path, f'generate_{kind.name}_batch', generate_batch, methods=['POST'])
+
+    def register_jobs(self, pipeline: DocumentPipeline) -> JobManager:
+        """Asynchronous POST /jobs, GET /jobs/<id> and GET /jobs/<id>/pdf for a pipeline's documents."""
+        id_field = pipeline.kind.id_field
+
+        def run_job(data: Dict) -> Tuple[bytes, str]:
+            return pipeline.build_by_id(data['user_id'], data[id_field])
+
+        manager = JobManager.from_env(self.name)
+        register_job_routes(self.app, manager, run_job, ('user_id', id_field))
+        return manager
+
+    def ready(self, pipelines: Sequence[DocumentPipeline], warm: Iterable[DocumentPipeline] = ()) -> None:
+        """Load every pipeline's templates and warm up the engine before serving (see pdf_pipeline.startup).
+
+        Each template of the pipelines in warm is compiled once while the
+        Firestore client is created in the background.
+        """
+        with self.startup.phase('templates'):
+            for pipeline in pipelines:
+                pipeline.load_templates()
+        if warmup_enabled():
+            with self.startup.phase('warmup'):
+                background: List[Callable[[], Any]] = [lambda: self.document_store.client]
+                for pipeline in warm:
+                    warm_up(pipeline.kind.templates(), pipeline.warm_up, background=background)
+                    background = []
+        self.startup.finish()
+        self.metrics.add_collector('startup', self.startup.stats, gauges=tuple(self.startup.stats()))
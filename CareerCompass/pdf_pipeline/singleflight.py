@@ -0,0 +1,107 @@
+"""Single-flight coalescing of identical concurrent work.
+
+Tapping preview and then download, or a client retrying after a timeout, sends
+the same generate request several times in quick succession. Both services
+route the Firestore read (keyed on the document path) and the compile (keyed
+on the PDF cache key, i.e. the rendered content) through a ``SingleFlight``:
+the first caller for a key runs the work, and callers arriving while it is in
+flight wait for it and get the same result or the same exception. Nothing is
+kept once the call finishes; finished PDFs are reused through ``PdfCache``.
+
+Rendering between the two is not coalesced, since it is memoized per section
+and the compile key is only known once the LaTeX has been rendered.
+
+If the running call is interrupted by something other than an ``Exception``
+(the worker shutting down), waiters are released and one of them runs the
+work again. Waiters give up after SINGLE_FLIGHT_WAIT_TIMEOUT seconds with a
+503. SINGLE_FLIGHT=0 turns coalescing off.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from pdf_pipeline.errors import GenerationError
+
+T = TypeVar('T')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'abandoned')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[Exception] = None
+        self.abandoned = False
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time and shares its outcome with concurrent callers."""
+
+    def __init__(self, enabled: bool = True, wait_timeout: Optional[float] = 120):
+        self.enabled = enabled
+        self.wait_timeout = wait_timeout
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0, 'shared_errors': 0, 'abandoned': 0, 'wait_timeouts': 0}
+
+    @classmethod
+    def from_env(cls) -> 'SingleFlight':
+        """Create a SingleFlight configured from SINGLE_FLIGHT* environment variables."""
+        return cls(
+            enabled=os.environ.get('SINGLE_FLIGHT', '1').lower() not in ('0', 'false', 'no'),
+            wait_timeout=float(os.environ.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 120)) or None,
+        )
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Return fn(), or the outcome of an identical call already in flight for key."""
+        if not self.enabled:
+            return fn()
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self._stats['calls'] += 1
+                else:
+                    self._stats['coalesced'] += 1
+            if leader:
+                return self._run(key, call, fn)
+
+            if not call.done.wait(self.wait_timeout):
+                self._count('wait_timeouts')
+                raise GenerationError('Timed out waiting for an identical request to finish', 503)
+            if call.abandoned:
+                # The running call was interrupted; take over if nobody else has
+                continue
+            if call.error is not None:
+                self._count('shared_errors')
+                raise call.error
+            return call.result
+
+    def _run(self, key: Hashable, call: _Call, fn: Callable[[], T]) -> T:
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        except BaseException:
+            call.abandoned = True
+            self._count('abandoned')
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Coalescing counters and the number of calls in flight."""
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
@@ -0,0 +1,162 @@
+"""Cold start: boot phase timings, Jinja bytecode caching and a warm-up compile.
+
+Each scale-out on Cloud Run imports the service, builds its Jinja environment
+and runs its first pdflatex with nothing in the page cache. The services keep
+that off the first request:
+
+* ``firebase_admin`` (about half a second of imports) is not imported with
+  the service. ``firebase_client`` imports it and creates the client during
+  the warm-up, in parallel with the TeX compiles, or on the first read.
+* Templates are loaded at boot through a Jinja ``FileSystemBytecodeCache``
+  (JINJA_BYTECODE_CACHE_DIR). The images import the service once at build
+  time with STARTUP_WARMUP=0 so the cache ships filled.
+* One throwaway document per template is compiled before the worker starts
+  serving, which checks the format files, starts the TeX worker pool and
+  pages pdflatex and the formats into memory. Set STARTUP_WARMUP=0 to skip it.
+
+``StartupReport`` records how long each boot phase took; it is logged once the
+service is ready and served on ``/startup``. With an HTTP startup probe on
+``/health`` Cloud Run only routes traffic to an instance after its warm-up.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import jinja2
+from jinja2 import Environment, FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """Durations of a service's boot phases, measured from when it was created."""
+
+    def __init__(self, service_name: str):
+        self.service_name = service_name
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.total: Optional[float] = None
+        self._last = self.started
+
+    def mark(self, phase: str) -> None:
+        """Record the time since the previous mark as phase."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0) + now - self._last
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a block as one boot phase."""
+        self.mark('setup')
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    def finish(self) -> None:
+        """Mark the service ready and log the report."""
+        self.mark('setup')
+        self.total = time.perf_counter() - self.started
+        phases = ', '.join(f'{name} {seconds * 1000:.0f}ms' for name, seconds in self.phases.items())
+        logger.info(f"{self.service_name} ready in {self.total * 1000:.0f}ms ({phases})")
+
+    def stats(self) -> Dict[str, Any]:
+        """Phase durations in seconds and whether the service is ready."""
+        stats: Dict[str, Any] = {f'{name}_seconds': seconds for name, seconds in self.phases.items()}
+        stats['ready'] = self.total is not None
+        if self.total is not None:
+            stats['total_seconds'] = self.total
+        return stats
+
+
+def firebase_client() -> Any:
+    """Firestore client of the default Firebase app, initializing the app on first use.
+
+    firebase_admin pulls in the whole Google Cloud client stack, so it is
+    imported here rather than when the service starts.
+    """
+    import firebase_admin
+    from firebase_admin import firestore
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        # Application Default Credentials on Cloud Run
+        firebase_admin.initialize_app()
+    return firestore.client()
+
+
+def _options_digest(env: Environment) -> str:
+    # Jinja keys cached bytecode on the template source only, but the
+    # delimiters and whitespace options change the compiled code too
+    autoescape = env.autoescape if isinstance(env.autoescape, bool) else getattr(env.autoescape, '__qualname__', '')
+    options = (
+        jinja2.__version__, env.block_start_string, env.block_end_string, env.variable_start_string,
+        env.variable_end_string, env.comment_start_string, env.comment_end_string, env.line_statement_prefix,
+        env.line_comment_prefix, env.trim_blocks, env.lstrip_blocks, env.newline_sequence,
+        env.keep_trailing_newline, sorted(env.extensions), autoescape,
+    )
+    return hashlib.sha256(repr(options).encode('utf-8')).hexdigest()[:16]
+
+
+def enable_bytecode_cache(env: Environment, default_dir: str) -> bool:
+    """Cache env's compiled templates in JINJA_BYTECODE_CACHE_DIR (default default_dir).
+
+    Returns False, leaving templates to compile on load, if the directory is
+    not writable.
+    """
+    directory = os.environ.get('JINJA_BYTECODE_CACHE_DIR', default_dir)
+    try:
+        os.makedirs(directory, exist_ok=True)
+    except OSError:
+        pass
+    if not os.access(directory, os.W_OK | os.X_OK):
+        logger.warning(f"Jinja bytecode cache {directory} is not writable; templates compile on load")
+        return False
+    env.bytecode_cache = FileSystemBytecodeCache(directory, f'__jinja2_{_options_digest(env)}_%s.cache')
+    return True
+
+
+def preload_templates(env: Environment, names: Iterable[str]) -> List[str]:
+    """Load templates into the environment's cache; returns the names that failed."""
+    failed = []
+    for name in names:
+        try:
+            env.get_template(f'{name}.tex')
+        except Exception as e:
+            logger.error(f"Could not load template {name}: {e}")
+            failed.append(name)
+    return failed
+
+
+def warmup_enabled() -> bool:
+    return os.environ.get('STARTUP_WARMUP', '1').lower() not in ('0', 'false', 'no')
+
+
+def warm_up(names: Iterable[str], compile_one: Callable[[str], bool],
+            background: Sequence[Callable[[], Any]] = ()) -> None:
+    """Compile a throwaway document for each template so TeX is warm for real requests.
+
+    Callables in background (e.g. creating the Firestore client) run in
+    threads alongside the compiles; all of them finish before this returns.
+    """
+    def run(step: Callable[[], Any]) -> None:
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Warm-up step failed: {e}")
+
+    threads = [threading.Thread(target=run, args=(step,), name='startup-warmup', daemon=True) for step in background]
+    for thread in threads:
+        thread.start()
+    for name in names:
+        try:
+            if not compile_one(name):
+                logger.warning(f"Warm-up compile of {name} produced no PDF")
+        except Exception as e:
+            logger.warning(f"Warm-up compile of {name} failed: {e}")
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,224 @@
+"""Registry of document templates with the data fields each one reads.
+
+Every ``<name>.tex`` in a template directory is loaded and checked when the
+service starts: it must parse and have a static preamble (see
+``pdf_pipeline.formats``). Adding a template is a matter of dropping both
+files in place.
+
+Each template's AST is walked to record the data paths it reads, such as
+``fullName``, ``work_experience.location`` (a field of every item of the list)
+or ``skills.tools``. Validators use the resulting ``FieldReads`` to skip
+formatting and escaping fields the chosen template never prints. A path used
+as a whole (output directly or passed to a filter) counts as reading
+everything below it, and templates the analysis can't follow (``include``,
+``extends``, ``import``) read everything.
+"""
+import logging
+import os
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Mapping, Optional, Set, Tuple
+
+from jinja2 import Environment, nodes
+
+from pdf_pipeline.errors import GenerationError
+
+logger = logging.getLogger(__name__)
+
+# Nodes whose targets can't be followed statically
+_OPAQUE_NODES = (nodes.Include, nodes.Extends, nodes.Import, nodes.FromImport)
+
+
+class FieldReads:
+    """The data paths a template reads.
+
+    ``full`` paths are read with everything below them; ``shallow`` paths are
+    only tested or iterated. ``path in reads`` tells whether a validator must
+    produce path.
+    """
+
+    def __init__(self, full: Iterable[str], shallow: Iterable[str] = ()):
+        self.full: FrozenSet[str] = frozenset(full)
+        self.shallow: FrozenSet[str] = frozenset(shallow)
+
+    def __contains__(self, path: str) -> bool:
+        if path in self.shallow or path in self.full:
+            return True
+        parts = path.split('.')
+        return any('.'.join(parts[:i]) in self.full for i in range(1, len(parts)))
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, FieldReads) and (self.full, self.shallow) == (other.full, other.shallow)
+
+    def __hash__(self) -> int:
+        return hash((self.full, self.shallow))
+
+    def __repr__(self) -> str:
+        return f'FieldReads({sorted(self.full)}, {sorted(self.shallow)})'
+
+
+def select_fields(converters: Mapping[str, Callable[[Dict], Any]], item: Dict,
+                  reads: Optional[FieldReads], prefix: str = '') -> Dict[str, Any]:
+    """Apply the converters for the fields of item under prefix that reads includes (all if reads is None)."""
+    return {
+        key: convert(item) for key, convert in converters.items()
+        if reads is None or (f'{prefix}.{key}' if prefix else key) in reads
+    }
+
+
+def select_items(converters: Mapping[str, Callable[[Dict], Any]], items: Iterable[Dict],
+                 reads: Optional[FieldReads], prefix: str) -> List[Dict[str, Any]]:
+    """select_fields for every item of the list at prefix, or [] if the template never uses the list."""
+    if reads is not None and prefix not in reads:
+        return []
+    return [select_fields(converters, item, reads, prefix) for item in items]
+
+
+class _ReadCollector:
+    def __init__(self):
+        self.full: Set[str] = set()
+        self.shallow: Set[str] = set()
+        self.opaque = False
+
+    def path(self, node: nodes.Node, scope: Dict[str, Optional[str]]) -> Optional[str]:
+        """Data path of a name/attribute/constant-subscript chain, or None."""
+        if isinstance(node, nodes.Name):
+            return scope[node.name] if node.name in scope else node.name
+        if isinstance(node, nodes.Getattr):
+            base = self.path(node.node, scope)
+            return base and f'{base}.{node.attr}'
+        if isinstance(node, nodes.Getitem) and isinstance(node.arg, nodes.Const) and isinstance(node.arg.value, str):
+            base = self.path(node.node, scope)
+            return base and f'{base}.{node.arg.value}'
+        return None
+
+    def visit(self, node: nodes.Node, scope: Dict[str, Optional[str]], shallow: bool = False) -> None:
+        if isinstance(node, _OPAQUE_NODES):
+            self.opaque = True
+            return
+        if isinstance(node, (nodes.Name, nodes.Getattr, nodes.Getitem)):
+            path = self.path(node, scope)
+            if path is not None:
+                (self.shallow if shallow else self.full).add(path)
+                return
+            # Not a plain chain (e.g. an attribute of a call result): look inside
+        if isinstance(node, nodes.Call) and isinstance(node.node, nodes.Getattr):
+            # A method call such as exp.get('title') may read anything below exp
+            base = self.path(node.node.node, scope)
+            if base is not None:
+                self.full.add(base)
+                for child in node.iter_child_nodes(exclude=('node',)):
+                    self.visit(child, scope)
+                return
+        if isinstance(node, nodes.For):
+            self.visit(node.iter, scope, shallow=True)
+            body_scope = dict(scope, loop=None)
+            iterated = self.path(node.iter, scope)
+            if isinstance(node.target, nodes.Name) and iterated is not None:
+                # Attributes of the loop variable are fields of every item
+                body_scope[node.target.name] = iterated
+            else:
+                if iterated is not None:
+                    self.full.add(iterated)
+                for name in node.target.find_all(nodes.Name):
+                    body_scope[name.name] = None
+            for child in node.body + node.else_:
+                self.visit(child, body_scope)
+            if node.test is not None:
+                self.visit(node.test, body_scope, shallow=True)
+            return
+        if isinstance(node, (nodes.If, nodes.CondExpr)):
+            self.visit(node.test, scope, shallow=True)
+            for child in node.iter_child_nodes(exclude=('test',)):
+                self.visit(child, scope)
+            return
+        if shallow and isinstance(node, (nodes.Not, nodes.And, nodes.Or)):
+            for child in node.iter_child_nodes():
+                self.visit(child, scope, shallow=True)
+            return
+        if shallow and isinstance(node, nodes.Test):
+            # The subject of a test like "is defined" is only inspected
+            self.visit(node.node, scope, shallow=True)
+            for child in node.iter_child_nodes(exclude=('node',)):
+                self.visit(child, scope)
+            return
+        for child in node.iter_child_nodes():
+            self.visit(child, scope)
+
+    def reads(self, ignore: Iterable[str]) -> Optional[FieldReads]:
+        if self.opaque:
+            return None
+        skip = set(ignore)
+        keep = lambda path: path.split('.', 1)[0] not in skip  # noqa: E731
+        return FieldReads(filter(keep, self.full), filter(keep, self.shallow))
+
+
+def analyze_template(env: Environment, name: str) -> Optional[FieldReads]:
+    """The fields a template reads, or None if it can't be analyzed (it reads everything)."""
+    source, _, _ = env.loader.get_source(env, name)
+    collector = _ReadCollector()
+    collector.visit(env.parse(source), {'loop': None})
+    # Globals such as range or cycler aren't document data
+    return collector.reads(env.globals)
+
+
+class TemplateRegistry:
+    """Templates found at startup, the fields each reads and request-to-template resolution."""
+
+    def __init__(self, templates: Dict[str, Optional[FieldReads]], default: str,
+                 always_read: Iterable[str] = ()):
+        if default not in templates:
+            raise ValueError(f"Default template {default} is not available")
+        self.default = default
+        self.always_read = tuple(always_read)
+        self._reads = {
+            name: None if reads is None else FieldReads(reads.full | set(self.always_read), reads.shallow)
+            for name, reads in templates.items()
+        }
+
+    @classmethod
+    def load(cls, env: Environment, template_dir: str, preambles: Iterable[str], default: str,
+             always_read: Iterable[str] = ()) -> 'TemplateRegistry':
+        """Load and analyze every template in template_dir; raises ValueError for a broken one.
+
+        always_read lists fields the service itself uses (e.g. for file
+        names), which are kept whatever the template reads.
+        """
+        preambles = set(preambles)
+        templates: Dict[str, Optional[FieldReads]] = {}
+        for filename in sorted(os.listdir(template_dir)):
+            if not filename.endswith('.tex') or not os.path.isfile(os.path.join(template_dir, filename)):
+                continue
+            name = filename[:-4]
+            if name not in preambles:
+                raise ValueError(f"Template {name} has no preamble")
+            try:
+                env.get_template(filename)
+                templates[name] = analyze_template(env, filename)
+            except Exception as e:
+                raise ValueError(f"Template {name} is invalid: {e}") from e
+            if templates[name] is None:
+                logger.warning(f"Template {name} includes other templates; validating every field for it")
+        return cls(templates, default, always_read)
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(self._reads)
+
+    def resolve(self, requested: Any) -> str:
+        """The template for a requested name (the default when none is given); unknown names are a 400."""
+        if not requested:
+            return self.default
+        name = requested.lower() if isinstance(requested, str) else None
+        if name not in self._reads:
+            raise GenerationError(f'Unknown template: {requested}', 400, {'templates': self.names})
+        return name
+
+    def reads(self, name: str) -> Optional[FieldReads]:
+        """The fields a template reads, or None if all of them must be validated."""
+        return self._reads[name]
+
+    def describe(self) -> Dict[str, Tuple[List[str], List[str]]]:
+        """Read and tested-only paths per template, for inspection."""
+        return {
+            name: (sorted(reads.full), sorted(reads.shallow - reads.full)) if reads else (['*'], [])
+            for name, reads in sorted(self._reads.items())
+        }
@@ -0,0 +1,283 @@
+"""Pool of pre-warmed pdflatex processes.
+
+Each worker owns a scratch directory (on ``/dev/shm`` when available, see
+``pdf_pipeline.workspace``) that is reused between jobs and keeps one
+pdflatex process started ahead of time. That process has already paid for
+exec, kpathsea initialisation and loading its format, and is blocked on a
+``\\read`` from the terminal waiting for the name of the file to compile. When
+a job arrives the worker writes the document into its scratch directory and
+hands the filename to the waiting process, then starts the next warm process
+for the same format in the background.
+
+Jobs are dispatched through a bounded queue; when it is full the request is
+turned away at once with a 503 and a Retry-After worked out from the measured
+job time. Each job has a timeout after which the process group is killed, and workers rebuild their scratch directory after a
+number of jobs or whenever a process crashes. Processes run under the
+resource limits and file restrictions of a ``TexSandbox``.
+"""
+import logging
+import math
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Dict, List, Optional, Tuple
+
+from pdf_pipeline.compiler import CompileDriver, CompileResult
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.sandbox import TexSandbox
+from pdf_pipeline.workspace import clean_directory, default_scratch_root
+
+logger = logging.getLogger(__name__)
+
+JOB_NAME = 'doc'
+
+# First line fed to pdflatex: wait on the terminal for a filename, then \input it.
+# \endlinechar=-1 stops the newline we send from becoming part of the filename.
+WARM_FIRST_LINE = r'\endlinechar=-1 \read16 to\jobfile \endlinechar=13 \input{\jobfile}'
+
+# Weight of the newest job in the average job time
+SMOOTHING = 0.2
+
+
+class _Job:
+    def __init__(self, source: str, args: List[str], env: Optional[Dict[str, str]], timeout: float):
+        self.source = source
+        self.args = args
+        self.env = env
+        self.timeout = timeout
+        self.future: Future = Future()
+
+
+class _Worker(threading.Thread):
+    def __init__(self, pool: 'TexWorkerPool', index: int):
+        super().__init__(name=f'tex-worker-{index}', daemon=True)
+        self.pool = pool
+        self.scratch_dir = self._make_scratch_dir()
+        self.jobs_done = 0
+        self.process: Optional[subprocess.Popen] = None
+        self.process_key: Optional[Tuple[str, ...]] = None
+
+    def _make_scratch_dir(self) -> str:
+        return tempfile.mkdtemp(prefix=f'{self.name}-', dir=self.pool.scratch_root)
+
+    def _spawn(self, args: List[str], env: Optional[Dict[str, str]]) -> None:
+        self.process = self.pool.sandbox.popen(
+            [*args, '-interaction=scrollmode', f'-jobname={JOB_NAME}', WARM_FIRST_LINE],
+            self.scratch_dir, env, text=True,
+            stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        self.process_key = tuple(args)
+
+    def _discard_process(self) -> None:
+        if self.process and self.process.poll() is None:
+            self.pool.sandbox.kill(self.process)
+        self.process = None
+        self.process_key = None
+
+    def _recycle(self, reason: str) -> None:
+        logger.info(f"Recycling {self.name}: {reason}")
+        self._discard_process()
+        shutil.rmtree(self.scratch_dir, ignore_errors=True)
+        self.scratch_dir = self._make_scratch_dir()
+        self.jobs_done = 0
+        self.pool._count('recycled')
+
+    def run(self) -> None:
+        while True:
+            job = self.pool._queue.get()
+            if job is None:
+                self._discard_process()
+                shutil.rmtree(self.scratch_dir, ignore_errors=True)
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            self.pool._set_busy(1)
+            start = time.monotonic()
+            try:
+                job.future.set_result(self._run_job(job))
+            except Exception as e:
+                logger.error(f"Error compiling LaTeX in {self.name}: {e}")
+                job.future.set_result(CompileResult(None))
+            finally:
+                self.pool._finish(time.monotonic() - start)
+
+    def _run_pass(self, job: _Job, pass_number: int) -> bool:
+        """Run one pdflatex pass over the job's input file; False if it timed out or crashed."""
+        if pass_number == 1 and self.process is not None:
+            self.pool._count('warm_hits')
+        else:
+            # Later passes reread the .aux written by the previous one, so they need a new process
+            self._spawn(job.args, job.env)
+
+        process = self.process
+        self.process = None
+        try:
+            process.stdin.write(f'{JOB_NAME}-input.tex\n')
+            process.stdin.close()
+        except OSError as e:
+            # The warm process died while we were handing it the job
+            logger.error(f"Warm pdflatex process failed in {self.name}: {e}")
+            self._recycle('warm process crashed')
+            return False
+        if not self.pool.sandbox.wait(process, job.timeout):
+            self.pool._count('timeouts')
+            logger.error(f"LaTeX compilation timed out after {job.timeout}s in {self.name}")
+            self._recycle('job timed out')
+            return False
+        return True
+
+    def _run_job(self, job: _Job) -> CompileResult:
+        key = tuple(job.args)
+        if self.process is not None and (self.process_key != key or self.process.poll() is not None):
+            if self.process.poll() is not None:
+                self._recycle('warm process exited before use')
+            else:
+                self._discard_process()
+
+        with open(os.path.join(self.scratch_dir, f'{JOB_NAME}-input.tex'), 'w', encoding='utf-8') as f:
+            f.write(job.source)
+
+        result = self.pool.driver.run(self.scratch_dir, JOB_NAME, job.source, job.args,
+                                      lambda pass_number: self._run_pass(job, pass_number))
+        if result.timed_out:
+            # The scratch directory was already rebuilt
+            self._spawn(job.args, job.env)
+            return result
+        self.pool._count('completed' if result.pdf else 'failed')
+        if not result.pdf:
+            logger.error(f"LaTeX compilation failed in {self.name}: "
+                         f"{'; '.join(error.message for error in result.errors[:3]) or 'no PDF produced'}")
+
+        self.jobs_done += 1
+        if self.jobs_done >= self.pool.max_jobs_per_worker:
+            self._recycle(f'served {self.jobs_done} jobs')
+        else:
+            clean_directory(self.scratch_dir)
+        # Pre-warm the next process for the same format while the caller reads the result
+        self._spawn(job.args, job.env)
+        return result
+
+
+class TexWorkerPool:
+    """Fixed-size pool of workers that compile LaTeX with pre-warmed pdflatex processes."""
+
+    # Compile engine name, /metrics prefix and gauge stats (see pdf_pipeline.engines)
+    name = 'warm'
+    metrics_prefix = 'tex_pool'
+    stats_gauges = ('busy', 'size', 'queue_depth')
+
+    def __init__(self, size: int, queue_size: int = 16, job_timeout: float = 60,
+                 max_jobs_per_worker: int = 100, scratch_root: Optional[str] = None,
+                 driver: Optional[CompileDriver] = None, sandbox: Optional[TexSandbox] = None):
+        self.size = size
+        self.driver = driver or CompileDriver()
+        self.sandbox = sandbox or TexSandbox(job_timeout)
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.scratch_root = scratch_root
+        self._queue: 'queue.Queue[Optional[_Job]]' = queue.Queue(maxsize=queue_size)
+        self._workers: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        # Smoothed seconds per job, for the Retry-After of rejected requests
+        self._job_time: Optional[float] = None
+        self._stats = {'completed': 0, 'failed': 0, 'timeouts': 0, 'rejected': 0,
+                       'recycled': 0, 'warm_hits': 0}
+
+    @classmethod
+    def from_env(cls, driver: Optional[CompileDriver] = None,
+                 sandbox: Optional[TexSandbox] = None) -> Optional['TexWorkerPool']:
+        """Create a pool configured from TEX_POOL_* environment variables, or None if disabled."""
+        size = int(os.environ.get('TEX_POOL_SIZE', os.cpu_count() or 1))
+        if size <= 0:
+            return None
+        return cls(
+            size=size,
+            queue_size=int(os.environ.get('TEX_POOL_QUEUE_SIZE', size * 4)),
+            job_timeout=float(os.environ.get('TEX_JOB_TIMEOUT', 60)),
+            max_jobs_per_worker=int(os.environ.get('TEX_WORKER_MAX_JOBS', 100)),
+            scratch_root=default_scratch_root(),
+            driver=driver,
+            sandbox=sandbox,
+        )
+
+    def _ensure_started(self) -> None:
+        # Started lazily so gunicorn workers each get their own threads after forking
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            workers = [_Worker(self, i) for i in range(self.size)]
+            for worker in workers:
+                worker.start()
+            self._workers = workers
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def _set_busy(self, delta: int) -> None:
+        with self._lock:
+            self._busy += delta
+
+    def _finish(self, elapsed: float) -> None:
+        with self._lock:
+            self._busy -= 1
+            if self._job_time is None:
+                self._job_time = elapsed
+            else:
+                self._job_time += SMOOTHING * (elapsed - self._job_time)
+
+    def _busy_error(self) -> GenerationError:
+        # Time for the workers to get through a full queue
+        with self._lock:
+            job_time = self._job_time or 1
+        retry_after = max(1, math.ceil(job_time * (self._queue.maxsize + self.size) / self.size))
+        return GenerationError('Server is busy (compile queue is full), retry later', 503,
+                               {'retry_after': retry_after}, headers={'Retry-After': str(retry_after)})
+
+    def compile(self, source: str, args: Optional[List[str]] = None,
+                env: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> CompileResult:
+        """Compile LaTeX source on the pool; the result's pdf is None on failure.
+
+        Raises a 503 GenerationError straight away when the queue is full.
+        """
+        self._ensure_started()
+        job = _Job(source, list(args or []), env, timeout or self.job_timeout)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            self._count('rejected')
+            logger.warning("LaTeX worker pool queue is full")
+            raise self._busy_error()
+        try:
+            # Allow for every pass of the job and time spent queued behind a full pool of jobs
+            wait = job.timeout * self.driver.max_passes * (self.size + self._queue.maxsize) / self.size
+            return job.future.result(timeout=wait)
+        except FutureTimeoutError:
+            job.future.cancel()
+            logger.error("Timed out waiting for a LaTeX worker")
+            return CompileResult(None, timed_out=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Return queue depth, busy workers and job counters."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['busy'] = self._busy
+        stats['size'] = self.size
+        stats['queue_depth'] = self._queue.qsize()
+        return stats
+
+    def shutdown(self) -> None:
+        """Stop all workers and remove their scratch directories."""
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
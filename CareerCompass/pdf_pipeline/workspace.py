@@ -0,0 +1,115 @@
+"""Reusable scratch directories for compiling LaTeX.
+
+Compiling in a fresh ``TemporaryDirectory`` costs a mkdir, an rmtree and new
+directory entries for every request. ``WorkspacePool`` hands out directories
+that are created once per process and emptied between uses instead, most
+recently used first so their metadata stays hot.
+
+Directories live on a RAM-backed filesystem when one is available
+(``/dev/shm`` by default; override with TEX_SCRATCH_ROOT), so pdflatex's
+``.aux``/``.log``/``.out`` files and the PDF never reach a disk. On Cloud Run
+the whole writable filesystem is already in memory and the saving is the
+directory churn.
+"""
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RAM_FILESYSTEM = '/dev/shm'
+
+
+def default_scratch_root() -> Optional[str]:
+    """TEX_SCRATCH_ROOT, else /dev/shm if it is writable, else None (the system temp dir)."""
+    root = os.environ.get('TEX_SCRATCH_ROOT')
+    if root:
+        return root
+    if os.path.isdir(RAM_FILESYSTEM) and os.access(RAM_FILESYSTEM, os.W_OK | os.X_OK):
+        return RAM_FILESYSTEM
+    return None
+
+
+def clean_directory(path: str) -> None:
+    """Remove everything inside path, keeping the directory itself."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+
+
+class WorkspacePool:
+    """Per-process pool of scratch directories that are emptied and reused."""
+
+    def __init__(self, size: int = 4, root: Optional[str] = None):
+        self.size = size
+        self.root = root
+        self._free: List[str] = []
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._stats = {'created': 0, 'reused': 0, 'discarded': 0}
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls) -> 'WorkspacePool':
+        """Create a pool configured from TEX_WORKSPACES and TEX_SCRATCH_ROOT."""
+        return cls(size=int(os.environ.get('TEX_WORKSPACES', 4)), root=default_scratch_root())
+
+    def _take(self) -> Optional[str]:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the directories belong to the parent process
+                self._free, self._pid = [], os.getpid()
+            if self._free:
+                self._stats['reused'] += 1
+                return self._free.pop()
+            self._stats['created'] += 1
+            return None
+
+    def _give_back(self, path: str) -> None:
+        with self._lock:
+            if len(self._free) < self.size and self._pid == os.getpid():
+                self._free.append(path)
+                return
+            self._stats['discarded'] += 1
+        shutil.rmtree(path, ignore_errors=True)
+
+    @contextmanager
+    def workspace(self) -> Iterator[str]:
+        """An empty directory for one compile; emptied and returned to the pool afterwards."""
+        path = self._take() or tempfile.mkdtemp(prefix='tex-workspace-', dir=self.root)
+        try:
+            yield path
+        finally:
+            try:
+                clean_directory(path)
+            except OSError as e:
+                logger.warning(f"Could not clean workspace {path}: {e}")
+                with self._lock:
+                    self._stats['discarded'] += 1
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                self._give_back(path)
+
+    def close(self) -> None:
+        """Remove the idle directories."""
+        with self._lock:
+            free, self._free = self._free, []
+            if self._pid != os.getpid():
+                return
+        for path in free:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, int]:
+        """Directories created, reused and discarded, and how many are idle."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['free'] = len(self._free)
+        return stats
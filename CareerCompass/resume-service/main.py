@@ -1,12 +1,26 @@
+from pdf_pipeline.startup import StartupReport
+
+# Boot phase timings from here on, logged when ready and served on /startup
+startup = StartupReport('resume-service')
+
 from flask import Flask, request, jsonify, Response
-from firebase_admin import initialize_app, firestore
-import tempfile
-import subprocess
 import os
 import logging
-import re
-from jinja2 import Environment, FileSystemLoader
-from datetime import datetime
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pdf_pipeline import dates
+from pdf_pipeline.cover_letter import CoverLetterKind, template_environment as cover_letter_environment
+from pdf_pipeline.cover_letter import payload_limits as cover_letter_payload_limits
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.formats import FormatStore
+from pdf_pipeline.payload import PayloadLimits
+from pdf_pipeline.resume import ResumeKind, template_environment
+from pdf_pipeline.service import ServiceRuntime
+from pdf_pipeline.startup import enable_bytecode_cache, firebase_client
+from pdf_pipeline.templates import TemplateRegistry
+
+startup.mark('imports')
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -14,293 +28,133 @@ app = Flask(__name__)
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize Firebase Admin SDK
-# The service will use Application Default Credentials in Cloud Run
-try:
-    initialize_app()
-except ValueError:
-    # App already initialized
-    pass
+# Metrics, Firestore, PDF cache, compile engine, previews and the common endpoints
+runtime = ServiceRuntime(app, 'resume-service', startup, firebase_client)
 
 # Jinja2 environment for LaTeX templates
-template_env = Environment(
-    loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')),
-    block_start_string='<%',
-    block_end_string='%>',
-    variable_start_string='<<',
-    variable_end_string='>>',
-    comment_start_string='<#',
-    comment_end_string='#>',
-    trim_blocks=True,
-    lstrip_blocks=True,
-    autoescape=False
-)
+templates_dir = os.path.join(os.path.dirname(__file__), 'templates')
+template_env = template_environment(templates_dir)
+# Compiled templates are cached on disk; the image ships the cache filled
+jinja_cache_dir = os.path.join(os.path.dirname(__file__), 'jinja-cache')
+enable_bytecode_cache(template_env, jinja_cache_dir)
 
-def escape_latex(text):
-    """Escape special LaTeX characters in text."""
-    if not isinstance(text, str):
-        return text
-    latex_special_chars = {
-        '&': r'\\&', '%': r'\\%', '$': r'\\$', '#': r'\\#',
-        '^': r'\\textasciicircum{}', '_': r'\\_', '{': r'\\{', '}': r'\\}',
-        '~': r'\\textasciitilde{}', '\\': r'\\textbackslash{}',
-    }
-    escaped_text = text
-    for char, escaped_char in latex_special_chars.items():
-        escaped_text = escaped_text.replace(char, escaped_char)
-    return escaped_text
-
-def sanitize_text_list(text, delimiter=','):
-    """Convert a delimited string to a list of escaped LaTeX strings."""
-    if not text:
-        return []
-    items = [item.strip() for item in text.split(delimiter) if item.strip()]
-    return [escape_latex(item) for item in items]
-
-def format_date(date_str):
-    """Format various date formats to a consistent format."""
-    if not date_str:
-        return ""
-    date_str = str(date_str)
-    
-    # Handle GMT format
-    if "GMT" in date_str:
-        try:
-            dt = datetime.strptime(date_str, "%a, %d %b %Y %H:%M:%S %Z")
-            return dt.strftime("%b %Y")
-        except:
-            pass
-    
-    # Handle ISO format with timezone
-    if ":" in date_str and ("-" in date_str or "+" in date_str):
-        try:
-            if "+" in date_str:
-                dt = datetime.fromisoformat(date_str.replace('+00:00', ''))
-            else:
-                dt = datetime.fromisoformat(date_str.split('+')[0])
-            return dt.strftime("%b %Y")
-        except:
-            pass
-    
-    # Handle 4-digit year
-    if date_str.isdigit() and len(date_str) == 4:
-        return date_str
-    
-    # Handle short date strings
-    if len(date_str) <= 8:
-        return date_str
-    
-    # Try to extract year and month
-    try:
-        year_match = re.search(r'20\d{2}', date_str)
-        if year_match:
-            year = year_match.group()
-            month_match = re.search(r'(\d{1,2})-(\d{1,2})', date_str)
-            if month_match:
-                month_num = int(month_match.group(2)) if '-' in date_str else int(month_match.group(1))
-                if 1 <= month_num <= 12:
-                    month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                                 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-                    return f"{month_names[month_num-1]} {year}"
-            return year
-    except:
-        pass
-    
-    return str(date_str)
+# Precompiled formats for the static template preambles
+format_store = FormatStore(
+    os.path.join(templates_dir, 'preambles'),
+    os.environ.get('TEX_FORMAT_DIR', os.path.join(os.path.dirname(__file__), 'formats'))
+)
 
-def clean_filename(filename):
-    """Clean filename for use in file system and headers."""
-    cleaned = re.sub(r'[<>:"/\\|?*]', '_', filename)
-    cleaned = re.sub(r'\s+', ' ', cleaned.strip())
-    if len(cleaned) > 50:
-        cleaned = cleaned[:50]
-    return cleaned or "resume"
+# Every template in templates/ and the fields it reads; resume_name is used for file names
+with startup.phase('templates'):
+    template_registry = TemplateRegistry.load(
+        template_env, templates_dir, format_store.names(), 'template1', always_read=('resume_name',)
+    )
 
-def validate_resume_data(data):
-    """Validate and format resume data."""
-    validated_data = {}
-    
-    # Basic info
-    validated_data['resume_name'] = escape_latex(data.get('resumeName', 'Resume'))
-    validated_data['fullName'] = escape_latex(data.get('fullName', 'Your Name'))
-    validated_data['phone'] = data.get('phone', '')
-    validated_data['email'] = data.get('email', '')
-    validated_data['website1'] = data.get('website1', '')
-    validated_data['website2'] = data.get('website2', '')
-    
-    # Work experience
-    work_experience = []
-    for exp in data.get('experienceList', []):
-        work_exp = {
-            'title': escape_latex(exp.get('title', '')),
-            'company': escape_latex(exp.get('company', '')),
-            'location': escape_latex(exp.get('location', '')),
-            'startDate': format_date(exp.get('startDate', '')),
-            'endDate': format_date(exp.get('endDate', '')),
-            'currentlyWorking': exp.get('currentlyWorking', False),
-            'bullets': [escape_latex(b) for b in exp.get('bullets', [])] if exp.get('bullets', []) else []
-        }
-        work_experience.append(work_exp)
-    validated_data['work_experience'] = work_experience
-    
-    # Education
-    education = []
-    for edu in data.get('educationList', []):
-        edu_item = {
-            'institution': escape_latex(edu.get('institution', '')),
-            'location': escape_latex(edu.get('location', '')),
-            'degree': escape_latex(edu.get('degree', '')),
-            'major': escape_latex(edu.get('major', '')),
-            'minor': escape_latex(edu.get('minor', '')),
-            'gpa': edu.get('gpa', ''),
-            'specialization': escape_latex(edu.get('specialization', '')),
-            'startDate': format_date(edu.get('startDate', '')),
-            'endDate': format_date(edu.get('endDate', '')),
-        }
-        education.append(edu_item)
-    validated_data['education'] = education
-    
-    # Projects
-    projects = []
-    for proj in data.get('projectList', []):
-        project = {
-            'title': escape_latex(proj.get('title', '')),
-            'stack': sanitize_text_list(proj.get('stack', '')),
-            'date': proj.get('date', ''),
-            'bullets': [escape_latex(b) for b in proj.get('bullets', [])] if proj.get('bullets', []) else []
-        }
-        projects.append(project)
-    validated_data['projects'] = projects
-    
-    # Skills
-    skills_data = data.get('skills', {})
-    skills = {
-        'languages': sanitize_text_list(skills_data.get('languages', '')),
-        'frameworks': sanitize_text_list(skills_data.get('frameworks', '')),
-        'tools': sanitize_text_list(skills_data.get('tools', '')),
-        'libraries': sanitize_text_list(skills_data.get('libraries', ''))
-    }
-    validated_data['skills'] = skills
-    
-    # Template
-    validated_data['template_id'] = data.get('templateName', data.get('templateId', 'template1')).lower()
-    
-    return validated_data
+# Resumes: fetch, validate, render, compile and deliver (see pdf_pipeline.pipeline)
+resume_kind = ResumeKind(template_env, template_registry, int(os.environ.get('RENDER_MEMO_MAX_ENTRIES', 4096)))
+resume_pipeline = runtime.pipeline(resume_kind, format_store, PayloadLimits.from_env())
+runtime.metrics.add_collector('render_memo', resume_kind.stats)
+runtime.metrics.add_collector('date_cache', dates.stats, gauges=('entries',))
 
-def get_resume_data(user_id, resume_id):
-    """Fetch resume data from Firestore."""
-    try:
-        db = firestore.client()
-        resume_ref = db.collection('users').document(user_id).collection('resumes').document(resume_id)
-        resume_doc = resume_ref.get()
-        if not resume_doc.exists:
-            return None
-        return resume_doc.to_dict()
-    except Exception as e:
-        logging.error(f"Error fetching resume data: {e}")
-        return None
+# Cover letter template for /generate-application. The image copies it from
+# cover-letter-service into cover-letter/; a source checkout uses it in place.
+cover_letter_dir = os.environ.get('COVER_LETTER_TEMPLATE_DIR', os.path.join(os.path.dirname(__file__), 'cover-letter'))
+if not os.path.isdir(cover_letter_dir):
+    cover_letter_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cover-letter-service')
+cover_letter_env = cover_letter_environment(cover_letter_dir)
+enable_bytecode_cache(cover_letter_env, jinja_cache_dir)
+cover_letter_format_store = FormatStore(
+    os.path.join(cover_letter_dir, 'preambles'),
+    os.environ.get('TEX_FORMAT_DIR', os.path.join(os.path.dirname(__file__), 'formats'))
+)
+cover_letter_pipeline = runtime.pipeline(
+    CoverLetterKind(cover_letter_env), cover_letter_format_store, cover_letter_payload_limits(),
+    metrics_prefix='cover_letter_payload'
+)
 
-def format_data_for_template(resume_data):
-    """Format resume data for template."""
-    try:
-        return validate_resume_data(resume_data)
-    except Exception as e:
-        logging.error(f"Error formatting data: {e}")
-        return None
+# Compiles the resume of an application while the request thread compiles the cover letter
+application_executor = ThreadPoolExecutor(thread_name_prefix='application-compile')
 
-def generate_latex(template_name, data):
-    """Generate LaTeX code from template and data."""
-    try:
-        template = template_env.get_template(f'{template_name}.tex')
-        return template.render(**data)
-    except Exception as e:
-        logging.error(f"Error generating LaTeX: {e}")
-        return None
+# POST /generate-resume, /generate-resume/batch and /preview-resume, and the /jobs API
+runtime.register_document_routes(resume_pipeline, '/generate-resume', '/preview-resume',
+                                 '/generate-resume/batch', 'resumes.zip')
+job_manager = runtime.register_jobs(resume_pipeline)
 
-def compile_latex_to_pdf(latex_code):
-    """Compile LaTeX code to PDF."""
-    try:
-        with tempfile.TemporaryDirectory() as temp_dir:
-            tex_file = os.path.join(temp_dir, 'resume.tex')
-            with open(tex_file, 'w', encoding='utf-8') as f:
-                f.write(latex_code)
-            
-            # Run pdflatex
-            cmd = ['pdflatex', '-interaction=nonstopmode', '-output-directory', temp_dir, tex_file]
-            result = subprocess.run(cmd, capture_output=True, text=True, cwd=temp_dir)
-            
-            pdf_file = os.path.join(temp_dir, 'resume.pdf')
-            if not os.path.exists(pdf_file):
-                logging.error(f"LaTeX compilation failed: {result.stderr}")
-                return None
-            
-            with open(pdf_file, 'rb') as f:
-                pdf_content = f.read()
-            return pdf_content
-    except Exception as e:
-        logging.error(f"Error compiling LaTeX: {e}")
-        return None
+@app.route('/generate-application', methods=['POST'])
+def generate_application():
+    """Generate a resume and a cover letter together, returned as one ZIP archive.
 
-@app.route('/generate-resume', methods=['POST'])
-def generate_resume():
-    """Generate resume PDF endpoint."""
+    Both documents are read in one batched Firestore call and compiled at the
+    same time, so the request takes about as long as the slower compile.
+    """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
         if not data:
             return jsonify({'error': 'No JSON data provided'}), 400
-            
+
         user_id = data.get('user_id')
         resume_id = data.get('resume_id')
-        
-        if not user_id or not resume_id:
-            return jsonify({'error': 'user_id and resume_id are required'}), 400
-        
-        # Fetch resume data
-        resume_data = get_resume_data(user_id, resume_id)
-        if not resume_data:
-            return jsonify({'error': 'Resume not found'}), 404
-        
-        # Format data for template
-        formatted_data = format_data_for_template(resume_data)
-        if not formatted_data:
-            return jsonify({'error': 'Failed to format resume data'}), 500
-        
-        # Select template
-        template_map = {
-            'template1': 'template1',
-            'template2': 'template2',
-            'template3': 'template3'
-        }
-        template_name = template_map.get(formatted_data['template_id'], 'template1')
-        
-        # Generate LaTeX
-        latex_code = generate_latex(template_name, formatted_data)
-        if not latex_code:
-            return jsonify({'error': 'Failed to generate LaTeX'}), 500
-        
-        # Compile to PDF
-        pdf_content = compile_latex_to_pdf(latex_code)
-        if not pdf_content:
-            return jsonify({'error': 'Failed to compile PDF'}), 500
-        
-        # Prepare response
-        resume_name = formatted_data.get('resume_name', 'Resume')
-        clean_name = clean_filename(resume_name)
-        
-        response = Response(
-            pdf_content,
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{clean_name}.pdf"',
-                'Content-Type': 'application/pdf'
-            }
-        )
+        cover_letter_id = data.get('cover_letter_id')
+
+        if not user_id or not resume_id or not cover_letter_id:
+            return jsonify({'error': 'user_id, resume_id and cover_letter_id are required'}), 400
+
+        resume_path = resume_pipeline.path(user_id, resume_id)
+        cover_letter_path = cover_letter_pipeline.path(user_id, cover_letter_id)
+        with runtime.metrics.stage('fetch'):
+            documents = runtime.document_store.get_many([resume_path, cover_letter_path])
+        if not documents[resume_path]:
+            raise GenerationError('Resume not found', 404)
+        if not documents[cover_letter_path]:
+            raise GenerationError('Cover letter not found', 404)
+
+        resume = resume_pipeline.prepare(documents[resume_path])
+        cover_letter = cover_letter_pipeline.prepare(documents[cover_letter_path])
+
+        # If the cover letter fails the resume still finishes and lands in the PDF cache for the retry
+        resume_future = application_executor.submit(resume_pipeline.compile, resume)
+        cover_letter_pdf = cover_letter_pipeline.compile(cover_letter)
+        resume_pdf = resume_future.result()
+
+        with runtime.metrics.stage('response'):
+            resume_name = resume_pipeline.filename(resume)
+            cover_letter_name = cover_letter_pipeline.filename(cover_letter)
+            if cover_letter_name == resume_name:
+                cover_letter_name = f'{cover_letter_name} - Cover Letter'
+            buffer = io.BytesIO()
+            # PDFs are already compressed, so store them as-is
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+                archive.writestr(f'{resume_name}.pdf', resume_pdf)
+                archive.writestr(f'{cover_letter_name}.pdf', cover_letter_pdf)
+            response = Response(
+                buffer.getvalue(),
+                mimetype='application/zip',
+                headers={
+                    'Content-Disposition': 'attachment; filename="application.zip"',
+                    'X-Resume-Version': resume.version
+                }
+            )
         return response
-        
+
+    except GenerationError as e:
+        return jsonify(e.to_dict()), e.status, e.headers
     except Exception as e:
-        logging.error(f"Error generating resume: {e}")
+        logging.error(f"Error generating application: {e}")
         return jsonify({'error': 'Internal server error'}), 500
 
+@app.route('/templates', methods=['GET'])
+def list_templates():
+    """Available templates with the fields each reads and only tests."""
+    return jsonify({'default': template_registry.default, 'templates': template_registry.describe()})
+
+@app.route('/render-stats', methods=['GET'])
+def render_stats():
+    """Section memo hit/miss counters."""
+    return jsonify(resume_kind.stats())
+
+# Load every template and compile each resume template once before serving
+runtime.ready([resume_pipeline, cover_letter_pipeline], warm=[resume_pipeline])
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,32 @@
+"""Shared test setup.
+
+Tests import ``pdf_pipeline`` from the checkout and reuse the documents in
+``benchmarks/fixtures.py``. Golden files live in tests/golden; run with
+UPDATE_GOLDEN=1 to rewrite them after an intended output change, and review
+the diff.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+
+
+@pytest.fixture
+def golden():
+    """Compare a value with a golden file (JSON for dicts and lists, text otherwise)."""
+    def check(name, value):
+        path = os.path.join(GOLDEN_DIR, name)
+        text = value if isinstance(value, str) else json.dumps(value, indent=2, sort_keys=True, ensure_ascii=False) + '\n'
+        if os.environ.get('UPDATE_GOLDEN'):
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        with open(path, encoding='utf-8') as f:
+            assert text == f.read(), f'{name} differs from the golden file (UPDATE_GOLDEN=1 rewrites it)'
+    return check
@@ -0,0 +1,105 @@
+"""PdfCache: memory LRU by entries and bytes, the disk tier and cache keys."""
+import os
+import time
+
+import pytest
+
+from pdf_pipeline.cache import PdfCache, cache_key
+
+
+def test_least_recently_used_entries_go_first():
+    cache = PdfCache(max_entries=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.put('c', b'3')
+    assert cache.get('b') is None
+    assert cache.get('a') == b'1' and cache.get('c') == b'3'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_budget():
+    cache = PdfCache(max_entries=100, max_memory_bytes=10)
+    cache.put('a', b'x' * 4)
+    cache.put('b', b'x' * 4)
+    cache.put('c', b'x' * 4)
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['memory_bytes'] == 8
+    assert cache.get('a') is None
+    # Entries bigger than the whole budget are not kept in memory
+    cache.put('big', b'x' * 11)
+    assert cache.get('big') is None
+    assert cache.stats()['memory_bytes'] == 8
+
+
+def test_replacing_an_entry_updates_the_size():
+    cache = PdfCache()
+    cache.put('a', b'x' * 10)
+    cache.put('a', b'x' * 3)
+    assert cache.stats()['memory_bytes'] == 3
+    assert cache.get('a') == b'xxx'
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    PdfCache(disk_dir=str(tmp_path)).put('key', b'%PDF-1.5')
+    cache = PdfCache(disk_dir=str(tmp_path))
+    assert cache.get('key') == b'%PDF-1.5'
+    assert cache.get('key') == b'%PDF-1.5'
+    stats = cache.stats()
+    assert (stats['disk_hits'], stats['hits'], stats['misses']) == (1, 1, 0)
+    assert os.listdir(tmp_path) == ['key.pdf']
+
+
+def test_disk_tier_evicts_least_recently_used_files(tmp_path):
+    cache = PdfCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=25)
+    for i, key in enumerate(('a', 'b')):
+        cache.put(key, b'x' * 10)
+        os.utime(tmp_path / f'{key}.pdf', (time.time() - 100 + i, time.time() - 100 + i))
+    # Reading a refreshes its modification time, so b is the oldest
+    assert cache.get('a') == b'x' * 10
+    cache.put('c', b'x' * 10)
+    assert sorted(os.listdir(tmp_path)) == ['a.pdf', 'c.pdf']
+
+
+def test_shared_disk_tier_is_not_listed_touched_or_evicted(monkeypatch, tmp_path):
+    cache = PdfCache(max_entries=1, disk_dir=str(tmp_path), max_disk_bytes=15, shared_disk=True)
+    monkeypatch.setattr(os, 'scandir', lambda path: pytest.fail('listed the shared directory'))
+    monkeypatch.setattr(os, 'utime', lambda path, *args: pytest.fail('touched a shared file'))
+    monkeypatch.setattr(os, 'replace', lambda src, dst: pytest.fail('renamed a shared file'))
+    cache.put('a', b'x' * 10)
+    cache.put('b', b'x' * 10)
+    # Both outlive the memory tier and the disk budget; a bucket lifecycle rule expires them
+    assert PdfCache(disk_dir=str(tmp_path), shared_disk=True).get('a') == b'x' * 10
+    assert sorted(os.listdir(tmp_path)) == ['a.pdf', 'b.pdf']
+
+
+def test_misses_are_counted():
+    cache = PdfCache()
+    assert cache.get('missing') is None
+    assert cache.stats()['misses'] == 1
+
+
+def test_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('PREVIEW_CACHE_MAX_ENTRIES', '7')
+    monkeypatch.setenv('PREVIEW_CACHE_MAX_MEMORY_MB', '2')
+    monkeypatch.setenv('PREVIEW_CACHE_DIR', str(tmp_path / 'previews'))
+    cache = PdfCache.from_env('PREVIEW_CACHE')
+    assert (cache.max_entries, cache.max_memory_bytes) == (7, 2 * 1024 * 1024)
+    assert not cache.shared_disk
+    assert os.path.isdir(tmp_path / 'previews')
+
+
+def test_from_env_shared_disk(monkeypatch, tmp_path):
+    monkeypatch.setenv('PRERENDER_CACHE_DIR', str(tmp_path))
+    monkeypatch.setenv('PRERENDER_CACHE_DISK_SHARED', '1')
+    assert PdfCache.from_env('PRERENDER_CACHE').shared_disk
+
+
+def test_cache_key_covers_template_preamble_and_source():
+    key = cache_key('\\begin{document}x\\end{document}', 'template1', 'abc')
+    assert key == cache_key('\\begin{document}x\\end{document}', 'template1', 'abc')
+    assert key != cache_key('\\begin{document}y\\end{document}', 'template1', 'abc')
+    assert key != cache_key('\\begin{document}x\\end{document}', 'template2', 'abc')
+    assert key != cache_key('\\begin{document}x\\end{document}', 'template1', 'abd')
+    # Parts are separated, so moving text between them changes the key
+    assert cache_key('b', 'a') != cache_key('', 'ab')
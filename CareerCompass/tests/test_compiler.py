@@ -0,0 +1,118 @@
+"""CompileDriver: rerun detection, .aux reuse and log parsing, with a stand-in for pdflatex."""
+import os
+
+import pytest
+
+from pdf_pipeline.compiler import CompileDriver, Diagnostic, parse_log
+
+JOB = 'doc'
+
+
+class FakeLatex:
+    """One pdflatex pass: the PDF shows the .aux/.out it read and a rerun is asked for when the labels change.
+
+    Like hyperref, a changed .out (bookmarks) doesn't ask for a rerun.
+    """
+
+    def __init__(self, directory, labels, bookmarks=''):
+        self.directory = directory
+        self.labels = labels.encode()
+        self.bookmarks = bookmarks.encode()
+        self.passes = 0
+
+    def read(self, ext):
+        path = os.path.join(self.directory, f'{JOB}.{ext}')
+        if not os.path.exists(path):
+            return b''
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def write(self, ext, content):
+        with open(os.path.join(self.directory, f'{JOB}.{ext}'), 'wb') as f:
+            f.write(content)
+
+    def __call__(self, pass_number):
+        self.passes += 1
+        aux, out = self.read('aux'), self.read('out')
+        self.write('pdf', b'%PDF refs=' + aux + b' outline=' + out)
+        self.write('aux', self.labels)
+        if self.bookmarks:
+            self.write('out', self.bookmarks)
+        self.write('log', b'LaTeX Warning: Label(s) may have changed.' if aux != self.labels else b'')
+        return True
+
+
+def compile_in(tmp_path, driver, name, source, labels, bookmarks=''):
+    """Compile in a fresh directory, like a new workspace."""
+    directory = tmp_path / name
+    directory.mkdir()
+    latex = FakeLatex(str(directory), labels, bookmarks)
+    result = driver.run(str(directory), JOB, source, [], latex)
+    return result, latex.passes
+
+
+def test_cross_references_rerun_until_settled(tmp_path):
+    result, passes = compile_in(tmp_path, CompileDriver(), 'a', 'source', 'labels-a')
+    assert passes == 2
+    assert result.pdf == b'%PDF refs=labels-a outline='
+
+
+def test_repeat_of_the_same_source_finishes_in_one_pass_with_the_same_bytes(tmp_path):
+    driver = CompileDriver()
+    first, _ = compile_in(tmp_path, driver, 'a', 'source', 'labels-a')
+    again, passes = compile_in(tmp_path, driver, 'b', 'source', 'labels-a')
+    assert passes == 1
+    assert again.pdf == first.pdf
+    assert driver.stats()['aux_hits'] == 1
+
+
+def test_documents_never_share_aux_files(tmp_path):
+    driver = CompileDriver()
+    compile_in(tmp_path, driver, 'a', 'first user', 'labels-a', 'bookmarks-a')
+    result, passes = compile_in(tmp_path, driver, 'b', 'second user', 'labels-b')
+    assert b'labels-a' not in result.pdf and b'bookmarks-a' not in result.pdf
+    assert driver.stats()['aux_hits'] == 0
+
+
+def test_output_does_not_depend_on_compile_history(tmp_path):
+    driver = CompileDriver()
+    # No labels, so one pass; the outline it writes would need a rerun, which is ignored
+    first, passes = compile_in(tmp_path, driver, 'a', 'source', '', 'bookmarks-a')
+    assert passes == 1
+    again, _ = compile_in(tmp_path, driver, 'b', 'source', '', 'bookmarks-a')
+    assert again.pdf == first.pdf
+
+
+def test_unsettled_references_stop_at_max_passes(tmp_path):
+    driver = CompileDriver(max_passes=2)
+    directory = tmp_path / 'a'
+    directory.mkdir()
+    calls = []
+
+    def never_settles(pass_number):
+        calls.append(pass_number)
+        FakeLatex(str(directory), f'labels-{pass_number}')(pass_number)
+        return True
+
+    result = driver.run(str(directory), JOB, 'source', [], never_settles)
+    assert calls == [1, 2]
+    assert result.pdf is not None
+    assert driver.stats()['unsettled'] == 1
+    assert driver.stats()['aux_entries'] == 0
+
+
+def test_timed_out_pass(tmp_path):
+    result = CompileDriver().run(str(tmp_path), JOB, 'source', [], lambda pass_number: False)
+    assert result.timed_out and result.pdf is None
+
+
+@pytest.mark.parametrize('log, errors, rerun', [
+    ('', [], False),
+    ('LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.', [], True),
+    ('Package rerunfilecheck Warning: File `doc.out\' has changed.', [], False),
+    ('! Undefined control sequence.\nl.12 Built \\badmacro\n', [Diagnostic('Undefined control sequence.', 12,
+                                                                          'Built \\badmacro')], False),
+    ('! Emergency stop.\n<*> doc.tex\n', [Diagnostic('Emergency stop.')], False),
+])
+def test_parse_log(log, errors, rerun):
+    assert parse_log(log) == (errors, rerun)
@@ -0,0 +1,77 @@
+"""format_date against the implementation the resume service used before it (bench_dates.legacy_format_date)."""
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from bench_dates import legacy_format_date, random_date_string, random_datetime
+from pdf_pipeline.dates import format_date, format_dates
+
+EXAMPLES = [
+    # Open-ended entries and short free text
+    'Present', 'present', 'Current', 'Now', 'n/a', 'Ongoing', 'Summer term', 'Fall 2023', 'Expected 2025',
+    # Month names
+    'May 2023', 'Sep 2019', 'September 2019', 'Jan 2020', 'January 2020', 'Sept. 2021',
+    # Numeric forms
+    '2023', '06/2023', '6/2023', '2023-06', '2023-6', '2023-06-15', '2023-13-01', '06/15/2023', '15.06.2023',
+    '2023/06/15', '2023-00-10', '1999-05-01', '20230615',
+    # ISO 8601 with a time, GMT and offsets
+    '2023-06-15T10:30:00', '2023-06-15T10:30:00+00:00', '2023-06-15T10:30:00.123456+00:00',
+    '2023-06-15T10:30:00+05:30', '2023-06-15T10:30:00Z', '2023-06-15 10:30:00',
+    'Thu, 15 Jun 2023 10:30:00 GMT', 'Thu, 15 Jun 2023 GMT', 'Mon, 01 Jan 2024 00:00:00 GMT',
+    # Junk
+    '', ' ', '-', ':', '+', '12:30', '--::', 'T', 'GMT', 'abc-def:ghi', '2023-xx-yy 12:00', '99-99-2099 GMT',
+    'not a date at all', 'ünïcödé 2023', '2023 2024', '2019-2023', '::::2050::::', '0' * 40,
+]
+
+
+@pytest.mark.parametrize('text', EXAMPLES)
+def test_examples_match_the_previous_implementation(text):
+    assert format_date(text) == legacy_format_date(text)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_generated_strings_match_the_previous_implementation(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        text = random_date_string(rng)
+        assert format_date(text) == legacy_format_date(text), text
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_formatting_is_idempotent(seed):
+    rng = random.Random(seed)
+    for text in EXAMPLES + [random_date_string(rng) for _ in range(500)]:
+        formatted = format_date(text)
+        assert format_date(formatted) == formatted, text
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_native_values_match_their_string_form(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        value = random_datetime(rng)
+        for native in (value, value.replace(tzinfo=timezone.utc), value.replace(tzinfo=timezone(timedelta(hours=-5))),
+                       value.date()):
+            assert format_date(native) == legacy_format_date(native), repr(native)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (datetime(2023, 6, 15), 'Jun 2023'),
+    (date(2019, 9, 1), 'Sep 2019'),
+    (None, ''),
+    ('', ''),
+    (0, ''),
+    (2023, '2023'),
+])
+def test_values(value, expected):
+    assert format_date(value) == expected
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_format_dates_matches_format_date(seed):
+    rng = random.Random(seed)
+    values = EXAMPLES + [random_date_string(rng) for _ in range(200)] + [random_datetime(rng) for _ in range(20)]
+    values += [None, '', 2023, date(2020, 2, 29)] + values[:50]
+    rng.shuffle(values)
+    assert format_dates(values) == [format_date(value) for value in values]
@@ -0,0 +1,173 @@
+"""PdfDelivery: validators, byte ranges and compression of download responses; PdfOptimizer's qpdf run."""
+import gzip
+import os
+import subprocess
+
+import pytest
+from flask import Flask
+
+from pdf_pipeline import delivery as delivery_module
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.delivery import PdfDelivery, PdfOptimizer
+from pdf_pipeline.workspace import WorkspacePool
+
+# Compressible, like the fonts and metadata of a real PDF
+PDF = b'%PDF-1.5\n' + b''.join(b'%d 0 obj << /Type /Font /BaseFont /CMR10 >> endobj\n' % i for i in range(200))
+
+
+@pytest.fixture
+def delivery():
+    return PdfDelivery(PdfCache())
+
+
+@pytest.fixture
+def client(delivery):
+    app = Flask(__name__)
+
+    @app.route('/pdf', methods=['GET', 'POST'])
+    def pdf():
+        return delivery.respond(PDF, 'resume.pdf', {'X-Resume-Version': 'v1'})
+
+    return app.test_client()
+
+
+def etag():
+    return f'"{PdfDelivery.etag(PDF)}"'
+
+
+def test_full_response(client):
+    response = client.get('/pdf')
+    assert response.status_code == 200
+    assert response.data == PDF
+    assert response.headers['ETag'] == etag()
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.headers['Content-Disposition'] == 'attachment; filename="resume.pdf"'
+    assert response.headers['X-Resume-Version'] == 'v1'
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_etag_depends_only_on_the_bytes():
+    assert PdfDelivery.etag(PDF) == PdfDelivery.etag(bytes(PDF))
+    assert PdfDelivery.etag(PDF) != PdfDelivery.etag(PDF + b'\n')
+
+
+@pytest.mark.parametrize('method', ['get', 'post'])
+def test_matching_if_none_match_is_a_304(client, method):
+    response = getattr(client, method)('/pdf', headers={'If-None-Match': etag()})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag()
+
+
+def test_etag_of_a_compressed_variant_matches_too(client):
+    compressed = client.get('/pdf', headers={'Accept-Encoding': 'gzip'})
+    response = client.get('/pdf', headers={'If-None-Match': compressed.headers['ETag']})
+    assert response.status_code == 304
+
+
+def test_other_etags_get_the_document(client):
+    response = client.get('/pdf', headers={'If-None-Match': '"0123"'})
+    assert response.status_code == 200
+    assert response.data == PDF
+
+
+@pytest.mark.parametrize('header, start, stop', [
+    ('bytes=0-99', 0, 100),
+    ('bytes=100-', 100, len(PDF)),
+    ('bytes=-50', len(PDF) - 50, len(PDF)),
+    ('bytes=0-999999', 0, len(PDF)),
+])
+def test_range_is_a_206(client, header, start, stop):
+    response = client.get('/pdf', headers={'Range': header, 'Accept-Encoding': 'gzip'})
+    assert response.status_code == 206
+    assert response.data == PDF[start:stop]
+    assert response.headers['Content-Range'] == f'bytes {start}-{stop - 1}/{len(PDF)}'
+    # Ranges are of the identity encoding
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_range_past_the_end_is_a_416(client):
+    response = client.get('/pdf', headers={'Range': f'bytes={len(PDF)}-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(PDF)}'
+
+
+def test_if_range_with_the_current_etag_is_honoured(client):
+    response = client.get('/pdf', headers={'Range': 'bytes=0-9', 'If-Range': etag()})
+    assert response.status_code == 206
+    assert response.data == PDF[:10]
+
+
+@pytest.mark.parametrize('if_range', ['"stale"', 'Wed, 21 Oct 2015 07:28:00 GMT'])
+def test_stale_if_range_gets_the_whole_document(client, if_range):
+    response = client.get('/pdf', headers={'Range': 'bytes=0-9', 'If-Range': if_range})
+    assert response.status_code == 200
+    assert response.data == PDF
+
+
+def test_multiple_ranges_get_the_whole_document(client):
+    response = client.get('/pdf', headers={'Range': 'bytes=0-9,20-29'})
+    assert response.status_code == 200
+    assert response.data == PDF
+
+
+def test_post_ignores_range(client):
+    response = client.post('/pdf', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 200
+    assert response.data == PDF
+
+
+def test_gzip_when_accepted(client, delivery):
+    response = client.get('/pdf', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == f'"{PdfDelivery.etag(PDF)}-gzip"'
+    assert response.headers['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(response.data) == PDF
+    # The compressed variant is cached and byte-identical
+    assert client.get('/pdf', headers={'Accept-Encoding': 'gzip'}).data == response.data
+    assert delivery.cache.stats()['hits'] == 1
+
+
+def test_gzip_not_accepted(client):
+    response = client.get('/pdf', headers={'Accept-Encoding': 'gzip;q=0, identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == PDF
+
+
+def test_incompressible_pdfs_are_sent_as_is():
+    delivery = PdfDelivery(PdfCache(), min_saving=0.99)
+    app = Flask(__name__)
+    app.add_url_rule('/pdf', 'pdf', lambda: delivery.respond(PDF, 'resume.pdf'))
+    response = app.test_client().get('/pdf', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == PDF
+    assert delivery.cache.get(f'{PdfDelivery.etag(PDF)}-gzip') == b''
+
+
+def test_stats(client, delivery):
+    client.get('/pdf')
+    client.get('/pdf', headers={'If-None-Match': etag()})
+    client.get('/pdf', headers={'Range': 'bytes=0-9'})
+    client.get('/pdf', headers={'Range': f'bytes={len(PDF)}-'})
+    stats = delivery.stats()
+    assert (stats['responses'], stats['not_modified'], stats['partial'], stats['unsatisfiable']) == (4, 1, 1, 1)
+    assert stats['bytes_sent'] == len(PDF) + 10
+
+
+def test_optimizer_keeps_the_output_reproducible(monkeypatch, tmp_path):
+    commands = []
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        with open(cmd[-1], 'wb') as f:
+            f.write(PDF[:100])
+        return subprocess.CompletedProcess(cmd, 0, b'', b'')
+
+    monkeypatch.setattr(delivery_module.shutil, 'which', lambda name: f'/usr/bin/{name}')
+    monkeypatch.setattr(delivery_module.subprocess, 'run', run)
+    optimizer = PdfOptimizer(WorkspacePool(root=str(tmp_path)))
+    assert optimizer.optimize(PDF) == PDF[:100]
+    # qpdf would otherwise write a random /ID into every file
+    assert '--deterministic-id' in commands[0]
+    assert os.path.basename(commands[0][-2]) == 'input.pdf'
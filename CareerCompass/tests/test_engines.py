@@ -0,0 +1,76 @@
+"""Compile engines: TEX_ENGINE selection and the one-process-per-pass engine."""
+import os
+
+import pytest
+
+from pdf_pipeline.compiler import CompileDriver
+from pdf_pipeline.engines import PdflatexEngine, engine_from_env
+from pdf_pipeline.sandbox import TexSandbox
+from pdf_pipeline.workers import TexWorkerPool
+from pdf_pipeline.workspace import WorkspacePool
+
+
+class Sandbox:
+    """Writes a PDF from the .tex file pdflatex was given, or fails."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.runs = []
+
+    def run(self, args, cwd, env, timeout=None):
+        self.runs.append((list(args), cwd, env))
+        if self.fail:
+            raise OSError('pdflatex not found')
+        with open(args[-1], encoding='utf-8') as f:
+            source = f.read()
+        with open(os.path.join(cwd, 'document.pdf'), 'wb') as pdf:
+            pdf.write(f'%PDF {source}'.encode())
+        open(os.path.join(cwd, 'document.log'), 'w').close()
+        return True
+
+
+@pytest.fixture
+def workspaces(tmp_path):
+    return WorkspacePool(1, str(tmp_path))
+
+
+def test_pdflatex_engine_compiles_in_a_workspace(workspaces):
+    sandbox = Sandbox()
+    result = PdflatexEngine(CompileDriver(), sandbox, workspaces).compile('source', ['-fmt=plain'], {'A': '1'})
+    assert result.pdf == b'%PDF source'
+    assert result.passes == 1
+    (args, cwd, env), = sandbox.runs
+    assert args == ['-fmt=plain', '-interaction=nonstopmode', '-output-directory', cwd,
+                    os.path.join(cwd, 'document.tex')]
+    assert env == {'A': '1'}
+    assert workspaces.stats()['free'] == 1
+
+
+def test_pdflatex_engine_reports_failures_as_no_pdf(workspaces):
+    result = PdflatexEngine(CompileDriver(), Sandbox(fail=True), workspaces).compile('source')
+    assert result.pdf is None
+    assert workspaces.stats()['free'] == 1
+
+
+@pytest.mark.parametrize('environ, engine_type', [
+    ({}, TexWorkerPool),
+    ({'TEX_ENGINE': 'warm', 'TEX_POOL_SIZE': '2'}, TexWorkerPool),
+    # The warm pool turned off falls back to a process per pass
+    ({'TEX_POOL_SIZE': '0'}, PdflatexEngine),
+    ({'TEX_ENGINE': 'pdflatex'}, PdflatexEngine),
+])
+def test_engine_from_env(monkeypatch, workspaces, environ, engine_type):
+    monkeypatch.delenv('TEX_ENGINE', raising=False)
+    monkeypatch.delenv('TEX_POOL_SIZE', raising=False)
+    for name, value in environ.items():
+        monkeypatch.setenv(name, value)
+    driver, sandbox = CompileDriver(), TexSandbox()
+    engine = engine_from_env(driver, sandbox, workspaces)
+    assert isinstance(engine, engine_type)
+    assert engine.driver is driver and engine.sandbox is sandbox
+
+
+def test_unknown_engine_is_an_error(monkeypatch, workspaces):
+    monkeypatch.setenv('TEX_ENGINE', 'lualatex')
+    with pytest.raises(ValueError, match='warm, pdflatex'):
+        engine_from_env(CompileDriver(), TexSandbox(), workspaces)
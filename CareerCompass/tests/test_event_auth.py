@@ -0,0 +1,120 @@
+"""EventAuthenticator: only the trigger's Google-signed token gets a document event through."""
+import datetime
+import time
+
+import pytest
+
+pytest.importorskip('cryptography')
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.event_auth import EventAuthenticator
+
+INVOKER = 'resume-service-events@project.iam.gserviceaccount.com'
+HOST = 'resume-service-abc-uc.a.run.app'
+
+
+def make_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'test')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(1).not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                            serialization.NoEncryption())
+    return crypt.RSASigner.from_string(pem, key_id='k1'), cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+@pytest.fixture(scope='module')
+def key():
+    return make_key()
+
+
+def token(signer, **claims):
+    now = int(time.time())
+    payload = {'iss': 'https://accounts.google.com', 'aud': f'https://{HOST}', 'email': INVOKER,
+               'email_verified': True, 'iat': now, 'exp': now + 300, **claims}
+    return f"Bearer {jwt.encode(signer, payload).decode()}"
+
+
+@pytest.fixture
+def auth(key, monkeypatch):
+    auth = EventAuthenticator(invoker=INVOKER)
+    monkeypatch.setattr(auth, 'certs', lambda: {'k1': key[1]})
+    return auth
+
+
+def status(auth, authorization, host=HOST):
+    try:
+        auth.verify(authorization, host)
+    except GenerationError as e:
+        return e.status
+    return 200
+
+
+def test_the_triggers_token_is_accepted(auth, key):
+    assert status(auth, token(key[0])) == 200
+    assert auth.stats()['accepted'] == 1
+
+
+@pytest.mark.parametrize('authorization', [None, '', 'Bearer ', 'Basic dXNlcjpwYXNz', 'Bearer not-a-jwt'])
+def test_requests_without_a_valid_token_are_a_401(auth, authorization):
+    assert status(auth, authorization) == 401
+    assert auth.stats()['unauthenticated'] == 1
+
+
+@pytest.mark.parametrize('claims, expected', [
+    ({'aud': 'https://other-service.a.run.app'}, 401),
+    ({'exp': int(time.time()) - 3600, 'iat': int(time.time()) - 7200}, 401),
+    ({'iss': 'https://evil.example.com'}, 401),
+    ({'email': 'someone@example.com'}, 403),
+    ({'email_verified': False}, 403),
+])
+def test_other_tokens_are_rejected(auth, key, claims, expected):
+    assert status(auth, token(key[0], **claims)) == expected
+
+
+def test_tokens_signed_with_another_key_are_a_401(auth):
+    assert status(auth, token(make_key()[0])) == 401
+
+
+def test_configured_audience_replaces_the_host(auth, key):
+    auth.audience = 'https://documents.example.com'
+    assert status(auth, token(key[0])) == 401
+    assert status(auth, token(key[0], aud='https://documents.example.com'), host='anything') == 200
+
+
+def test_without_an_invoker_every_event_is_refused(key):
+    auth = EventAuthenticator()
+    assert status(auth, token(key[0])) == 403
+
+
+def test_unreachable_certificates_are_a_503(auth, key, monkeypatch):
+    def fail():
+        raise OSError('connection refused')
+    monkeypatch.setattr(auth, 'certs', fail)
+    assert status(auth, token(key[0])) == 503
+
+
+def test_check_can_be_turned_off(monkeypatch):
+    monkeypatch.setenv('PRERENDER_EVENT_AUTH', '0')
+    assert status(EventAuthenticator.from_env(), None) == 200
+
+
+def test_certificates_are_fetched_once(monkeypatch):
+    fetches = []
+
+    class Response:
+        status = 200
+        data = b'{"k1": "cert"}'
+
+    monkeypatch.setattr('pdf_pipeline.event_auth.AuthRequest',
+                        lambda: lambda url, method: fetches.append(url) or Response())
+    auth = EventAuthenticator(invoker=INVOKER)
+    assert auth.certs() == auth.certs() == {'k1': 'cert'}
+    assert len(fetches) == 1
@@ -0,0 +1,211 @@
+"""DocumentStore: fresh reads, the listener-backed cache and listener cleanup."""
+import time
+
+from pdf_pipeline.firestore_store import DocumentStore
+
+PATH = 'users/u/resumes/a'
+
+
+class Snapshot:
+    def __init__(self, path, data, update_time):
+        self.reference = type('Reference', (), {'path': path})()
+        self.exists = data is not None
+        self.update_time = update_time
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Watch:
+    def __init__(self):
+        self.unsubscribed = False
+
+    def unsubscribe(self):
+        self.unsubscribed = True
+
+
+class Client:
+    """Documents by path with update times, counting full and metadata reads."""
+
+    def __init__(self):
+        self.documents = {}
+        self.reads = []
+        self.watches = {}
+        self.all_watches = []
+        self.callbacks = {}
+        # Called with the path when a listener is attached, before on_snapshot returns
+        self.on_attach = None
+
+    def put(self, path, data):
+        _, version = self.documents.get(path, (None, 0))
+        self.documents[path] = (data, version + 1)
+
+    def snapshot(self, path):
+        data, version = self.documents.get(path, (None, 0))
+        return Snapshot(path, data, version)
+
+    def document(self, path):
+        client = self
+
+        class Reference:
+            def get(self, field_paths=None):
+                client.reads.append((path, 'metadata' if field_paths == [] else 'full'))
+                return client.snapshot(path)
+
+            def on_snapshot(self, callback):
+                client.callbacks[path] = callback
+                if client.on_attach:
+                    client.on_attach(path)
+                watch = client.watches[path] = Watch()
+                client.all_watches.append(watch)
+                return watch
+
+        return Reference()
+
+    def get_all(self, references):
+        raise AssertionError('not used')
+
+    def change(self, path, data):
+        self.put(path, data)
+        self.callbacks[path]([self.snapshot(path)], None, None)
+
+
+def make_store(client, **kwargs):
+    return DocumentStore(lambda: client, **kwargs)
+
+
+def test_edits_are_visible_on_the_next_get():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client)
+    assert store.get(PATH) == {'x': 1}
+    client.put(PATH, {'x': 2})
+    assert store.get(PATH) == {'x': 2}
+    assert client.reads == [(PATH, 'full'), (PATH, 'full')]
+    assert store.stats()['entries'] == 0
+
+
+def test_watched_entries_are_served_within_ttl():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, ttl=60, watch=True)
+    assert store.get(PATH) == {'x': 1}
+    assert store.get(PATH) == {'x': 1}
+    assert client.reads == [(PATH, 'full')]
+    assert store.stats()['hits'] == 1
+
+
+def test_watched_entries_are_read_again_after_ttl():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, ttl=0, watch=True)
+    store.get(PATH)
+    client.put(PATH, {'x': 2})
+    assert store.get(PATH) == {'x': 2}
+    assert client.reads == [(PATH, 'full'), (PATH, 'full')]
+
+
+def test_entries_without_a_listener_are_not_served():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, ttl=60, watch=True)
+
+    def fail(path):
+        raise RuntimeError('listeners unavailable')
+
+    client.on_attach = fail
+    store.get(PATH)
+    client.put(PATH, {'x': 2})
+    assert store.get(PATH) == {'x': 2}
+    assert store.stats()['hits'] == 0
+
+
+def test_missing_documents_are_not_cached():
+    client = Client()
+    store = make_store(client, watch=True)
+    assert store.get(PATH) is None
+    assert store.get(PATH) is None
+    assert store.stats()['not_found'] == 2
+
+
+def test_lru_eviction_stops_the_listener():
+    client = Client()
+    for name in 'abc':
+        client.put(f'users/u/resumes/{name}', {'name': name})
+    store = make_store(client, max_entries=2, watch=True)
+    for name in 'abc':
+        store.get(f'users/u/resumes/{name}')
+    assert store.stats()['entries'] == 2
+    assert client.watches['users/u/resumes/a'].unsubscribed
+    assert not client.watches['users/u/resumes/c'].unsubscribed
+
+
+def test_changes_invalidate_and_reach_listeners():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, ttl=60, watch=True)
+    seen = []
+    store.add_listener(seen.append)
+    store.get(PATH)
+    # The initial snapshot carries the cached version
+    client.callbacks[PATH]([client.snapshot(PATH)], None, None)
+    assert seen == [] and store.stats()['entries'] == 1
+    client.change(PATH, {'x': 2})
+    assert seen == [PATH]
+    assert store.stats()['entries'] == 0
+    assert client.watches[PATH].unsubscribed
+    assert store.get(PATH) == {'x': 2}
+
+
+def test_listener_of_an_entry_invalidated_while_attaching_is_stopped():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, watch=True)
+    # The document changes before on_snapshot returns
+    client.on_attach = lambda path: store.invalidate(path)
+    store.get(PATH)
+    assert store.stats()['entries'] == 0
+    assert client.watches[PATH].unsubscribed
+
+
+def test_listener_of_an_entry_replaced_while_attaching_is_stopped():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, ttl=60, watch=True)
+    first = []
+
+    def replace(path):
+        # A concurrent read stores a newer version before the first listener is attached
+        if not first:
+            first.append(path)
+            client.put(path, {'x': 2})
+            store.get(path)
+
+    client.on_attach = replace
+    store.get(PATH)
+    assert store.get(PATH) == {'x': 2}
+    # Only the listener of the entry that is cached stays subscribed
+    assert [watch.unsubscribed for watch in client.all_watches] == [False, True]
+    assert store._entries[PATH].watch is client.all_watches[0]
+
+
+def test_edit_is_visible_once_the_listener_reports_it():
+    client = Client()
+    client.put(PATH, {'x': 1})
+    store = make_store(client, ttl=60, watch=True)
+    store.get(PATH)
+    client.change(PATH, {'x': 2})
+    assert store.get(PATH) == {'x': 2}
+
+
+def test_listeners_are_capped_by_max_entries():
+    client = Client()
+    paths = [f'users/u/resumes/{i}' for i in range(10)]
+    for path in paths:
+        client.put(path, {'path': path})
+    store = make_store(client, max_entries=3, watch=True)
+    for path in paths:
+        store.get(path)
+    assert sum(not watch.unsubscribed for watch in client.all_watches) == 3
+    assert store.stats()['entries'] == 3
@@ -0,0 +1,151 @@
+"""escape_latex and the LaTeX the validators and templates produce from it."""
+import os
+import random
+
+import pytest
+
+import fixtures
+from pdf_pipeline import cover_letter
+from pdf_pipeline.latex import LATEX_SPECIAL_CHARS, escape_latex
+from pdf_pipeline.resume import RESUME_SECTIONS, ResumeKind, template_environment
+from pdf_pipeline.templates import TemplateRegistry
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+RESUME_TEMPLATES_DIR = os.path.join(ROOT, 'resume-service', 'templates')
+COVER_LETTER_DIR = os.path.join(ROOT, 'cover-letter-service')
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('&', r'\&'),
+    ('%', r'\%'),
+    ('$', r'\$'),
+    ('#', r'\#'),
+    ('_', r'\_'),
+    ('{', r'\{'),
+    ('}', r'\}'),
+    ('^', r'\textasciicircum{}'),
+    ('~', r'\textasciitilde{}'),
+    ('\\', r'\textbackslash{}'),
+    # Replacements that introduce braces or backslashes are not escaped again
+    ('{}', r'\{\}'),
+    ('\\{', r'\textbackslash{}\{'),
+    ('^~\\', r'\textasciicircum{}\textasciitilde{}\textbackslash{}'),
+    # Text that already looks escaped is escaped as typed
+    (r'\&', r'\textbackslash{}\&'),
+    (r'\textbackslash{}', r'\textbackslash{}textbackslash\{\}'),
+    ('R&D 100% {core} C# $5 a_b ~x ^y C:\\dir',
+     r'R\&D 100\% \{core\} C\# \$5 a\_b \textasciitilde{}x \textasciicircum{}y C:\textbackslash{}dir'),
+    # NUL is not valid TeX input; it is dropped from text that needs escaping
+    ('a\x00&b', r'a\&b'),
+    ('a\x00b', 'a\x00b'),
+])
+def test_special_characters(text, expected):
+    assert escape_latex(text) == expected
+
+
+@pytest.mark.parametrize('text', [
+    '', 'plain text', 'Zoë Müller-Łukasiewicz', 'Résumé — naïve café', '中文简历', 'Ελληνικά',
+    'emoji 🚀✨', 'non\u00a0breaking', 'tab\tand\nnewline', '"quotes" <angles> |pipes| @at! *star* ?',
+])
+def test_text_without_special_characters_is_returned_unchanged(text):
+    assert escape_latex(text) is text
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Zoë & Łukasz', r'Zoë \& Łukasz'),
+    ('中文 100%', r'中文 100\%'),
+    ('🚀_launch', r'🚀\_launch'),
+])
+def test_unicode_is_kept_around_escapes(text, expected):
+    assert escape_latex(text) == expected
+
+
+@pytest.mark.parametrize('value, expected', [(None, ''), (42, '42'), (3.5, '3.5'), (True, 'True')])
+def test_non_strings(value, expected):
+    assert escape_latex(value) == expected
+
+
+UNESCAPE = sorted(((escaped, char) for char, escaped in LATEX_SPECIAL_CHARS.items()), key=lambda item: -len(item[0]))
+
+
+def unescape(text):
+    """Invert escape_latex by reading the text left to right."""
+    out, i = [], 0
+    while i < len(text):
+        for escaped, char in UNESCAPE:
+            if text.startswith(escaped, i):
+                out.append(char)
+                i += len(escaped)
+                break
+        else:
+            assert text[i] not in LATEX_SPECIAL_CHARS, f'unescaped {text[i]!r} at {i} in {text!r}'
+            out.append(text[i])
+            i += 1
+    return ''.join(out)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_escaping_round_trips(seed):
+    rng = random.Random(seed)
+    alphabet = ''.join(LATEX_SPECIAL_CHARS) + 'abc xyz{}\\éß中🚀'
+    for _ in range(200):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(40)))
+        assert unescape(escape_latex(text)) == text
+
+
+def test_pathological_documents_are_fully_escaped():
+    """Every string field of the largest fixtures round-trips through escaping."""
+    data = fixtures.resume('pathological')
+    for entry in data['experienceList']:
+        for bullet in entry['bullets']:
+            assert unescape(escape_latex(bullet)) == bullet
+    body = fixtures.cover_letter('pathological')['body']
+    assert unescape(escape_latex(body)) == body
+
+
+def small_special_resume():
+    """The pathological resume's special characters in two entries per list, to keep the golden files short."""
+    data = fixtures.resume('pathological')
+    for key in ('experienceList', 'educationList', 'projectList'):
+        data[key] = data[key][:2]
+        for item in data[key]:
+            if 'bullets' in item:
+                item['bullets'] = item['bullets'][:3]
+    return data
+
+
+RESUMES = {'small': fixtures.resume('small'), 'typical': fixtures.resume('typical'), 'special': small_special_resume()}
+
+
+@pytest.fixture(scope='module')
+def resume_kind():
+    env = template_environment(RESUME_TEMPLATES_DIR)
+    preambles = [name[:-4] for name in os.listdir(os.path.join(RESUME_TEMPLATES_DIR, 'preambles'))]
+    registry = TemplateRegistry.load(env, RESUME_TEMPLATES_DIR, preambles, 'template1', always_read=('resume_name',))
+    return ResumeKind(env, registry)
+
+
+@pytest.mark.parametrize('size', sorted(RESUMES))
+@pytest.mark.parametrize('section', sorted(RESUME_SECTIONS))
+def test_resume_section_output(golden, section, size):
+    golden(f'resume_{section}_{size}.json', RESUME_SECTIONS[section].validate(RESUMES[size]))
+
+
+@pytest.mark.parametrize('size', sorted(RESUMES))
+@pytest.mark.parametrize('template_name', fixtures.RESUME_TEMPLATES)
+def test_resume_latex(golden, resume_kind, template_name, size):
+    data = dict(RESUMES[size], templateName=template_name)
+    golden(f'{template_name}_{size}.tex', resume_kind.render(resume_kind.validate(data)))
+
+
+@pytest.mark.parametrize('size', ['typical', 'special'])
+def test_cover_letter_output(golden, size):
+    data = fixtures.cover_letter('pathological' if size == 'special' else size)
+    if size == 'special':
+        data['body'] = '\n\n'.join(data['body'].split('\n\n')[:2])
+    kind = cover_letter.CoverLetterKind(cover_letter.template_environment(COVER_LETTER_DIR))
+    document = kind.validate(data)
+    # The letter is dated today
+    document.data['date'] = 'January 15, 2024'
+    golden(f'cover_letter_{size}.json', document.data)
+    golden(f'cover_letter_{size}.tex', kind.render(document))
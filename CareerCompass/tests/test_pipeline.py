@@ -0,0 +1,215 @@
+"""DocumentPipeline: each stage's errors, the PDF cache, artifact keys and delivery."""
+import threading
+import time
+
+import pytest
+from flask import Flask
+from jinja2 import DictLoader, Environment
+
+from pdf_pipeline.admission import AdmissionController
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.compiler import CompileResult, Diagnostic
+from pdf_pipeline.delivery import PdfDelivery, PdfOptimizer
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.formats import CompileSpec
+from pdf_pipeline.metrics import Metrics
+from pdf_pipeline.payload import PayloadLimits
+from pdf_pipeline.pipeline import DocumentKind, DocumentPipeline, ValidatedDocument, clean_filename
+from pdf_pipeline.singleflight import SingleFlight
+from pdf_pipeline.workspace import WorkspacePool
+
+
+class Kind(DocumentKind):
+    name = 'note'
+    title = 'Note'
+    collection = 'notes'
+    id_field = 'noteId'
+    version_header = 'X-Note-Version'
+    default_filename = 'note'
+
+    def __init__(self):
+        self.env = Environment(loader=DictLoader({'plain.tex': 'template v1'}))
+        self.rendered = 0
+
+    def templates(self):
+        return ['plain']
+
+    def validate(self, data):
+        if 'text' not in data:
+            raise ValueError('no text')
+        return ValidatedDocument('plain', data, data.get('version', data['text']))
+
+    def render(self, document):
+        self.rendered += 1
+        if document.data['text'] == 'unrenderable':
+            raise RuntimeError('template error')
+        return f"body {document.data['text']}"
+
+    def filename(self, data):
+        return data.get('title', '')
+
+
+class Formats:
+    def digest(self, name):
+        return f'format-{name}'
+
+    def prepare(self, name, body):
+        return CompileSpec(f'preamble {body}', [f'-fmt={name}'], None)
+
+
+class Store:
+    def __init__(self):
+        self.documents = {}
+        self.error = None
+
+    def get(self, path):
+        if self.error:
+            raise self.error
+        return self.documents.get(path)
+
+
+class Engine:
+    name = 'fake'
+
+    def __init__(self):
+        self.sources = []
+        self.result = None
+        self.delay = 0
+
+    def compile(self, source, args=None, env=None):
+        self.sources.append((source, args))
+        time.sleep(self.delay)
+        return self.result or CompileResult(f'%PDF {source}'.encode(), passes=1)
+
+
+@pytest.fixture
+def store():
+    return Store()
+
+
+@pytest.fixture
+def engine():
+    return Engine()
+
+
+@pytest.fixture
+def pipeline(store, engine, tmp_path):
+    return DocumentPipeline(Kind(), Formats(), store, PdfCache(), engine,
+                            PdfOptimizer(WorkspacePool(1, str(tmp_path)), enabled=False), PdfDelivery(PdfCache()),
+                            SingleFlight(), AdmissionController(cpus=2), PayloadLimits(max_total_chars=100),
+                            Metrics('test'))
+
+
+def test_build_compiles_the_rendered_latex_once(pipeline, engine):
+    assert pipeline.build({'text': 'hello', 'title': 'My note'}) == (b'%PDF preamble body hello', 'My note')
+    assert engine.sources == [('preamble body hello', ['-fmt=plain'])]
+    # The same LaTeX again comes from the PDF cache
+    assert pipeline.build({'text': 'hello'})[0] == b'%PDF preamble body hello'
+    assert len(engine.sources) == 1
+
+
+def test_concurrent_builds_of_the_same_document_share_one_compile(pipeline, engine):
+    engine.delay = 0.2
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(pipeline.build({'text': 'same'})[0]))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert results == [b'%PDF preamble body same'] * 4
+    assert len(engine.sources) == 1
+
+
+def test_fetch_reads_the_kinds_collection(pipeline, store):
+    store.documents['users/u/notes/n'] = {'text': 'stored'}
+    assert pipeline.build_by_id('u', 'n')[0] == b'%PDF preamble body stored'
+
+
+@pytest.mark.parametrize('error', [None, RuntimeError('unavailable')])
+def test_missing_or_unreadable_documents_are_a_404(pipeline, store, error):
+    store.error = error
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.fetch('u', 'missing')
+    assert (excinfo.value.status, excinfo.value.message) == (404, 'Note not found')
+
+
+def test_fetch_passes_generation_errors_through(pipeline, store):
+    store.error = GenerationError('Server is busy (reads), retry later', 503)
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.fetch('u', 'n')
+    assert excinfo.value.status == 503
+
+
+def test_oversized_documents_are_rejected_before_validation(pipeline):
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.validate({'text': 'x' * 200})
+    assert excinfo.value.status == 413
+
+
+def test_validation_failures_are_reported_without_details(pipeline):
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.validate({'title': 'no text'})
+    assert (excinfo.value.status, excinfo.value.message) == (500, 'Failed to format note data')
+
+
+def test_render_failures_are_reported_without_details(pipeline):
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.build({'text': 'unrenderable'})
+    assert excinfo.value.message == 'Failed to generate LaTeX'
+
+
+def test_latex_errors_are_a_422_with_diagnostics(pipeline, engine):
+    engine.result = CompileResult(None, passes=1, errors=(Diagnostic('Undefined control sequence', 1),))
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.build({'text': 'bad'})
+    assert excinfo.value.status == 422
+    assert excinfo.value.details['diagnostics'][0]['message'] == 'Undefined control sequence'
+    assert 'compile_failures_total{service="test"} 1' in pipeline.metrics.render()
+    # Failures aren't cached
+    engine.result = None
+    assert pipeline.build({'text': 'bad'})[0] == b'%PDF preamble body bad'
+
+
+def test_timed_out_compiles_are_a_503(pipeline, engine):
+    engine.result = CompileResult(None, timed_out=True)
+    with pytest.raises(GenerationError) as excinfo:
+        pipeline.build({'text': 'slow'})
+    assert excinfo.value.status == 503
+
+
+def test_artifact_key_is_known_before_rendering(pipeline):
+    document = pipeline.validate({'text': 'a', 'version': 'v1'})
+    key = pipeline.artifact_key(document)
+    assert pipeline.kind.rendered == 0
+    assert pipeline.artifact_key(pipeline.validate({'text': 'b', 'version': 'v1'})) == key
+    assert pipeline.artifact_key(pipeline.validate({'text': 'a', 'version': 'v2'})) != key
+
+
+def test_artifact_key_changes_with_the_template_source(store, engine, pipeline):
+    key = pipeline.artifact_key(pipeline.validate({'text': 'a'}))
+    kind = Kind()
+    kind.env.loader.mapping['plain.tex'] = 'template v2'
+    other = DocumentPipeline(kind, Formats(), store, PdfCache(), engine, pipeline.optimizer, pipeline.delivery,
+                             SingleFlight(), pipeline.admission, pipeline.limits, Metrics('test'))
+    assert other.artifact_key(other.validate({'text': 'a'})) != key
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('Jane Doe', 'Jane Doe'),
+    ('a/b:c', 'a_b_c'),
+    ('  spaced \t out  ', 'spaced out'),
+    ('', 'note'),
+    ('x' * 80, 'x' * 50),
+])
+def test_clean_filename(filename, expected):
+    assert clean_filename(filename, 'note') == expected
+
+
+def test_deliver_names_the_file_and_sends_the_version(pipeline):
+    document = pipeline.validate({'text': 'a', 'title': 'Q3/plan', 'version': 'v7'})
+    with Flask(__name__).test_request_context('/'):
+        response = pipeline.deliver(b'%PDF-1.5 content', document)
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == 'attachment; filename="Q3_plan.pdf"'
+    assert response.headers['X-Note-Version'] == 'v7'
@@ -0,0 +1,181 @@
+"""Prerenderer: rendering in the event request, debouncing bursts, and the background queue."""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.prerender import Prerenderer
+
+PATH = 'users/u/resumes/a'
+
+
+class Store:
+    def __init__(self):
+        self.documents = {}
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def invalidate(self, path):
+        pass
+
+    def get(self, path):
+        return self.documents.get(path)
+
+
+class Pipeline:
+    kind = SimpleNamespace(collection='resumes')
+
+    def __init__(self):
+        self.compiles = []
+        self.error = None
+
+    def validate(self, data):
+        if data.get('broken'):
+            raise GenerationError('Invalid resume', 400)
+        return SimpleNamespace(version=data['version'])
+
+    def artifact_key(self, document):
+        return f'key-{document.version}'
+
+    def render(self, document):
+        return document.version
+
+    def compile(self, latex):
+        if self.error:
+            raise self.error
+        self.compiles.append(latex)
+        return f'%PDF {latex}'.encode()
+
+
+@pytest.fixture
+def store():
+    return Store()
+
+
+@pytest.fixture
+def pipeline():
+    return Pipeline()
+
+
+def make(store, pipeline, **kwargs):
+    prerender = Prerenderer(store, PdfCache(), **{'debounce': 0.05, 'enabled': True, **kwargs})
+    prerender.register(pipeline)
+    return prerender
+
+
+def test_event_renders_in_the_request(store, pipeline):
+    prerender = make(store, pipeline)
+    store.documents[PATH] = {'version': 'v1'}
+    assert prerender.handle_event(PATH) == 'rendered'
+    assert pipeline.compiles == ['v1']
+    assert prerender.lookup(pipeline, SimpleNamespace(version='v1')) == b'%PDF v1'
+    # Nothing is left for a background thread
+    assert prerender._thread is None
+    assert prerender.handle_event(PATH) == 'unchanged'
+    assert pipeline.compiles == ['v1']
+
+
+def test_burst_renders_once_in_the_last_request(store, pipeline):
+    prerender = make(store, pipeline, debounce=0.2)
+    results = []
+
+    def event(version):
+        store.documents[PATH] = {'version': version}
+        results.append(prerender.handle_event(PATH))
+
+    threads = []
+    for version in ('v1', 'v2', 'v3', 'v4'):
+        threads.append(threading.Thread(target=event, args=(version,)))
+        threads[-1].start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+    assert sorted(results) == ['rendered', 'superseded', 'superseded', 'superseded']
+    assert pipeline.compiles == ['v4']
+    assert prerender.stats()['debounced'] == 3
+    assert prerender.stats()['pending'] == 0
+
+
+def test_burst_that_does_not_stop_renders_at_the_deadline(store, pipeline):
+    prerender = make(store, pipeline, debounce=0.1, max_delay=0.25)
+    store.documents[PATH] = {'version': 'v1'}
+    threads = []
+    start = time.monotonic()
+    while not pipeline.compiles and time.monotonic() - start < 5:
+        threads.append(threading.Thread(target=prerender.handle_event, args=(PATH,)))
+        threads[-1].start()
+        time.sleep(0.03)
+    for thread in threads:
+        thread.join(5)
+    assert pipeline.compiles
+    assert time.monotonic() - start < 1
+
+
+def test_busy_compiles_are_a_503_for_the_event(store, pipeline):
+    prerender = make(store, pipeline)
+    store.documents[PATH] = {'version': 'v1'}
+    pipeline.error = GenerationError('Server is busy', 503, headers={'Retry-After': '2'})
+    with pytest.raises(GenerationError) as error:
+        prerender.handle_event(PATH)
+    assert error.value.status == 503
+    assert prerender.stats()['deferred'] == 1
+
+
+@pytest.mark.parametrize('path, documents, expected', [
+    ('users/u/coverLetters/a', {}, 'ignored'),
+    ('users/u/resumes', {}, 'ignored'),
+    (PATH, {}, 'deleted'),
+    (PATH, {PATH: {'broken': True}}, 'failed'),
+])
+def test_event_outcomes(store, pipeline, path, documents, expected):
+    prerender = make(store, pipeline)
+    store.documents.update(documents)
+    assert prerender.handle_event(path) == expected
+
+
+def test_disabled(store, pipeline):
+    prerender = make(store, pipeline, enabled=False)
+    store.documents[PATH] = {'version': 'v1'}
+    assert prerender.handle_event(PATH) == 'ignored'
+    assert not prerender.notify(PATH)
+    assert prerender.lookup(pipeline, SimpleNamespace(version='v1')) is None
+    assert store.listeners == []
+
+
+def test_listener_changes_render_in_the_background(store, pipeline):
+    prerender = make(store, pipeline)
+    store.documents[PATH] = {'version': 'v1'}
+    assert store.listeners == [prerender.notify]
+    for _ in range(3):
+        store.listeners[0](PATH)
+    deadline = time.monotonic() + 5
+    while prerender.stats()['rendered'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pipeline.compiles == ['v1']
+    assert prerender.stats()['debounced'] == 2
+
+
+def test_background_retries_when_busy(store, pipeline):
+    prerender = make(store, pipeline)
+    store.documents[PATH] = {'version': 'v1'}
+    pipeline.error = GenerationError('Server is busy', 503)
+    assert prerender.precompute(PATH) is None
+    assert prerender.stats()['pending'] == 1
+    pipeline.error = None
+    deadline = time.monotonic() + 5
+    while prerender.stats()['rendered'] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pipeline.compiles == ['v1']
+
+
+def test_warns_without_a_shared_artifact_directory(store, caplog, tmp_path):
+    Prerenderer(store, PdfCache(), enabled=True)
+    assert 'PRERENDER_CACHE_DIR is not set' in caplog.text
+    caplog.clear()
+    Prerenderer(store, PdfCache(disk_dir=str(tmp_path)), enabled=True)
+    assert caplog.text == ''
@@ -0,0 +1,117 @@
+"""PreviewRenderer: options, page lookups and caching, with stand-ins for poppler's tools."""
+import io
+import os
+import sys
+import zipfile
+
+import pytest
+from flask import Flask
+
+from pdf_pipeline.cache import PdfCache
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.preview import PreviewOptions, PreviewRenderer
+from pdf_pipeline.workspace import WorkspacePool
+
+# Two-page documents; like poppler, pdftoppm exits with 99 for a range past the last page
+PDFTOPPM = '''
+import sys
+args = sys.argv[1:]
+ext = 'jpg' if '-jpeg' in args else 'png'
+first = int(args[args.index('-f') + 1]) if '-f' in args else 1
+last = int(args[args.index('-l') + 1]) if '-l' in args else 2
+if first > 2:
+    sys.exit(99)
+for n in range(first, min(last, 2) + 1):
+    with open(f'{args[-1]}-{n}.{ext}', 'wb') as f:
+        f.write(b'page %d' % n)
+'''
+PDFINFO = '''
+print('Producer:       pdfTeX-1.40.25')
+print('Pages:          2')
+'''
+
+
+@pytest.fixture
+def poppler(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    for name, source in (('pdftoppm', PDFTOPPM), ('pdfinfo', PDFINFO)):
+        path = bin_dir / name
+        path.write_text(f'#!{sys.executable}\n{source}')
+        path.chmod(0o755)
+    monkeypatch.setenv('PATH', f'{bin_dir}{os.pathsep}{os.environ["PATH"]}')
+    return bin_dir
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    return PreviewRenderer(PdfCache(), WorkspacePool(root=str(tmp_path)))
+
+
+@pytest.mark.parametrize('data, expected', [
+    ({}, PreviewOptions(1, 72, 'png')),
+    ({'page': 'all', 'dpi': 150, 'format': 'jpeg'}, PreviewOptions(None, 150, 'jpeg')),
+    ({'page': 3}, PreviewOptions(3, 72, 'png')),
+])
+def test_parse_options(renderer, data, expected):
+    assert renderer.parse_options(data) == expected
+
+
+@pytest.mark.parametrize('data', [{'page': 0}, {'page': '1'}, {'page': True}, {'dpi': 5}, {'dpi': 201},
+                                  {'format': 'gif'}])
+def test_invalid_options_are_a_400(renderer, data):
+    with pytest.raises(GenerationError) as error:
+        renderer.parse_options(data)
+    assert error.value.status == 400
+
+
+def test_one_page(poppler, renderer):
+    assert renderer.rasterize(b'%PDF', PreviewOptions(2, 72, 'png')) == [b'page 2']
+
+
+def test_all_pages_in_order(poppler, renderer):
+    assert renderer.rasterize(b'%PDF', PreviewOptions(None, 72, 'jpeg')) == [b'page 1', b'page 2']
+
+
+def test_page_past_the_end_is_a_404(poppler, renderer):
+    with pytest.raises(GenerationError) as error:
+        renderer.rasterize(b'%PDF', PreviewOptions(5, 72, 'png'))
+    assert error.value.status == 404
+    assert error.value.details == {'pages': 2}
+
+
+def test_other_failures_are_a_500(poppler, renderer):
+    (poppler / 'pdftoppm').write_text(f'#!{sys.executable}\nimport sys\nsys.exit(1)\n')
+    with pytest.raises(GenerationError) as error:
+        renderer.rasterize(b'%PDF', PreviewOptions(1, 72, 'png'))
+    assert error.value.status == 500
+
+
+def test_page_count_without_pdfinfo(poppler, renderer, tmp_path):
+    (poppler / 'pdfinfo').unlink()
+    assert renderer.page_count(str(tmp_path / 'missing.pdf')) is None
+
+
+def test_respond_caches_and_validates(poppler, renderer):
+    app = Flask(__name__)
+    compiles = []
+
+    def get_pdf():
+        compiles.append(1)
+        return b'%PDF'
+
+    def preview(data):
+        with app.test_request_context(headers={'If-None-Match': data.pop('etag', '')}):
+            return renderer.respond('key', renderer.parse_options(data), get_pdf, 'resume')
+
+    first = preview({'page': 1})
+    assert first.status_code == 200 and first.mimetype == 'image/png'
+    assert first.get_data() == b'page 1'
+    assert preview({'page': 1}).get_data() == b'page 1'
+    assert len(compiles) == 1
+    assert preview({'page': 1, 'etag': first.headers['ETag']}).status_code == 304
+
+    pages = preview({'page': 'all'})
+    assert pages.mimetype == 'application/zip'
+    assert zipfile.ZipFile(io.BytesIO(pages.get_data())).namelist() == ['page-1.png', 'page-2.png']
+    assert pages.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,101 @@
+"""TexSandbox: limits in force from the first instruction, and process group cleanup."""
+import resource
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from pdf_pipeline.sandbox import TexSandbox
+
+
+class ShellSandbox(TexSandbox):
+    """Runs a shell script in place of pdflatex."""
+
+    def command(self, args):
+        return ['sh', '-c', *args]
+
+
+def run(sandbox, script, tmp_path):
+    process = sandbox.popen([script], str(tmp_path), None, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    out, _ = process.communicate(timeout=10)
+    return out.decode().split()
+
+
+needs_prlimit = pytest.mark.skipif(shutil.which('prlimit') is None, reason='util-linux prlimit is not installed')
+
+
+@needs_prlimit
+def test_limits_are_set_before_exec(tmp_path):
+    sandbox = ShellSandbox(cpu_seconds=7, memory_bytes=512 * 1024 * 1024, file_size_bytes=2 * 1024 * 1024)
+    # ulimit -f counts 1024-byte blocks in bash and 512-byte blocks in dash
+    cpu, memory, file_size, core = run(sandbox, 'ulimit -t; ulimit -v; ulimit -f; ulimit -c', tmp_path)
+    assert int(cpu) == 7
+    assert int(memory) == 512 * 1024
+    assert int(file_size) in (2 * 1024, 4 * 1024)
+    assert int(core) == 0
+
+
+@needs_prlimit
+def test_file_size_limit_stops_the_writer(tmp_path):
+    sandbox = ShellSandbox(file_size_bytes=64 * 1024)
+    process = sandbox.popen(['exec head -c 1000000 /dev/zero > out.bin'], str(tmp_path), None)
+    assert sandbox.wait(process, 10)
+    assert (tmp_path / 'out.bin').stat().st_size <= 64 * 1024
+    assert sandbox.stats()['limit_kills'] == 1
+
+
+def test_limits_are_clamped_to_the_hard_limits():
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    sandbox = TexSandbox(cpu_seconds=10 ** 9)
+    cpu = dict(sandbox._rlimits)[resource.RLIMIT_CPU]
+    if hard == resource.RLIM_INFINITY:
+        assert cpu == (10 ** 9, 10 ** 9 + 1)
+    else:
+        assert cpu == (min(10 ** 9, hard), hard)
+
+
+@needs_prlimit
+def test_limits_are_set_by_prlimit_not_in_the_forked_child(monkeypatch, tmp_path):
+    started = []
+    monkeypatch.setattr(subprocess, 'Popen', lambda command, **kwargs: started.append((command, kwargs)))
+    TexSandbox(cpu_seconds=7, memory_bytes=1024, file_size_bytes=2048).popen(['x.tex'], str(tmp_path), None)
+    (command, kwargs), = started
+    assert command[0].endswith('prlimit')
+    assert command[command.index('--'):] == ['--', 'pdflatex', '-no-shell-escape', 'x.tex']
+    assert {'--cpu=7:8', '--as=1024:1024', '--fsize=2048:2048', '--core=0:0'} <= set(command)
+    assert 'preexec_fn' not in kwargs and kwargs['start_new_session']
+
+
+def test_without_prlimit_pdflatex_runs_unwrapped(monkeypatch):
+    monkeypatch.setattr(shutil, 'which', lambda name: None)
+    sandbox = TexSandbox()
+    assert sandbox.limited(sandbox.command(['x.tex'])) == ['pdflatex', '-no-shell-escape', 'x.tex']
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    sandbox = ShellSandbox(timeout=0.5)
+    start = time.monotonic()
+    process = sandbox.popen(['sleep 30 & sleep 30; wait'], str(tmp_path), None)
+    assert not sandbox.wait(process)
+    assert time.monotonic() - start < 10
+    assert sandbox.stats()['timeouts'] == 1
+
+
+def test_environment_restricts_file_access(tmp_path):
+    env = TexSandbox().environment({'PATH': '/bin'}, str(tmp_path))
+    assert env['openin_any'] == env['openout_any'] == 'p'
+    assert env['TEXMFOUTPUT'] == str(tmp_path)
+    assert env['PATH'] == '/bin'
+
+
+def test_environment_makes_compiles_reproducible(tmp_path):
+    env = TexSandbox().environment({'SOURCE_DATE_EPOCH': '1700000000'}, str(tmp_path))
+    # A fixed date whatever the caller's environment, so every instance writes the same bytes
+    assert env['SOURCE_DATE_EPOCH'] == '0'
+    assert env['FORCE_SOURCE_DATE'] == '1'
+
+
+@pytest.mark.parametrize('args', [['x.tex'], ['-interaction=nonstopmode', 'x.tex']])
+def test_command_disables_shell_escape(args):
+    assert TexSandbox().command(args) == ['pdflatex', '-no-shell-escape', *args]
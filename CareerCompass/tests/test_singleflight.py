@@ -0,0 +1,133 @@
+"""SingleFlight: one call per key, shared results and errors, and waiters that give up."""
+import threading
+import time
+
+import pytest
+
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Start callers threads on flight.do(key, fn); returns their results or exceptions in order."""
+    outcomes = [None] * callers
+
+    def call(i):
+        try:
+            outcomes[i] = flight.do(key, fn)
+        except BaseException as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def wait_for_waiters(flight, count):
+    deadline = time.monotonic() + 5
+    while flight.stats()['coalesced'] < count:
+        assert time.monotonic() < deadline, flight.stats()
+        time.sleep(0.005)
+
+
+def wait_for_in_flight(flight):
+    deadline = time.monotonic() + 5
+    while not flight.stats()['in_flight']:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_concurrent_calls_share_one_run():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return b'%PDF'
+
+    threads, outcomes = run_concurrently(flight, 'key', work, 8)
+    wait_for_waiters(flight, 7)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert outcomes == [b'%PDF'] * 8
+    assert len(runs) == 1
+    assert flight.stats() == {'calls': 1, 'coalesced': 7, 'shared_errors': 0, 'abandoned': 0,
+                              'wait_timeouts': 0, 'in_flight': 0}
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+    error = GenerationError('LaTeX compilation failed', 500)
+
+    def work():
+        release.wait(5)
+        raise error
+
+    threads, outcomes = run_concurrently(flight, 'key', work, 4)
+    wait_for_waiters(flight, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(outcome is error for outcome in outcomes)
+    assert flight.stats()['shared_errors'] == 3
+
+
+def test_nothing_is_kept_after_the_call():
+    flight = SingleFlight()
+    results = iter([1, 2])
+    assert flight.do('key', lambda: next(results)) == 1
+    assert flight.do('key', lambda: next(results)) == 2
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert [flight.do(key, lambda key=key: key * 2) for key in (1, 2, 3)] == [2, 4, 6]
+    assert flight.stats()['coalesced'] == 0
+
+
+def test_waiters_time_out_with_a_503():
+    flight = SingleFlight(wait_timeout=0.05)
+    release = threading.Event()
+    threads, outcomes = run_concurrently(flight, 'key', lambda: release.wait(5), 1)
+    wait_for_in_flight(flight)
+    with pytest.raises(GenerationError) as error:
+        flight.do('key', lambda: None)
+    assert error.value.status == 503
+    release.set()
+    threads[0].join(5)
+    assert outcomes == [True]
+    assert flight.stats()['wait_timeouts'] == 1
+
+
+def test_a_waiter_takes_over_an_abandoned_call():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def interrupted():
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    threads, outcomes = run_concurrently(flight, 'key', interrupted, 1)
+    wait_for_in_flight(flight)
+    waiter, waited = run_concurrently(flight, 'key', lambda: 'retried', 1)
+    wait_for_waiters(flight, 1)
+    release.set()
+    for thread in threads + waiter:
+        thread.join(5)
+    assert isinstance(outcomes[0], KeyboardInterrupt)
+    assert waited == ['retried']
+    assert flight.stats()['abandoned'] == 1
+
+
+def test_disabled_runs_every_call():
+    flight = SingleFlight(enabled=False)
+    runs = []
+    flight.do('key', lambda: runs.append(1))
+    flight.do('key', lambda: runs.append(1))
+    assert len(runs) == 2
@@ -0,0 +1,59 @@
+"""TemplateRegistry: resolving requested names and the fields each template reads."""
+import pytest
+from jinja2 import DictLoader, Environment
+
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.templates import FieldReads, TemplateRegistry, analyze_template
+
+
+@pytest.fixture
+def registry():
+    templates = {'template1': FieldReads(['fullName']), 'template2': FieldReads(['email']), 'template3': None}
+    return TemplateRegistry(templates, 'template1', always_read=('resume_name',))
+
+
+@pytest.mark.parametrize('requested', [None, '', False])
+def test_missing_or_empty_names_use_the_default(registry, requested):
+    assert registry.resolve(requested) == 'template1'
+
+
+@pytest.mark.parametrize('requested, expected', [
+    ('template2', 'template2'), ('Template2', 'template2'), ('TEMPLATE3', 'template3'),
+])
+def test_names_are_case_insensitive(registry, requested, expected):
+    assert registry.resolve(requested) == expected
+
+
+@pytest.mark.parametrize('requested', ['template9', ' ', 'template1.tex', '../template1', 2, ['template1']])
+def test_unknown_names_are_a_400(registry, requested):
+    with pytest.raises(GenerationError) as error:
+        registry.resolve(requested)
+    assert error.value.status == 400
+    assert error.value.details == {'templates': ['template1', 'template2', 'template3']}
+
+
+def test_unknown_default_is_rejected():
+    with pytest.raises(ValueError):
+        TemplateRegistry({'template1': None}, 'template2')
+
+
+def test_always_read_fields_are_added(registry):
+    assert 'resume_name' in registry.reads('template1')
+    assert 'fullName' in registry.reads('template1')
+    assert 'email' not in registry.reads('template1')
+    # Templates that can't be analyzed read everything
+    assert registry.reads('template3') is None
+
+
+def test_analysis_follows_loops_and_tests():
+    env = Environment(loader=DictLoader({
+        'a.tex': '{{ fullName }}{% for exp in work_experience %}{{ exp.title }}{% endfor %}'
+                 '{% if skills.tools %}x{% endif %}',
+        'b.tex': '{% include "a.tex" %}',
+    }))
+    reads = analyze_template(env, 'a.tex')
+    assert 'fullName' in reads
+    assert 'work_experience.title' in reads
+    assert 'work_experience.location' not in reads
+    assert reads.shallow >= {'work_experience', 'skills.tools'}
+    assert analyze_template(env, 'b.tex') is None
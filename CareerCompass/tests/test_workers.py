@@ -0,0 +1,39 @@
+"""TexWorkerPool: turning requests away when the queue is full."""
+import time
+
+import pytest
+
+from pdf_pipeline.errors import GenerationError
+from pdf_pipeline.workers import TexWorkerPool, _Job
+
+
+@pytest.fixture
+def pool(monkeypatch, tmp_path):
+    pool = TexWorkerPool(size=2, queue_size=1, job_timeout=60, scratch_root=str(tmp_path))
+    # No workers, so queued jobs stay queued
+    monkeypatch.setattr(pool, '_ensure_started', lambda: None)
+    return pool
+
+
+def test_full_queue_is_a_503_at_once(pool):
+    pool._queue.put(_Job('', [], None, 60))
+    start = time.monotonic()
+    with pytest.raises(GenerationError) as error:
+        pool.compile('\\documentclass{article}')
+    assert time.monotonic() - start < 1
+    assert error.value.status == 503
+    assert error.value.headers['Retry-After'] == '2'
+    assert pool.stats()['rejected'] == 1
+
+
+def test_retry_after_follows_the_job_time(pool):
+    pool._queue.put(_Job('', [], None, 60))
+    pool._set_busy(2)
+    pool._finish(4.0)
+    pool._finish(4.0)
+    with pytest.raises(GenerationError) as error:
+        pool.compile('\\documentclass{article}')
+    # Three jobs (one queued, two running) on two workers at four seconds each
+    assert error.value.headers['Retry-After'] == '6'
+    assert error.value.details == {'retry_after': 6}
+    assert pool.stats()['busy'] == 0